@@ -46,6 +46,7 @@ if DEBUG:
     INSTALLED_APPS += ["django.contrib.admin", "debug_toolbar"]
 
 MIDDLEWARE = [
+    "Main.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -57,7 +58,7 @@ MIDDLEWARE = [
 ]
 
 if DEBUG is False:
-    MIDDLEWARE.pop(3)
+    MIDDLEWARE.remove("debug_toolbar.middleware.DebugToolbarMiddleware")
     CSRF_FAILURE_VIEW = "Main.views.csrf_failure_view"
 
 ROOT_URLCONF = "CodeReview.urls"
@@ -143,6 +144,59 @@ LDAP_DOMAIN = os.getenv("LDAP_DOMAIN", None)
 LDAP_BASE_CONTEXT = os.getenv("LDAP_BASE_CONTEXT", None)
 LDAP_ADMIN_NAME = os.getenv("LDAP_ADMIN_NAME", "&&%%^^$$##@@")
 LDAP_ADMIN_EMAIL = os.getenv("LDAP_ADMIN_EMAIL", None)
+# If these are set, directory searches use pooled connections bound as this account
+LDAP_SERVICE_USER = os.getenv("LDAP_SERVICE_USER", None)
+LDAP_SERVICE_PASSWORD = os.getenv("LDAP_SERVICE_PASSWORD", None)
+LDAP_SERVICE_POOL_SIZE = int(os.getenv("LDAP_SERVICE_POOL_SIZE", 4))
+# If the TTL (in seconds) is above 0, directory info is kept in the Django cache for that long,
+# users are only cached too if CACHE_BACKEND is shared between workers, since they carry permissions
+LDAP_IDENTITY_CACHE_TTL = int(os.getenv("LDAP_IDENTITY_CACHE_TTL", 0))
+
+# CACHE
+
+# By default every process keeps its own cache in memory, so workers don't see each other's entries or invalidations.
+# Set CACHE_BACKEND (e.g. "django.core.cache.backends.redis.RedisCache") and CACHE_LOCATION to share one cache between them
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+# RUBRICS
+
+# If editing a rubric affects more completed reviews than this, their scores are updated later
+# by the `reconcile_rubric_scores` command instead of during the request, unset means always update them right away
+RUBRIC_RECONCILE_INLINE_LIMIT = (
+    int(os.getenv("RUBRIC_RECONCILE_INLINE_LIMIT"))
+    if os.getenv("RUBRIC_RECONCILE_INLINE_LIMIT")
+    else None
+)
+
+# LEADERBOARD
+
+# How long (in seconds) to keep the leaderboard snapshot before rebuilding it,
+# every worker also rebuilds it as soon as the leaderboard version in the database changes, like when a review is graded
+LEADERBOARD_CACHE_TIMEOUT = int(os.getenv("LEADERBOARD_CACHE_TIMEOUT", 300))
+
+# NOTIFICATIONS
+
+# If this is set, emails are queued instead of being sent during the request,
+# and the `send_notifications` command has to be run on a schedule to send them
+NOTIFICATIONS_ASYNC = os.getenv("NOTIFICATIONS_ASYNC", "false").lower() == "true"
+
+# REQUEST METRICS
+
+# Whether to send the number of queries and the time each request took back to everyone in a `Server-Timing` header,
+# it's off in production by default so visitors can't see how the server works, staff users always get the header
+REQUEST_METRICS_SERVER_TIMING = (
+    os.getenv("REQUEST_METRICS_SERVER_TIMING", str(DEBUG)).lower() == "true"
+)
+# The fraction of requests (0 to 1) to log to REQUEST_METRICS_LOG_FILE, read by the `request_metrics_report` command
+REQUEST_METRICS_SAMPLE_RATE = float(os.getenv("REQUEST_METRICS_SAMPLE_RATE", 0))
+REQUEST_METRICS_LOG_FILE = os.getenv("REQUEST_METRICS_LOG_FILE", "request_metrics.log")
 
 if DEBUG:
     # If we're debugging, we never actually send any emails, we just save what they would be as text files
@@ -183,20 +237,33 @@ STATIC_ROOT = os.getenv("STATIC_DIR", "collected-static")
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
-if DEBUG is False:
-    # If we're in production, all messages will go to a local file named "django_logs.txt"
-    LOGGING = {
-        "version": 1,
-        "disable_existing_loggers": False,
-        "handlers": {
-            "file": {
-                "level": "WARNING",
-                "class": "logging.FileHandler",
-                "filename": "django_logs.txt",
-            },
+# Sampled request metrics are written as one JSON object per line to their own file
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"message": {"format": "%(message)s"}},
+    "handlers": {
+        "metrics": {
+            "level": "INFO",
+            "class": "logging.FileHandler",
+            "filename": REQUEST_METRICS_LOG_FILE,
+            "formatter": "message",
+            "delay": True,
         },
-        "root": {"handlers": ["file"], "level": "WARNING"},
+    },
+    "loggers": {
+        "Main.metrics": {"handlers": ["metrics"], "level": "INFO", "propagate": False},
+    },
+}
+
+if DEBUG is False:
+    # If we're in production, all other messages will go to a local file named "django_logs.txt"
+    LOGGING["handlers"]["file"] = {
+        "level": "WARNING",
+        "class": "logging.FileHandler",
+        "filename": "django_logs.txt",
     }
+    LOGGING["root"] = {"handlers": ["file"], "level": "WARNING"}
 
 if os.getenv("SECURITY", "NONE") == "SECURE":
     SESSION_COOKIE_SECURE = True
@@ -4,11 +4,15 @@
 
 from json import JSONDecoder, JSONDecodeError
 
-from django.forms import ModelForm, TextInput
-from django.forms.fields import CharField
+from django.db import transaction
+from django.db.models import Model
+from django.forms import Form, ModelChoiceField, ModelForm, TextInput
+from django.forms.fields import CharField, ChoiceField, DateField
 from jsonschema import ValidationError
 from jsonschema.validators import Draft202012Validator
 
+from Main.export import EXPORT_FORMATS
+from Users.models import User
 from . import models
 
 
@@ -114,7 +118,9 @@ class RubricForm(ModelForm):
     def save(self, commit=True) -> models.Rubric:
         """
         This function is run to save the Rubric to the database
-        It loads the JSON, and creates the needed `RubricRow` and `RubricCell` objects to represent the Rubric
+        It loads the JSON, compares it to the existing `RubricRow` and `RubricCell` objects of the Rubric,
+        and then creates, updates, and deletes rows and cells in bulk.
+        This means the number of queries stays the same no matter how big the Rubric is
 
         :param commit: Whether to actually save the new Rubric to the database
         :type commit: bool
@@ -123,59 +129,106 @@ class RubricForm(ModelForm):
         """
 
         new_rubric: models.Rubric = super().save(commit=False)
-        new_rubric.max_score = 0
-        new_rubric.save()
         json: str = self.cleaned_data.get("rubric")
-        possible_points = 0
-
         new_obj = JSONDecoder().decode(json)
 
-        for index, row in enumerate(new_obj):
-            new_row, created = models.RubricRow.objects.get_or_create(
-                parent_rubric=new_rubric,
-                index=index,
-                defaults={
+        with transaction.atomic():
+            if new_rubric._state.adding:
+                existing_rows = {}
+            else:
+                existing_rows = {
+                    row.index: row
+                    for row in new_rubric.rubricrow_set.prefetch_related(
+                        "rubriccell_set"
+                    )
+                }
+
+            rows_to_create, rows_to_update = [], []
+            cells_to_create, cells_to_update, cells_to_delete = [], [], []
+            possible_points = 0
+
+            for index, row in enumerate(new_obj):
+                cells = row.get("cells", [])
+                scores = [int(cell.get("score")) for cell in cells]
+                row_values = {
                     "name": row.get("name"),
                     "description": row.get("description"),
-                    "index": index,
-                    "parent_rubric": new_rubric,
-                    "max_score": 0,
-                },
-            )
-            if created is False:
-                new_row.name = row.get("name")
-                new_row.description = row.get("description")
-                new_row.max_score = 0
-            new_row.save()
-            for cell_index, cell in enumerate(row.get("cells", [])):
-                score = int(cell.get("score"))
-                new_row.max_score = max(score, new_row.max_score)
-                new_cell, cell_created = models.RubricCell.objects.get_or_create(
-                    parent_row=new_row,
-                    index=cell_index,
-                    defaults={
+                    "max_score": max([0] + scores),
+                }
+                possible_points += row_values["max_score"]
+                new_row = existing_rows.get(index, None)
+                if new_row is None:
+                    new_row = models.RubricRow(
+                        parent_rubric=new_rubric, index=index, **row_values
+                    )
+                    rows_to_create.append(new_row)
+                    existing_cells = {}
+                else:
+                    if self.apply_changes(new_row, row_values):
+                        rows_to_update.append(new_row)
+                    existing_cells = {
+                        cell.index: cell for cell in new_row.rubriccell_set.all()
+                    }
+
+                for cell_index, cell in enumerate(cells):
+                    cell_values = {
                         "description": cell.get("description"),
-                        "score": score,
-                        "parent_row": new_row,
-                        "index": cell_index,
-                    },
-                )
-                if cell_created is False:
-                    new_cell.description = cell.get("description")
-                    new_cell.score = score
-                new_cell.save()
-            possible_points += new_row.max_score
-            new_row.save()
+                        "score": scores[cell_index],
+                    }
+                    new_cell = existing_cells.get(cell_index, None)
+                    if new_cell is None:
+                        cells_to_create.append(
+                            models.RubricCell(
+                                parent_row=new_row, index=cell_index, **cell_values
+                            )
+                        )
+                    elif self.apply_changes(new_cell, cell_values):
+                        cells_to_update.append(new_cell)
+
+                cells_to_delete += [
+                    cell.id
+                    for cell_index, cell in existing_cells.items()
+                    if cell_index >= len(cells)
+                ]
 
-            new_row.rubriccell_set.filter(
-                index__gt=len(row.get("cells", [])) - 1
-            ).delete()
+            rows_to_delete = [
+                row.id for index, row in existing_rows.items() if index >= len(new_obj)
+            ]
+
+            new_rubric.max_score = possible_points
+            new_rubric.save()
+            models.RubricCell.objects.filter(id__in=cells_to_delete).delete()
+            models.RubricRow.objects.filter(id__in=rows_to_delete).delete()
+            models.RubricRow.objects.bulk_create(rows_to_create)
+            models.RubricRow.objects.bulk_update(
+                rows_to_update, ["name", "description", "max_score"]
+            )
+            models.RubricCell.objects.bulk_create(cells_to_create)
+            models.RubricCell.objects.bulk_update(
+                cells_to_update, ["description", "score"]
+            )
+            new_rubric.bump_version()
+        return new_rubric
 
-        new_rubric.rubricrow_set.filter(index__gt=len(new_obj) - 1).delete()
+    @staticmethod
+    def apply_changes(target: Model, values: dict[str, object]) -> bool:
+        """
+        This function sets the given values on an object, and checks whether any of them changed
+
+        :param target: The object to update
+        :type target: Model
+        :param values: The values to set, keyed by field name
+        :type values: dict
+        :return: Whether any of the values were different
+        :rtype: bool
+        """
 
-        new_rubric.max_score = possible_points
-        new_rubric.save()
-        return new_rubric
+        changed = False
+        for field, value in values.items():
+            if getattr(target, field) != value:
+                setattr(target, field, value)
+                changed = True
+        return changed
 
     @staticmethod
     def explain_json_error(error: ValidationError) -> str:
@@ -259,3 +312,41 @@ class RubricForm(ModelForm):
                 self.add_error("rubric", "Invalid JSON")
 
         return self.cleaned_data
+
+
+class ExportForm(Form):
+    """
+    This Form is used to pick which completed reviews to export, it's filled from the query string
+
+    :cvar format: The format to export in
+    :cvar session: Only export reviews from students in this session
+    :cvar rubric: Only export reviews graded with this rubric
+    :cvar start: Only export reviews completed on or after this day
+    :cvar end: Only export reviews completed on or before this day
+    """
+
+    format = ChoiceField(
+        choices=[(name, name.upper()) for name in EXPORT_FORMATS], required=False
+    )
+    session = ChoiceField(choices=User.Session.choices, required=False)
+    rubric = ModelChoiceField(queryset=models.Rubric.objects.all(), required=False)
+    start = DateField(required=False)
+    end = DateField(required=False)
+
+    def clean(self) -> dict:
+        """
+        This function makes sure the date range isn't backwards, and fills in the default format
+
+        :returns: The cleaned data
+        :rtype: dict
+        """
+
+        cleaned_data = super(ExportForm, self).clean()
+        if cleaned_data.get("format") in (None, ""):
+            cleaned_data["format"] = "csv"
+        if cleaned_data.get("session") == "":
+            cleaned_data["session"] = None
+        start, end = cleaned_data.get("start"), cleaned_data.get("end")
+        if start is not None and end is not None and start > end:
+            self.add_error("end", "The end date must be after the start date")
+        return cleaned_data
@@ -0,0 +1,70 @@
+"""
+    This file defines a command that duplicates rubrics, usually run at the start of a term
+"""
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from Instructor.models import Rubric
+
+
+class Command(BaseCommand):
+    """
+    This command copies a set of rubrics (or every rubric) along with their rows and cells
+
+    :cvar help: The help text to display for the command
+    """
+
+    help = "Duplicates rubrics along with their rows and cells"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        This function defines the arguments the command takes
+
+        :param parser: The parser to add the arguments to
+        :type parser: CommandParser
+        """
+
+        parser.add_argument(
+            "rubric_ids", nargs="*", help="The ids of the rubrics to copy"
+        )
+        parser.add_argument(
+            "--all", action="store_true", help="Copy every rubric in the database"
+        )
+        parser.add_argument(
+            "--name-format",
+            default="Copy of {name}",
+            help="The name to give each copy, {name} is replaced with the name of the original",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """
+        This function is run when the command is called
+        """
+
+        try:
+            options["name_format"].format(name="Rubric")
+        except (KeyError, IndexError, ValueError, AttributeError) as error:
+            raise CommandError(
+                f"Invalid --name-format {options['name_format']!r}, the only placeholder allowed is {{name}} ({error})"
+            )
+
+        if options["all"]:
+            rubrics = list(Rubric.objects.all())
+        elif len(options["rubric_ids"]) > 0:
+            try:
+                rubrics = list(Rubric.objects.filter(id__in=options["rubric_ids"]))
+            except ValidationError:
+                raise CommandError("Invalid rubric id")
+            if len(rubrics) != len(set(options["rubric_ids"])):
+                raise CommandError("One or more of the given rubrics don't exist")
+        else:
+            raise CommandError(
+                "Please provide the ids of the rubrics to copy, or --all"
+            )
+
+        names = [rubric.copy_name(options["name_format"]) for rubric in rubrics]
+        new_rubrics = Rubric.clone_many(rubrics, names)
+        for rubric, new_rubric in zip(rubrics, new_rubrics):
+            self.stdout.write(f'Copied "{rubric.name}" to "{new_rubric.name}"')
+        self.stdout.write(self.style.SUCCESS(f"Copied {len(new_rubrics)} rubric(s)"))
@@ -0,0 +1,72 @@
+"""
+    This file defines a command that updates the scores of completed reviews after their rubric was edited
+"""
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from Instructor.models import Rubric
+
+
+class Command(BaseCommand):
+    """
+    This command updates the scored rows of completed reviews to match their rubric.
+    By default, it only handles rubrics that were marked as pending by `RubricEditView`,
+    so it can be run on a schedule the same way `send_mail` is
+
+    :cvar help: The help text to display for the command
+    """
+
+    help = "Updates the scores of completed reviews on rubrics that were edited"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        This function defines the arguments the command takes
+
+        :param parser: The parser to add the arguments to
+        :type parser: CommandParser
+        """
+
+        parser.add_argument(
+            "rubric_ids",
+            nargs="*",
+            help="The ids of the rubrics to update, defaults to every pending rubric",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="The number of reviews to update at once",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """
+        This function is run when the command is called
+        """
+
+        if options["batch_size"] < 1:
+            raise CommandError("The batch size must be at least 1")
+        if len(options["rubric_ids"]) > 0:
+            try:
+                rubrics = list(Rubric.objects.filter(id__in=options["rubric_ids"]))
+            except ValidationError:
+                raise CommandError("Invalid rubric id")
+            if len(rubrics) != len(set(options["rubric_ids"])):
+                raise CommandError("One or more of the given rubrics don't exist")
+        else:
+            rubrics = list(Rubric.objects.filter(scores_pending=True))
+
+        for rubric in rubrics:
+
+            def report(done: int, total: int) -> None:
+                self.stdout.write(f'"{rubric.name}": {done}/{total} reviews updated')
+
+            rubric.reconcile_scores(options["batch_size"], report)
+            if rubric.scores_pending:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'"{rubric.name}" was edited while it was being updated, '
+                        "it will be updated again on the next run"
+                    )
+                )
+        self.stdout.write(self.style.SUCCESS(f"Updated {len(rubrics)} rubric(s)"))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.4 on 2026-10-17 22:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("Instructor", "0003_alter_rubric_name"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="rubric",
+            name="version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
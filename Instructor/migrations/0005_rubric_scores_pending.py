@@ -0,0 +1,17 @@
+# Generated by Django 4.2.4 on 2026-10-17 22:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("Instructor", "0004_rubric_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="rubric",
+            name="scores_pending",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
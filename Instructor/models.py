@@ -3,10 +3,12 @@
 """
 
 from json import JSONEncoder
+from typing import Callable, Iterable, Optional
 
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
 
-from Main.models import BaseModel
+from Main.models import BaseModel, Review
 
 
 class RubricCell(BaseModel):
@@ -87,17 +89,105 @@ class Rubric(BaseModel):
 
     :cvar name: The name of the rubric
     :cvar max_score: The max possible score that a student can get with this rubric
+    :cvar version: Incremented every time the rows or cells of the rubric change, used to key cached data
+    :cvar scores_pending: Set when the rubric was edited but the scores of graded reviews haven't been updated yet
+    :cvar cached_names: The names of the data we cache for each rubric
     """
 
+    cached_names = ("json", "scores")
+
     name = models.CharField(
         max_length=50,
         help_text="The name the students will use to pick a rubric when requesting a review",
     )
     max_score = models.FloatField()
+    version = models.PositiveIntegerField(default=0, editable=False)
+    scores_pending = models.BooleanField(default=False, editable=False)
+
+    def cache_key(self, name: str) -> str:
+        """
+        This function gets the key to use when caching data about this Rubric.
+        The key includes the version, so any data cached for an older version of the rubric is never used
+
+        :param name: The name of the data we're caching
+        :type name: str
+        :returns: The key to use in the cache
+        :rtype: str
+        """
+
+        return f"rubric-{name}-{self.id}-{self.version}"
+
+    def get_cached(self, name: str, builder: Callable[[], object]) -> object:
+        """
+        This function gets data about this Rubric from the cache, building and caching it if it isn't there
+
+        :param name: The name of the data to get
+        :type name: str
+        :param builder: The function to run to build the data if it isn't cached
+        :type builder: Callable
+        :returns: The data
+        """
+
+        return cache.get_or_set(self.cache_key(name), builder, timeout=None)
+
+    def bump_version(self) -> None:
+        """
+        This function marks the Rubric as changed, so any data cached for it will be rebuilt
+        """
+
+        Rubric.objects.filter(id=self.id).update(version=models.F("version") + 1)
+        self.refresh_from_db(fields=["version"])
+
+    def clear_cache(self) -> None:
+        """
+        This function removes any data cached for the current version of this Rubric
+        """
+
+        cache.delete_many([self.cache_key(name) for name in self.cached_names])
 
     def to_json(self) -> str:
         """
         This function converts the Rubric to json for use in the front-end
+        The JSON is cached until the rubric changes
+
+        :returns: A JSON representation of this rubric
+        :rtype: str
+        """
+
+        return self.get_cached("json", self.build_json)
+
+    def score_matrix(self) -> list[set[float]]:
+        """
+        This function gets the scores that can be given for each row of the Rubric
+        The matrix is cached until the rubric changes
+
+        :returns: A list with a set of valid scores for each row, in order of the row's index
+        :rtype: list
+        """
+
+        return self.get_cached("scores", self.build_score_matrix)
+
+    def build_score_matrix(self) -> list[set[float]]:
+        """
+        This function builds the matrix of valid scores for each row in one query, ignoring the cache
+
+        :returns: A list with a set of valid scores for each row, in order of the row's index
+        :rtype: list
+        """
+
+        matrix = []
+        for index, score in self.rubricrow_set.values_list(
+            "index", "rubriccell__score"
+        ).order_by("index"):
+            while len(matrix) <= index:
+                matrix.append(set())
+            if score is not None:
+                matrix[index].add(score)
+        return matrix
+
+    def build_json(self) -> str:
+        """
+        This function builds the JSON representation of the Rubric, ignoring the cache
 
         :returns: A JSON representation of this rubric
         :rtype: str
@@ -117,6 +207,75 @@ class Rubric(BaseModel):
 
         return JSONEncoder().encode(new_obj)
 
+    def graded_reviews(self) -> models.QuerySet:
+        """
+        This function gets the completed Reviews that use this Rubric
+
+        :returns: The completed Reviews
+        :rtype: QuerySet
+        """
+
+        return Review.objects.filter(rubric=self, status=Review.Status.CLOSED)
+
+    def mark_scores_pending(self) -> None:
+        """
+        This function marks the Rubric as needing its graded reviews updated by `Rubric.reconcile_scores` later
+        """
+
+        Rubric.objects.filter(id=self.id).update(scores_pending=True)
+        self.scores_pending = True
+
+    def reconcile_scores(
+        self,
+        batch_size: int = 500,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> int:
+        """
+        This function makes the scored rows of every graded Review using this Rubric match its rows.
+        Rows that are missing are added with a score of -1, rows that aren't on the rubric anymore are removed,
+        and the score totals are recalculated.
+        Reviews are handled in batches, and each batch takes the same number of queries no matter how many rows it has.
+        The Rubric is only marked as done if it wasn't edited while this was running,
+        otherwise it's left pending so the next run picks up the edit
+
+        :param batch_size: The number of Reviews to update at once
+        :type batch_size: int
+        :param progress: A function to call after each batch with the number of Reviews done and the total
+        :type progress: Callable
+        :returns: The number of Reviews that were checked
+        :rtype: int
+        """
+
+        version = Rubric.objects.values_list("version", flat=True).get(id=self.id)
+        row_ids = list(self.rubricrow_set.values_list("id", flat=True))
+        review_ids = list(self.graded_reviews().values_list("id", flat=True))
+        for start in range(0, len(review_ids), batch_size):
+            batch = review_ids[start : start + batch_size]
+            with transaction.atomic():
+                batch_rows = ScoredRow.objects.filter(parent_review_id__in=batch)
+                existing = set(
+                    batch_rows.values_list("parent_review_id", "source_row_id")
+                )
+                ScoredRow.objects.bulk_create(
+                    ScoredRow(
+                        parent_review_id=review_id, source_row_id=row_id, score=-1
+                    )
+                    for review_id in batch
+                    for row_id in row_ids
+                    if (review_id, row_id) not in existing
+                )
+                batch_rows.exclude(source_row_id__in=row_ids).delete()
+                Review.update_scores(Review.objects.filter(id__in=batch))
+            if progress is not None:
+                progress(start + len(batch), len(review_ids))
+        if Rubric.objects.filter(id=self.id, version=version).update(
+            scores_pending=False
+        ):
+            self.scores_pending = False
+        else:
+            self.mark_scores_pending()
+        return len(review_ids)
+
     def __str__(self) -> str:
         """
         This function defines how this object is cast to a string
@@ -126,3 +285,86 @@ class Rubric(BaseModel):
         """
 
         return f"{self.name} ({self.max_score:.0f} points)"
+
+    def copy_name(self, name_format: str = "Copy of {name}") -> str:
+        """
+        This function gets the name to give a copy of this Rubric.
+        If the name would be too long, the copy is named "New Rubric"
+
+        :param name_format: The format to use for the name, `{name}` is replaced with the name of this Rubric
+        :type name_format: str
+        :returns: The name to give the copy
+        :rtype: str
+        """
+
+        new_name = name_format.format(name=self.name)
+        return new_name if len(new_name) <= Rubric.max_length("name") else "New Rubric"
+
+    def clone(self, name: Optional[str] = None) -> "Rubric":
+        """
+        This function creates a copy of this Rubric, including all of its rows and cells
+
+        :param name: The name of the copy, defaults to `Rubric.copy_name`
+        :type name: str
+        :returns: The new Rubric
+        :rtype: Rubric
+        """
+
+        return Rubric.clone_many([self], None if name is None else [name])[0]
+
+    @staticmethod
+    def clone_many(
+        rubrics: Iterable["Rubric"], names: Optional[Iterable[str]] = None
+    ) -> list["Rubric"]:
+        """
+        This function copies a group of Rubrics at once.
+        The rows and cells of every rubric are read in two queries, and the copies are made with three bulk inserts
+
+        :param rubrics: The Rubrics to copy
+        :type rubrics: Iterable
+        :param names: The names of the copies, in the same order as `rubrics`, defaults to `Rubric.copy_name`
+        :type names: Iterable
+        :returns: The new Rubrics, in the same order as `rubrics`
+        :rtype: list
+        """
+
+        rubrics = list(rubrics)
+        names = (
+            [rubric.copy_name() for rubric in rubrics] if names is None else list(names)
+        )
+        models.prefetch_related_objects(rubrics, "rubricrow_set__rubriccell_set")
+        new_rubrics, new_rows, new_cells = [], [], []
+        for rubric, name in zip(rubrics, names):
+            new_rubric = Rubric(name=name, max_score=rubric.max_score)
+            new_rubrics.append(new_rubric)
+            for row in rubric.rubricrow_set.all():
+                new_row = RubricRow(
+                    name=row.name,
+                    description=row.description,
+                    max_score=row.max_score,
+                    parent_rubric=new_rubric,
+                    index=row.index,
+                )
+                new_rows.append(new_row)
+                new_cells += [
+                    RubricCell(
+                        score=cell.score,
+                        description=cell.description,
+                        parent_row=new_row,
+                        index=cell.index,
+                    )
+                    for cell in row.rubriccell_set.all()
+                ]
+        with transaction.atomic():
+            Rubric.objects.bulk_create(new_rubrics)
+            RubricRow.objects.bulk_create(new_rows)
+            RubricCell.objects.bulk_create(new_cells)
+        return new_rubrics
+
+    def delete(self, *args, **kwargs) -> tuple[int, dict[str, int]]:
+        """
+        This function deletes the Rubric and anything we've cached for it
+        """
+
+        self.clear_cache()
+        return super(Rubric, self).delete(*args, **kwargs)
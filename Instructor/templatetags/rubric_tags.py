@@ -1,16 +1,37 @@
 """
     This file defines additional tags and filters templates can call for Rubrics
+    These filters read through related managers,
+    so if the Rubric/Review was loaded with `ReviewQuerySet.with_rubric` they don't run any queries
 """
 
+from typing import Optional
+
 from django import template
 from django.db.models import QuerySet
 
-from Instructor.models import Rubric, RubricRow, RubricCell, ScoredRow
+from Instructor.models import Rubric, RubricRow, RubricCell
 from Main.models import Review
 
 register = template.Library()
 
 
+def get_row_score(review: Review, row_id) -> Optional[float]:
+    """
+    This function finds the score a Review got on a row
+
+    :param review: The review to get the score from
+    :type review: Review
+    :param row_id: The id of the `RubricRow` to get the score for
+    :returns: The score for the row, if the row has been scored
+    :rtype: float
+    """
+
+    for scored_row in review.scoredrow_set.all():
+        if scored_row.source_row_id == row_id:
+            return scored_row.score
+    return None
+
+
 @register.filter(name="rows")
 def get_rows(rubric: Rubric) -> QuerySet:
     """
@@ -22,7 +43,7 @@ def get_rows(rubric: Rubric) -> QuerySet:
     :rtype: QuerySet
     """
 
-    return RubricRow.objects.filter(parent_rubric=rubric)
+    return rubric.rubricrow_set.all()
 
 
 @register.filter(name="cells")
@@ -36,7 +57,7 @@ def get_cells(row: RubricRow) -> QuerySet:
     :rtype: QuerySet
     """
 
-    return RubricCell.objects.filter(parent_row=row)
+    return row.rubriccell_set.all()
 
 
 @register.filter(name="colspan")
@@ -49,12 +70,7 @@ def get_colspan(rubric: Rubric) -> int:
     :rtype: int
     """
 
-    return max(
-        [
-            RubricCell.objects.filter(parent_row=row).count()
-            for row in RubricRow.objects.filter(parent_rubric=rubric)
-        ]
-    )
+    return max([len(row.rubriccell_set.all()) for row in rubric.rubricrow_set.all()])
 
 
 @register.filter(name="get_scores")
@@ -71,13 +87,9 @@ def get_scores_as_json(review: Review, rubric: Rubric) -> str:
     """
 
     scores = []
-    for row in RubricRow.objects.filter(parent_rubric=rubric):
-        try:
-            scores.append(
-                ScoredRow.objects.get(parent_review=review, source_row=row).score
-            )
-        except ScoredRow.DoesNotExist:
-            scores.append(-1)
+    for row in rubric.rubricrow_set.all():
+        score = get_row_score(review, row.id)
+        scores.append(-1 if score is None else score)
     return f"[{','.join([str(score) for score in scores])}]"
 
 
@@ -94,4 +106,4 @@ def is_score(cell: RubricCell, review: Review):
     :rtype: bool
     """
 
-    return cell.score == review.scoredrow_set.get(source_row=cell.parent_row).score
+    return cell.score == get_row_score(review, cell.parent_row_id)
@@ -10,6 +10,7 @@ urlpatterns = [
     path("", views.AdminHomeView.as_view(), name="instructor-home"),
     path("users/", views.UserListView.as_view(), name="user-list"),
     path("users/cleanup/", views.UserClearView.as_view(), name="user-cleanup"),
+    path("export/", views.ReviewExportView.as_view(), name="review-export"),
     path("rubric/", views.RubricListView.as_view(), name="rubric-list"),
     path("rubric/create/", views.RubricCreateView.as_view(), name="rubric-create"),
     path(
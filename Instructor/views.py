@@ -7,7 +7,12 @@ from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import ValidationError
 from django.db.models import Q, QuerySet
-from django.http import Http404, HttpResponse
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    StreamingHttpResponse,
+)
 from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.views.generic import (
@@ -20,6 +25,8 @@ from django.views.generic import (
 )
 
 from Main import models as main_models
+from Main.export import EXPORT_FORMATS, export, get_export_queryset
+from Main.leaderboard import clear_leaderboard
 from Main.views import (
     IsSuperUserMixin,
     FormNameMixin,
@@ -27,6 +34,7 @@ from Main.views import (
     SuccessDeleteMixin,
 )
 from Users.ldap_auth import LDAPAuthentication
+from Users.ldap_cache import clear_identity_caches
 from Users.ldap_errors import LDAPAuthException
 from Users.ldap_mock import LDAPMockAuthentication
 from Users.models import User
@@ -78,29 +86,49 @@ class AdminHomeView(LoginRequiredMixin, IsSuperUserMixin, TemplateView):
     This view shows the Instructor's homepage, where they can view ongoing and completed Reviews
 
     :cvar template_name: The template to render and return to the user
+    :cvar preview_size: The number of completed Reviews to show for each session
     """
 
     template_name = "admin_home.html"
+    preview_size = 4
 
     def get_context_data(self, **kwargs) -> dict[str, object]:
         """
         This function defines additional context to pass to the template in `AdminHomeView.template_name`
+        The number of Reviews in each session and status are counted in one grouped query,
+        then the ongoing Reviews and the latest completed Reviews of each session are loaded with their users
 
         :returns: A dictionary that hold context to pass to the template
         :rtype: dict
         """
 
         context = super().get_context_data(**kwargs)
-        active = main_models.Review.objects.exclude(
-            status=main_models.Review.Status.CLOSED
-        )
-        completed = main_models.Review.objects.filter(
-            status=main_models.Review.Status.CLOSED
+        counts = {session: {} for session in User.Session.values}
+        for row in main_models.Review.objects.session_status_counts():
+            counts[row["student__session"]][row["status"]] = row["count"]
+
+        active = main_models.Review.objects.ongoing()
+        completed = main_models.Review.objects.completed_preview_by_session(
+            self.preview_size
         )
-        context["am_active"] = active.filter(student__session=User.Session.AM)
-        context["am_completed"] = completed.filter(student__session=User.Session.AM)
-        context["pm_active"] = active.filter(student__session=User.Session.PM)
-        context["pm_completed"] = completed.filter(student__session=User.Session.PM)
+
+        for session in User.Session.values:
+            prefix = session.lower()
+            context[f"{prefix}_active"] = []
+            context[f"{prefix}_completed"] = []
+            context[f"{prefix}_open_count"] = counts[session].get(
+                main_models.Review.Status.OPEN, 0
+            )
+            context[f"{prefix}_assigned_count"] = counts[session].get(
+                main_models.Review.Status.ASSIGNED, 0
+            )
+            context[f"{prefix}_completed_count"] = counts[session].get(
+                main_models.Review.Status.CLOSED, 0
+            )
+        for review in active:
+            context[f"{review.student.session.lower()}_active"].append(review)
+        for review in completed:
+            context[f"{review.student.session.lower()}_completed"].append(review)
         return context
 
 
@@ -137,6 +165,8 @@ class UserListView(LoginRequiredMixin, IsSuperUserMixin, TemplateView):
             reviewer_query = Q(id__in=self.request.POST.getlist("reviewers"))
             self.get_queryset().filter(reviewer_query).update(is_reviewer=True)
             self.get_queryset().filter(~reviewer_query).update(is_reviewer=False)
+            clear_identity_caches()
+            clear_leaderboard()
             self.get_queryset().filter(
                 id__in=self.request.POST.getlist("to_delete")
             ).delete()
@@ -220,24 +250,24 @@ class RubricEditView(
         """
         This function is run when the form is valid.
         This handles when an Instructor changes a Rubric that is used in a Review that has been graded.
+        If more reviews than `settings.RUBRIC_RECONCILE_INLINE_LIMIT` are affected,
+        they're left for the `reconcile_rubric_scores` command to update
 
         :param form: The form that is valid
         :type form: Form
         """
 
         edited_object = form.save()
-        row_count = edited_object.rubricrow_set.count()
-        for review in main_models.Review.objects.filter(
-            rubric=edited_object, status=main_models.Review.Status.CLOSED
-        ):
-            if review.scoredrow_set.count() != row_count:
-                for row in edited_object.rubricrow_set.all():
-                    try:
-                        review.scoredrow_set.get(source_row__index=row.index)
-                    except models.ScoredRow.DoesNotExist:
-                        scored = review.scoredrow_set.create(score=-1, source_row=row)
-                        scored.save()
-                review.scoredrow_set.filter(source_row__index__gte=row_count).delete()
+        limit = settings.RUBRIC_RECONCILE_INLINE_LIMIT
+        if limit is not None and edited_object.graded_reviews().count() > limit:
+            edited_object.mark_scores_pending()
+            messages.add_message(
+                self.request,
+                messages.INFO,
+                "Scores on completed reviews will be updated shortly",
+            )
+        else:
+            edited_object.reconcile_scores()
 
         return super(RubricEditView, self).form_valid(form)
 
@@ -259,40 +289,18 @@ class RubricDupeView(LoginRequiredMixin, IsSuperUserMixin, View):
         """
 
         try:
-            target_rubric: models.Rubric = models.Rubric.objects.select_related().get(
+            target_rubric: models.Rubric = models.Rubric.objects.get(
                 id=kwargs.get("pk")
             )
             self.request = request
-            if len(target_rubric.name) + 10 > 50:
-                new_name = "New Rubric"
+            new_name = target_rubric.copy_name()
+            if new_name == "New Rubric":
                 messages.add_message(
                     request,
                     messages.WARNING,
                     'The length of the name is too long; the rubric has been named "New Rubric"',
                 )
-            else:
-                new_name = f"Copy of {target_rubric.name}"
-            new_rubric = models.Rubric.objects.create(
-                name=new_name, max_score=target_rubric.max_score
-            )
-            new_rubric.save()
-            for row in target_rubric.rubricrow_set.all():
-                new_row = models.RubricRow.objects.create(
-                    name=row.name,
-                    description=row.description,
-                    max_score=row.max_score,
-                    parent_rubric_id=new_rubric.id,
-                    index=row.index,
-                )
-                new_row.save()
-                for cell in row.rubriccell_set.all():
-                    new_cell = models.RubricCell.objects.create(
-                        score=cell.score,
-                        description=cell.description,
-                        parent_row_id=new_row.id,
-                        index=cell.index,
-                    )
-                    new_cell.save()
+            target_rubric.clone(new_name)
             messages.add_message(request, messages.SUCCESS, "Rubric Duplicated")
             return redirect("rubric-list")
         except models.Rubric.DoesNotExist:
@@ -327,3 +335,43 @@ class RubricDeleteView(
         context = super(RubricDeleteView, self).get_context_data(**kwargs)
         context["objectString"] = self.object.name
         return context
+
+
+class ReviewExportView(LoginRequiredMixin, IsSuperUserMixin, View):
+    """
+    This view downloads the grades of completed reviews as CSV or JSON Lines.
+    The filters are taken from the query string, see `ExportForm`.
+    The file is streamed as it's built, so large exports don't have to fit in memory
+
+    :cvar http_method_names: The names of the accepted http methods to use
+    :cvar chunk_size: The number of reviews to read from the database at once
+    """
+
+    http_method_names = ["get"]
+    chunk_size = 2000
+
+    def get(self, request, *args, **kwargs) -> HttpResponse:
+        """
+        This method is run when the view receives a GET request
+
+        It streams the reviews matching the filters, or returns a 400 error if the filters are invalid
+        """
+
+        form = forms.ExportForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(form.errors.as_text())
+        export_format = form.cleaned_data["format"]
+        reviews = get_export_queryset(
+            form.cleaned_data["session"],
+            form.cleaned_data["rubric"],
+            form.cleaned_data["start"],
+            form.cleaned_data["end"],
+        )
+        response = StreamingHttpResponse(
+            export(reviews, export_format, self.chunk_size),
+            content_type=EXPORT_FORMATS[export_format],
+        )
+        response[
+            "Content-Disposition"
+        ] = f'attachment; filename="grades.{export_format}"'
+        return response
@@ -10,3 +10,4 @@ from . import models
 # We'll be using our own system for Rubric creation in production, so we only run this in debug
 if settings.DEBUG:
     admin.site.register(models.Review)
+    admin.site.register(models.Notification)
@@ -0,0 +1,210 @@
+"""
+    This file exports the grades of completed reviews as CSV or JSON Lines.
+    Reviews are read from the database in chunks, each with its own keyset query, and written out one at a time,
+    so exporting every review takes the same memory as exporting a few, on every database backend
+"""
+
+import csv
+from datetime import date, timedelta
+from json import dumps
+from typing import Iterable, Iterator, Optional
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch, QuerySet
+
+from Instructor.models import Rubric, ScoredRow
+from Main.models import Review
+from Main.pagination import KeysetPaginator
+
+EXPORT_FORMATS = {"csv": "text/csv", "jsonl": "application/jsonl"}
+
+CSV_COLUMNS = [
+    "id",
+    "schoology_id",
+    "student",
+    "student_username",
+    "session",
+    "reviewer",
+    "reviewer_username",
+    "rubric",
+    "date_created",
+    "date_completed",
+    "score_total",
+    "score_max",
+    "scores",
+]
+
+
+class Echo:
+    """
+    This class is a file-like object that gives back whatever is written to it,
+    so `csv.writer` can build one line at a time without buffering the whole file
+    """
+
+    @staticmethod
+    def write(value: str) -> str:
+        """
+        This function returns the value instead of writing it
+
+        :param value: The value to write
+        :type value: str
+        :returns: The value
+        :rtype: str
+        """
+
+        return value
+
+
+def get_export_queryset(
+    session: Optional[str] = None,
+    rubric: Optional[Rubric] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> QuerySet:
+    """
+    This function gets the completed Reviews to export, with their users, rubric, and scored rows
+
+    :param session: Only export Reviews from students in this session
+    :type session: str
+    :param rubric: Only export Reviews graded with this Rubric
+    :type rubric: Rubric
+    :param start: Only export Reviews completed on or after this day
+    :type start: date
+    :param end: Only export Reviews completed on or before this day
+    :type end: date
+    :returns: The Reviews to export
+    :rtype: QuerySet
+    """
+
+    reviews = Review.objects.filter(status=Review.Status.CLOSED)
+    if session is not None:
+        reviews = reviews.filter(student__session=session)
+    if rubric is not None:
+        reviews = reviews.filter(rubric=rubric)
+    if start is not None:
+        reviews = reviews.filter(date_completed__gte=start)
+    if end is not None:
+        reviews = reviews.filter(date_completed__lt=end + timedelta(days=1))
+    return (
+        reviews.select_related("student", "reviewer", "rubric")
+        .prefetch_related(
+            Prefetch(
+                "scoredrow_set",
+                queryset=ScoredRow.objects.select_related("source_row").order_by(
+                    "source_row__index"
+                ),
+            )
+        )
+        .order_by("date_completed", "date_created", "id")
+    )
+
+
+def iter_records(reviews: QuerySet, chunk_size: int = 2000) -> Iterator[dict]:
+    """
+    This function turns each Review into a dictionary of the data to export, from the oldest to the newest.
+    Reviews and their scored rows are fetched `chunk_size` Reviews at a time with `KeysetPaginator.iter_pages`,
+    so only one chunk is ever in memory.
+    `QuerySet.iterator` isn't used, since on MySQL it reads every Review into memory before giving back the first
+
+    :param reviews: The Reviews to export, from `get_export_queryset`
+    :type reviews: QuerySet
+    :param chunk_size: The number of Reviews to fetch at once
+    :type chunk_size: int
+    :returns: A dictionary for each Review
+    :rtype: Iterator
+    """
+
+    for chunk in KeysetPaginator(reviews, chunk_size).iter_pages(backwards=True):
+        for review in chunk:
+            yield {
+                "id": review.id,
+                "schoology_id": review.schoology_id,
+                "student": str(review.student),
+                "student_username": review.student.username,
+                "session": review.student.session,
+                "reviewer": None if review.reviewer is None else str(review.reviewer),
+                "reviewer_username": None
+                if review.reviewer is None
+                else review.reviewer.username,
+                "rubric": review.rubric.name,
+                "date_created": review.date_created,
+                "date_completed": review.date_completed,
+                "score_total": review.score_total,
+                "score_max": review.score_max,
+                "scores": [
+                    {
+                        "row": scored_row.source_row.name,
+                        "score": scored_row.score,
+                        "max_score": scored_row.source_row.max_score,
+                    }
+                    for scored_row in review.scoredrow_set.all()
+                ],
+            }
+
+
+def format_scores(scores: list[dict]) -> str:
+    """
+    This function formats the scored rows of a Review to fit in one CSV cell
+
+    :param scores: The scored rows, from `iter_records`
+    :type scores: list
+    :returns: The scores, like "Row: 5.0/10.0; Other Row: 2.0/2.0"
+    :rtype: str
+    """
+
+    return "; ".join(
+        f"{row['row']}: {row['score']}/{row['max_score']}" for row in scores
+    )
+
+
+def iter_csv(records: Iterable[dict]) -> Iterator[str]:
+    """
+    This function writes records as CSV, one line at a time
+
+    :param records: The records to write, from `iter_records`
+    :type records: Iterable
+    :returns: The header, then a line for each record
+    :rtype: Iterator
+    """
+
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for record in records:
+        record["scores"] = format_scores(record["scores"])
+        yield writer.writerow(
+            ["" if record[column] is None else record[column] for column in CSV_COLUMNS]
+        )
+
+
+def iter_jsonl(records: Iterable[dict]) -> Iterator[str]:
+    """
+    This function writes records as JSON Lines, one line at a time
+
+    :param records: The records to write, from `iter_records`
+    :type records: Iterable
+    :returns: A line of JSON for each record
+    :rtype: Iterator
+    """
+
+    for record in records:
+        yield dumps(record, cls=DjangoJSONEncoder) + "\n"
+
+
+def export(
+    reviews: QuerySet, export_format: str, chunk_size: int = 2000
+) -> Iterator[str]:
+    """
+    This function exports Reviews in a format
+
+    :param reviews: The Reviews to export, from `get_export_queryset`
+    :type reviews: QuerySet
+    :param export_format: The format to export in, one of `EXPORT_FORMATS`
+    :type export_format: str
+    :param chunk_size: The number of Reviews to fetch at once
+    :type chunk_size: int
+    :returns: The lines of the export
+    :rtype: Iterator
+    """
+
+    writer = iter_csv if export_format == "csv" else iter_jsonl
+    return writer(iter_records(reviews, chunk_size))
@@ -6,12 +6,13 @@ from json import JSONDecoder, JSONDecodeError
 from re import fullmatch
 from typing import List
 
+from django.db import transaction
 from django.db.models import Q
 from django.forms import ModelForm, TextInput, Textarea, ValidationError
 from django.forms.fields import CharField
 from jsonschema.validators import Draft202012Validator
 
-from Instructor.models import RubricRow, ScoredRow
+from Instructor.models import ScoredRow
 from . import models
 
 
@@ -145,6 +146,7 @@ class GradeReviewForm(ModelForm):
     :cvar _validation_schema: The schema used to ensure JSON is valid
     :cvar field_order: The order in which fields will appear in the form
     :ivar _json_validator: The validator used to ensure JSON is formatted correctly
+    :ivar score_matrix: The valid scores for each row of the rubric, see `Rubric.score_matrix`
     """
 
     is_draft = CharField(widget=IsDraftWidget, required=True, initial="false")
@@ -171,7 +173,8 @@ class GradeReviewForm(ModelForm):
             self.fields["scores"].widget.review = instance
         else:
             raise ValueError("An instance must be provided to GradeReviewForm!")
-        target_item_length = self.rubric.rubricrow_set.count()
+        self.score_matrix = self.rubric.score_matrix()
+        target_item_length = len(self.score_matrix)
         self._validation_schema["maxItems"] = target_item_length
         self._validation_schema["minItems"] = target_item_length
         self._json_validator = Draft202012Validator(self._validation_schema)
@@ -193,6 +196,8 @@ class GradeReviewForm(ModelForm):
         """
         This function runs when the Form is saving
         It reads the scores from JSON and makes ScoredRow objects
+        New rows are created and changed rows are updated in bulk, rows with the same score are skipped
+        If the Review is being completed, its score totals are saved as well
 
         :param commit: Whether to save the changes to the database
         :type commit: bool
@@ -202,21 +207,45 @@ class GradeReviewForm(ModelForm):
 
         new_review: models.Review = super(GradeReviewForm, self).save(commit=False)
         scores_array: List[str] = JSONDecoder().decode(self.cleaned_data.get("scores"))
+        rows = {row.index: row for row in self.rubric.rubricrow_set.all()}
+        existing = {
+            scored_row.source_row_id: scored_row
+            for scored_row in new_review.scoredrow_set.all()
+        }
+        to_create, to_update = [], []
         for i in range(len(scores_array)):
             score = float(scores_array[i])
-            row = RubricRow.objects.get(parent_rubric=new_review.rubric, index=i)
-            scored_row = ScoredRow.objects.get_or_create(
-                source_row=row, parent_review=new_review, defaults={"score": score}
-            )
-            scored_row[0].score = score
-            scored_row[0].save()
+            row = rows[i]
+            scored_row = existing.get(row.id, None)
+            if scored_row is None:
+                to_create.append(
+                    ScoredRow(source_row=row, parent_review=new_review, score=score)
+                )
+            elif scored_row.score != score:
+                scored_row.score = score
+                to_update.append(scored_row)
         new_review.status = (
             models.Review.Status.CLOSED
             if self.cleaned_data.get("is_draft") == "false"
             else models.Review.Status.ASSIGNED
         )
-        if commit:
-            new_review.save()
+        if new_review.status == models.Review.Status.CLOSED:
+            scored_rows = list(existing.values()) + to_create
+            max_scores = {row.id: row.max_score for row in rows.values()}
+            new_review.score_total = float(
+                sum(scored_row.score for scored_row in scored_rows)
+            )
+            new_review.score_max = float(
+                sum(
+                    max_scores.get(scored_row.source_row_id, 0)
+                    for scored_row in scored_rows
+                )
+            )
+        with transaction.atomic():
+            ScoredRow.objects.bulk_create(to_create)
+            ScoredRow.objects.bulk_update(to_update, ["score"])
+            if commit:
+                new_review.save()
         return new_review
 
     field_order = ["scores", "additional_comments"]
@@ -239,17 +268,13 @@ class GradeReviewForm(ModelForm):
                 errors = sorted(self._json_validator.iter_errors(parsed), key=str)
                 [self.add_error("scores", f"{error.message}") for error in errors]
                 if len(errors) == 0:
-                    for index, row in enumerate(self.rubric.rubricrow_set.all()):
+                    for index, valid_scores in enumerate(self.score_matrix):
                         if parsed[index] < 0 and not cleaned_data.get("is_draft"):
                             self.add_error(
                                 "scores",
                                 f"Row {index + 1} is -1.",
                             )
-                        if (
-                            parsed[index] != -1
-                            and row.rubriccell_set.filter(score=parsed[index]).exists()
-                            is False
-                        ):
+                        if parsed[index] != -1 and parsed[index] not in valid_scores:
                             self.add_error(
                                 "scores",
                                 f"Invalid score: {parsed[index]} for row {index + 1}",
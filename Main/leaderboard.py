@@ -0,0 +1,154 @@
+"""
+    This file builds the leaderboard and keeps a copy of it in the cache.
+    The cache may be per process, so the version of the leaderboard is kept in the database,
+    and every worker rebuilds its copy once the version changes
+"""
+
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from Users.models import User
+
+from .models import LeaderboardVersion
+
+CACHE_KEY = "leaderboard"
+
+
+class LeaderboardEntry(NamedTuple):
+    """
+    This class represents a row on the leaderboard
+
+    :cvar id: The id of the user
+    :cvar name: The name to display for the user
+    :cvar session: The session the user is in
+    :cvar count: The number of reviews the user has completed
+    """
+
+    id: object
+    name: str
+    session: str
+    count: int
+
+
+class Leaderboard(NamedTuple):
+    """
+    This class holds a snapshot of the leaderboard
+
+    :cvar version: The `LeaderboardVersion` the snapshot was built for, used as the ETag
+    :cvar updated: When that version was made, the same for every worker
+    :cvar reviewees: Every student, ordered by reviews completed as a reviewee
+    :cvar reviewers: Every reviewer, ordered by reviews completed as a reviewer
+    """
+
+    version: str
+    updated: datetime
+    reviewees: list[LeaderboardEntry]
+    reviewers: list[LeaderboardEntry]
+
+    def filter(
+        self, entries: list[LeaderboardEntry], session: Optional[str]
+    ) -> list[LeaderboardEntry]:
+        """
+        This function limits a list of entries to users in a session
+
+        :param entries: The entries to filter, either `Leaderboard.reviewees` or `Leaderboard.reviewers`
+        :type entries: list
+        :param session: The session to keep ("AM" or "PM"), or None to keep everyone
+        :type session: str
+        :returns: The entries in the session
+        :rtype: list
+        """
+
+        if session is None:
+            return entries
+        return [entry for entry in entries if entry.session == session]
+
+
+def build_leaderboard(current: LeaderboardVersion) -> Leaderboard:
+    """
+    This function builds a new snapshot of the leaderboard with one query
+
+    :param current: The version of the leaderboard the snapshot is for
+    :type current: LeaderboardVersion
+    :returns: The new snapshot
+    :rtype: Leaderboard
+    """
+
+    users = list(
+        User.objects.exclude(is_superuser=True).only(
+            "id",
+            "username",
+            "first_name",
+            "last_name",
+            "session",
+            "is_reviewer",
+            "reviews_done_as_reviewee",
+            "reviews_done_as_reviewer",
+        )
+    )
+    reviewees = sorted(users, key=lambda user: -user.reviews_done_as_reviewee)
+    reviewers = sorted(
+        (user for user in users if user.is_reviewer),
+        key=lambda user: -user.reviews_done_as_reviewer,
+    )
+    return Leaderboard(
+        version=str(current.version),
+        updated=current.date_updated,
+        reviewees=[
+            LeaderboardEntry(
+                user.id, str(user), user.session, user.reviews_done_as_reviewee
+            )
+            for user in reviewees
+        ],
+        reviewers=[
+            LeaderboardEntry(
+                user.id, str(user), user.session, user.reviews_done_as_reviewer
+            )
+            for user in reviewers
+        ],
+    )
+
+
+def get_leaderboard() -> Leaderboard:
+    """
+    This function gets the cached snapshot of the leaderboard,
+    building it if it isn't cached or was built for an older version.
+    Snapshots are kept for `settings.LEADERBOARD_CACHE_TIMEOUT` seconds
+
+    :returns: The snapshot
+    :rtype: Leaderboard
+    """
+
+    current = LeaderboardVersion.get_current()
+    leaderboard = cache.get(CACHE_KEY)
+    if leaderboard is None or leaderboard.version != str(current.version):
+        leaderboard = build_leaderboard(current)
+        cache.set(CACHE_KEY, leaderboard, timeout=settings.LEADERBOARD_CACHE_TIMEOUT)
+    return leaderboard
+
+
+def clear_leaderboard() -> None:
+    """
+    This function moves the leaderboard to a new version, so every worker rebuilds it the next time it's viewed
+    """
+
+    LeaderboardVersion.bump()
+    cache.delete(CACHE_KEY)
+
+
+def refresh_leaderboard() -> Leaderboard:
+    """
+    This function moves the leaderboard to a new version, then builds a new snapshot of it and caches it.
+    The other workers rebuild theirs the next time it's viewed
+
+    :returns: The new snapshot
+    :rtype: Leaderboard
+    """
+
+    LeaderboardVersion.bump()
+    leaderboard = build_leaderboard(LeaderboardVersion.get_current())
+    cache.set(CACHE_KEY, leaderboard, timeout=settings.LEADERBOARD_CACHE_TIMEOUT)
+    return leaderboard
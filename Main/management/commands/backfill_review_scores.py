@@ -0,0 +1,43 @@
+"""
+    This file defines a command that saves the score totals on completed reviews
+"""
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from Main.models import Review
+
+
+class Command(BaseCommand):
+    """
+    This command fills in `Review.score_total` and `Review.score_max` for completed reviews,
+    it's meant to be run once after upgrading, or after editing ScoredRow objects by hand
+
+    :cvar help: The help text to display for the command
+    """
+
+    help = "Saves the score totals on completed reviews"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        This function defines the arguments the command takes
+
+        :param parser: The parser to add the arguments to
+        :type parser: CommandParser
+        """
+
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recalculate every completed review, not just the ones missing totals",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """
+        This function is run when the command is called
+        """
+
+        reviews = Review.objects.filter(status=Review.Status.CLOSED)
+        if not options["all"]:
+            reviews = reviews.filter(score_total__isnull=True)
+        updated = Review.update_scores(reviews)
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} review(s)"))
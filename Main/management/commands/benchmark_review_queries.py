@@ -0,0 +1,339 @@
+"""
+    This file defines a command that measures how fast the review queue queries are on a large database
+"""
+
+from datetime import timedelta
+from random import Random
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from Instructor.models import Rubric
+from Instructor.views import AdminHomeView
+from Main.models import Review
+from Main.pagination import KeysetPaginator
+from Main.views import HomeView, ReviewCompleteListView
+from Users.models import User
+
+
+class Command(BaseCommand):
+    """
+    This command fills the database with fake reviews, then prints the plan and timings of the queries
+    the home pages and the completed reviews list run.
+    The planner statistics are refreshed before timing, so the plans reflect the fake data.
+    Everything it creates is rolled back when it's done (or deleted, on MySQL where refreshing the statistics commits),
+    so it can be pointed at any of the supported databases.
+    Run it once with `--without-indexes` and once without to compare the indexes on `Review`
+
+    :cvar help: The help text to display for the command
+    """
+
+    help = "Benchmarks the review queue queries on fake data, then rolls it back"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        This function defines the arguments the command takes
+
+        :param parser: The parser to add the arguments to
+        :type parser: CommandParser
+        """
+
+        parser.add_argument(
+            "--reviews",
+            type=int,
+            default=100000,
+            help="The number of fake reviews to create",
+        )
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=200,
+            help="The number of fake users to create",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="The number of times to run each query",
+        )
+        parser.add_argument(
+            "--without-indexes",
+            action="store_true",
+            help="Drop the indexes on Review before running the queries",
+        )
+        parser.add_argument(
+            "--no-explain",
+            action="store_true",
+            help="Don't print the query plans",
+        )
+
+    def seed(self, review_count: int, user_count: int) -> tuple[User, User]:
+        """
+        This function creates the fake users and reviews
+
+        :param review_count: The number of reviews to create
+        :type review_count: int
+        :param user_count: The number of users to create
+        :type user_count: int
+        :returns: A student and a reviewer to run the queries as
+        :rtype: tuple
+        """
+
+        random = Random(0)
+        users = User.objects.bulk_create(
+            User(
+                username=f"benchmark-{i}",
+                password="!",
+                session=User.Session.AM if i % 2 == 0 else User.Session.PM,
+                is_reviewer=i % 4 == 0,
+            )
+            for i in range(user_count)
+        )
+        if users[0].pk is None:
+            # Some databases (MySQL) don't return the ids of rows created in bulk
+            users = list(
+                User.objects.filter(
+                    username__in=[user.username for user in users]
+                ).order_by("id")
+            )
+        reviewers = [user for user in users if user.is_reviewer]
+        rubric = Rubric.objects.create(name="Benchmark Rubric", max_score=0)
+        now = timezone.now()
+        reviews = []
+        for i in range(review_count):
+            status = random.choices(
+                [Review.Status.OPEN, Review.Status.ASSIGNED, Review.Status.CLOSED],
+                weights=[1, 1, 8],
+            )[0]
+            reviews.append(
+                Review(
+                    student=random.choice(users),
+                    reviewer=None
+                    if status == Review.Status.OPEN
+                    else random.choice(reviewers),
+                    schoology_id=f"{i % 100:02}.00.00",
+                    status=status,
+                    rubric=rubric,
+                    date_completed=now - timedelta(minutes=i)
+                    if status == Review.Status.CLOSED
+                    else None,
+                )
+            )
+        Review.objects.bulk_create(reviews, batch_size=1000)
+        self.rubric = rubric
+        self.users = users
+        return users[1], reviewers[0]
+
+    def remove_seed(self) -> None:
+        """
+        This function deletes the fake users and reviews made by `Command.seed`,
+        for databases where refreshing the statistics commits the transaction so it can't be rolled back
+        """
+
+        self.rubric.delete()
+        User.objects.filter(pk__in=[user.pk for user in self.users]).delete()
+
+    @staticmethod
+    def analyze_tables() -> bool:
+        """
+        This function refreshes the planner statistics of the tables the queries read,
+        so the plans and timings reflect the fake data
+
+        :returns: Whether the transaction was committed by the database to do it (MySQL)
+        :rtype: bool
+        """
+
+        tables = [
+            connection.ops.quote_name(model._meta.db_table) for model in (Review, User)
+        ]
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                for table in tables:
+                    cursor.execute(f"ANALYZE {table}")
+            elif connection.vendor == "mysql":
+                cursor.execute(f"ANALYZE TABLE {', '.join(tables)}")
+                return True
+            elif connection.vendor == "sqlite":
+                cursor.execute("ANALYZE")
+        return False
+
+    @staticmethod
+    def drop_indexes() -> None:
+        """
+        This function drops the indexes defined in `Review.Meta`, inside the current transaction
+        """
+
+        schema_editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for index in Review._meta.indexes:
+                cursor.execute(str(index.remove_sql(Review, schema_editor)))
+
+    @staticmethod
+    def get_queries(student: User, reviewer: User) -> dict[str, QuerySet]:
+        """
+        This function gets the queries to benchmark.
+        They're built with the same `ReviewQuerySet` methods and page sizes the views use,
+        so the timings and plans are for the queries production runs
+
+        :param student: The student to run the queries as
+        :type student: User
+        :param reviewer: The reviewer to run the queries as
+        :type reviewer: User
+        :returns: A dictionary of query names to the query
+        :rtype: dict
+        """
+
+        # The instructor's list doesn't depend on who they are, so an unsaved instructor is enough
+        instructor = User(is_superuser=True)
+        per_page = ReviewCompleteListView.paginate_by
+        instructor_list = KeysetPaginator(
+            Review.objects.completed_list(instructor, User.Session.AM), per_page
+        )
+        first_page = list(instructor_list.page_query())[:per_page]
+        last_row = (
+            [getattr(first_page[-1], key) for key in instructor_list.keys]
+            if len(first_page) > 0
+            else None
+        )
+        return {
+            "home: student ongoing": Review.objects.ongoing_for(student),
+            "home: reviewer ongoing": Review.objects.ongoing_for(reviewer),
+            "home: completed preview": Review.objects.completed_preview(
+                reviewer, HomeView.preview_size
+            ),
+            "admin home: ongoing": Review.objects.ongoing(),
+            "admin home: counts": Review.objects.session_status_counts(),
+            "admin home: completed preview": Review.objects.completed_preview_by_session(
+                AdminHomeView.preview_size
+            ),
+            "completed list: instructor": instructor_list.page_query(),
+            "completed list: instructor, next page": instructor_list.page_query(
+                False, last_row
+            ),
+            "completed list: user": KeysetPaginator(
+                Review.objects.completed_list(reviewer, None), per_page
+            ).page_query(),
+        }
+
+    @staticmethod
+    def get_counts(student: User, reviewer: User) -> dict[str, QuerySet]:
+        """
+        This function gets the queries the views only count the rows of
+
+        :param student: The student to run the queries as
+        :type student: User
+        :param reviewer: The reviewer to run the queries as
+        :type reviewer: User
+        :returns: A dictionary of query names to the query to count
+        :rtype: dict
+        """
+
+        return {
+            "home: student completed count": Review.objects.involving(
+                student
+            ).completed(),
+            "home: reviewer completed count": Review.objects.involving(
+                reviewer
+            ).completed(),
+        }
+
+    @staticmethod
+    def explain(query: QuerySet) -> str:
+        """
+        This function gets the plan the database uses for a query.
+        `QuerySet.explain` puts the EXPLAIN inside the subquery that a filter on a window function is wrapped in,
+        so the prefix is added to the whole statement here instead
+
+        :param query: The query to explain
+        :type query: QuerySet
+        :returns: The plan, one row on each line
+        :rtype: str
+        """
+
+        sql, params = query.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+            return "\n".join(
+                " ".join(str(column) for column in row) for row in cursor.fetchall()
+            )
+
+    def time_queries(
+        self, student: User, reviewer: User, repeat: int, no_explain: bool
+    ) -> None:
+        """
+        This function runs each query, then prints its timings and plan.
+        The plan of a count is shown for selecting the ids of the rows it counts
+
+        :param student: The student to run the queries as
+        :type student: User
+        :param reviewer: The reviewer to run the queries as
+        :type reviewer: User
+        :param repeat: The number of times to run each query
+        :type repeat: int
+        :param no_explain: Whether to leave out the query plans
+        :type no_explain: bool
+        """
+
+        queries = [
+            (name, query, False)
+            for name, query in self.get_queries(student, reviewer).items()
+        ] + [
+            (name, query, True)
+            for name, query in self.get_counts(student, reviewer).items()
+        ]
+        for name, query, counted in queries:
+            timings = []
+            for _ in range(repeat):
+                start = perf_counter()
+                rows = query.count() if counted else len(query.all())
+                timings.append(perf_counter() - start)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{name}: {rows} row(s), "
+                    f"best {min(timings) * 1000:.2f}ms, "
+                    f"mean {sum(timings) / len(timings) * 1000:.2f}ms"
+                )
+            )
+            if not no_explain:
+                self.stdout.write(
+                    self.explain(query.order_by().values("pk") if counted else query)
+                )
+
+    def handle(self, *args, **options) -> None:
+        """
+        This function is run when the command is called
+        """
+
+        if options["reviews"] < 1 or options["users"] < 4 or options["repeat"] < 1:
+            raise CommandError(
+                "At least 1 review, 4 users and 1 repeat are needed to run the benchmark"
+            )
+        if options["without_indexes"] and not connection.features.can_rollback_ddl:
+            raise CommandError(
+                f"Dropping the indexes can't be rolled back on {connection.vendor}"
+            )
+
+        committed = False
+        try:
+            with transaction.atomic():
+                start = perf_counter()
+                student, reviewer = self.seed(options["reviews"], options["users"])
+                self.stdout.write(
+                    f"Created {options['reviews']} reviews on {connection.vendor} "
+                    f"in {perf_counter() - start:.2f}s"
+                )
+                if options["without_indexes"]:
+                    self.drop_indexes()
+                    self.stdout.write("Dropped the indexes on Review")
+                committed = self.analyze_tables()
+                self.stdout.write("Refreshed the planner statistics")
+                self.time_queries(
+                    student, reviewer, options["repeat"], options["no_explain"]
+                )
+                transaction.set_rollback(True)
+        finally:
+            if committed:
+                self.remove_seed()
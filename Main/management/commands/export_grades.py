@@ -0,0 +1,90 @@
+"""
+    This file defines a command that exports the grades of completed reviews
+"""
+
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from Instructor.models import Rubric
+from Main.export import EXPORT_FORMATS, export, get_export_queryset
+from Users.models import User
+
+
+class Command(BaseCommand):
+    """
+    This command writes the grades of completed reviews as CSV or JSON Lines, the same as the export page.
+    Reviews are written as they're read, so large exports don't have to fit in memory
+
+    :cvar help: The help text to display for the command
+    """
+
+    help = "Exports the grades of completed reviews as CSV or JSON Lines"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        This function defines the arguments the command takes
+
+        :param parser: The parser to add the arguments to
+        :type parser: CommandParser
+        """
+
+        parser.add_argument(
+            "--format",
+            choices=list(EXPORT_FORMATS),
+            default="csv",
+            help="The format to export in",
+        )
+        parser.add_argument(
+            "--session",
+            choices=User.Session.values,
+            help="Only export reviews from students in this session",
+        )
+        parser.add_argument(
+            "--rubric", help="Only export reviews graded with the rubric with this id"
+        )
+        parser.add_argument(
+            "--start",
+            type=date.fromisoformat,
+            help="Only export reviews completed on or after this day (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--end",
+            type=date.fromisoformat,
+            help="Only export reviews completed on or before this day (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="The number of reviews to read from the database at once",
+        )
+        parser.add_argument(
+            "--output", help="The file to write to, defaults to standard output"
+        )
+
+    def handle(self, *args, **options) -> None:
+        """
+        This function is run when the command is called
+        """
+
+        if options["chunk_size"] < 1:
+            raise CommandError("The chunk size must be at least 1")
+        rubric = None
+        if options["rubric"] is not None:
+            try:
+                rubric = Rubric.objects.get(id=options["rubric"])
+            except (Rubric.DoesNotExist, ValidationError):
+                raise CommandError("The given rubric doesn't exist")
+
+        reviews = get_export_queryset(
+            options["session"], rubric, options["start"], options["end"]
+        )
+        lines = export(reviews, options["format"], options["chunk_size"])
+        if options["output"] is None:
+            for line in lines:
+                self.stdout.write(line, ending="")
+        else:
+            with open(options["output"], "w", newline="", encoding="utf-8") as file:
+                file.writelines(lines)
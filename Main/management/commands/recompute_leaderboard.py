@@ -0,0 +1,30 @@
+"""
+    This file defines a command that rebuilds the leaderboard counters from completed reviews
+"""
+
+from django.core.management.base import BaseCommand
+
+from Main.leaderboard import refresh_leaderboard
+from Main.models import Review
+from Users.ldap_cache import clear_identity_caches
+
+
+class Command(BaseCommand):
+    """
+    This command recounts how many reviews each user has done as a reviewer and as a student,
+    it can be used to repair the counters if they drift, or run on a schedule to rebuild the cached leaderboard
+
+    :cvar help: The help text to display for the command
+    """
+
+    help = "Rebuilds the leaderboard counters from completed reviews"
+
+    def handle(self, *args, **options) -> None:
+        """
+        This function is run when the command is called
+        """
+
+        updated = Review.update_user_counts()
+        clear_identity_caches()
+        refresh_leaderboard()
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} user(s)"))
@@ -0,0 +1,141 @@
+"""
+    This file defines a command that summarizes the request metrics logged by `RequestMetricsMiddleware`
+"""
+
+from json import JSONDecodeError, loads
+from math import ceil
+from typing import Iterable
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.urls import URLPattern
+
+from Instructor.urls import urlpatterns as instructor_urlpatterns
+from Main.urls import urlpatterns as main_urlpatterns
+
+METRICS = ("total_ms", "db_ms", "template_ms", "queries")
+
+PERCENTILES = (50, 95, 99)
+
+
+def get_url_names(patterns: Iterable[URLPattern]) -> list[str]:
+    """
+    This function gets the names of a list of url patterns
+
+    :param patterns: The url patterns
+    :type patterns: Iterable
+    :returns: The names of the patterns that have one
+    :rtype: list
+    """
+
+    return [pattern.name for pattern in patterns if pattern.name is not None]
+
+
+def percentile(values: list[float], percent: int) -> float:
+    """
+    This function gets a percentile of a sorted list of values with the nearest-rank method
+
+    :param values: The values, sorted from smallest to largest
+    :type values: list
+    :param percent: The percentile to get, from 1 to 100
+    :type percent: int
+    :returns: The smallest value that at least `percent` percent of the values are less than or equal to
+    :rtype: float
+    """
+
+    return values[max(ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    """
+    This command reads the request metrics log and prints the 50th, 95th and 99th percentile of a metric
+    for each url name in the Main and Instructor apps
+
+    :cvar help: The help text to display for the command
+    """
+
+    help = "Prints p50/p95/p99 request metrics for each url name"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        This function defines the arguments the command takes
+
+        :param parser: The parser to add the arguments to
+        :type parser: CommandParser
+        """
+
+        parser.add_argument(
+            "log_files",
+            nargs="*",
+            help="The log files to read, defaults to settings.REQUEST_METRICS_LOG_FILE",
+        )
+        parser.add_argument(
+            "--metric",
+            choices=METRICS,
+            default="total_ms",
+            help="The metric to report on",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Include requests to urls outside the Main and Instructor apps",
+        )
+
+    def read_records(self, log_files: list[str]) -> Iterable[dict]:
+        """
+        This function reads the records from the log files, skipping any line that isn't a record
+
+        :param log_files: The paths of the files to read
+        :type log_files: list
+        :returns: The records
+        :rtype: Iterable
+        """
+
+        for log_file in log_files:
+            try:
+                with open(log_file, "r", encoding="utf-8") as file:
+                    for line in file:
+                        try:
+                            record = loads(line)
+                        except JSONDecodeError:
+                            continue
+                        if isinstance(record, dict):
+                            yield record
+            except OSError as error:
+                raise CommandError(f"Couldn't read {log_file}: {error.strerror}")
+
+    def handle(self, *args, **options) -> None:
+        """
+        This function is run when the command is called
+        """
+
+        url_names = get_url_names(main_urlpatterns) + get_url_names(
+            instructor_urlpatterns
+        )
+        metric = options["metric"]
+        values = {name: [] for name in url_names}
+        log_files = options["log_files"] or [settings.REQUEST_METRICS_LOG_FILE]
+        for record in self.read_records(log_files):
+            name = record.get("view")
+            if not isinstance(record.get(metric), (int, float)):
+                continue
+            if name in values or (options["all"] and name is not None):
+                values.setdefault(name, []).append(record[metric])
+
+        rows = [(name, sorted(found)) for name, found in values.items() if found]
+        if len(rows) == 0:
+            self.stdout.write(self.style.WARNING("No requests found"))
+            return
+        width = max(len(name) for name, _ in rows)
+        self.stdout.write(
+            f"{'url name':<{width}}  {'requests':>8}"
+            + "".join(f"  {f'p{percent}':>10}" for percent in PERCENTILES)
+            + f"  ({metric})"
+        )
+        for name, found in sorted(rows, key=lambda row: -percentile(row[1], 95)):
+            self.stdout.write(
+                f"{name:<{width}}  {len(found):>8}"
+                + "".join(
+                    f"  {percentile(found, percent):>10.1f}" for percent in PERCENTILES
+                )
+            )
@@ -0,0 +1,46 @@
+"""
+    This file defines a command that sends queued emails about reviews
+"""
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from Main.notifications import send_notifications
+
+
+class Command(BaseCommand):
+    """
+    This command sends the emails queued when `settings.NOTIFICATIONS_ASYNC` is set.
+    It should be run on a schedule, before django-mailer's `send_mail`.
+    Runs that overlap never send the same notification twice
+
+    :cvar help: The help text to display for the command
+    """
+
+    help = "Sends queued emails about reviews"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        This function defines the arguments the command takes
+
+        :param parser: The parser to add the arguments to
+        :type parser: CommandParser
+        """
+
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="The max number of notifications to send",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """
+        This function is run when the command is called
+        """
+
+        if options["limit"] is not None and options["limit"] < 1:
+            raise CommandError("The limit must be at least 1")
+        sent, emails = send_notifications(options["limit"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Sent {sent} notification(s) as {emails} email(s)")
+        )
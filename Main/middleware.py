@@ -0,0 +1,201 @@
+"""
+    This file defines middleware that measures how many queries and how much time each request takes
+"""
+
+import logging
+from contextlib import ExitStack
+from json import dumps
+from random import random
+from time import perf_counter
+from typing import Callable
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+from django.template.response import SimpleTemplateResponse
+from django.utils.functional import empty
+
+logger = logging.getLogger("Main.metrics")
+
+
+class RequestMetrics:
+    """
+    This class collects the measurements of one request
+
+    :ivar queries: The number of SQL queries run
+    :ivar db_time: The time spent running SQL queries, in seconds
+    :ivar template_time: The time spent rendering the response's template, in seconds
+    :ivar total_time: The time spent handling the request, in seconds
+    :ivar template_start: When the template started rendering, if it's rendering right now
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.total_time = 0.0
+        self.template_start = None
+
+    def record_query(self, execute: Callable, sql, params, many, context):
+        """
+        This function is installed with `execute_wrapper` on every database connection, it times each query
+
+        :param execute: The function that runs the query
+        :type execute: Callable
+        :returns: The result of the query
+        """
+
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - start
+            self.queries += 1
+
+    def start_template(self) -> None:
+        """
+        This function is called right before the response's template is rendered
+        """
+
+        self.template_start = perf_counter()
+
+    def end_template(self, response: HttpResponse) -> None:
+        """
+        This function is called right after the response's template is rendered
+
+        :param response: The rendered response
+        :type response: HttpResponse
+        """
+
+        if self.template_start is not None:
+            self.template_time += perf_counter() - self.template_start
+            self.template_start = None
+
+    def server_timing(self) -> str:
+        """
+        This function formats the measurements as a `Server-Timing` header, in milliseconds
+
+        :returns: The value of the header
+        :rtype: str
+        """
+
+        return ", ".join(
+            [
+                f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+                f"template;dur={self.template_time * 1000:.1f}",
+                f"total;dur={self.total_time * 1000:.1f}",
+            ]
+        )
+
+    def to_record(self, request: HttpRequest, response: HttpResponse) -> dict:
+        """
+        This function gets the measurements as a dictionary to log
+
+        :param request: The request that was measured
+        :type request: HttpRequest
+        :param response: The response to the request
+        :type response: HttpResponse
+        :returns: The measurements, with the URL name, method, path, and status of the request
+        :rtype: dict
+        """
+
+        match = getattr(request, "resolver_match", None)
+        return {
+            "view": None if match is None else match.view_name,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": self.queries,
+            "db_ms": round(self.db_time * 1000, 2),
+            "template_ms": round(self.template_time * 1000, 2),
+            "total_ms": round(self.total_time * 1000, 2),
+        }
+
+
+class RequestMetricsMiddleware:
+    """
+    This middleware counts the queries and times the database, template rendering and total time of every request.
+    The measurements are sent back in a `Server-Timing` header to staff users, or to everyone if
+    `settings.REQUEST_METRICS_SERVER_TIMING` is set,
+    and a sample of `settings.REQUEST_METRICS_SAMPLE_RATE` requests are logged as JSON to the "Main.metrics" logger,
+    which the `request_metrics_report` command reads.
+    It should be the first middleware, so it times everything else
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        """
+        This function sets up the middleware
+
+        :param get_response: The next middleware or view to call
+        :type get_response: Callable
+        """
+
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        """
+        This function measures the request while the rest of Django handles it
+
+        :param request: The request to handle
+        :type request: HttpRequest
+        :returns: The response, with a `Server-Timing` header
+        :rtype: HttpResponse
+        """
+
+        metrics = RequestMetrics()
+        request.metrics = metrics
+        start = perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics.record_query))
+            response = self.get_response(request)
+        metrics.total_time = perf_counter() - start
+
+        if self.send_server_timing(request):
+            response["Server-Timing"] = metrics.server_timing()
+        if random() < settings.REQUEST_METRICS_SAMPLE_RATE:
+            logger.info(dumps(metrics.to_record(request, response)))
+        return response
+
+    @staticmethod
+    def send_server_timing(request: HttpRequest) -> bool:
+        """
+        This function checks if the measurements should be sent back in a `Server-Timing` header.
+        The header shows how long the database took, so it's only sent to everyone if
+        `settings.REQUEST_METRICS_SERVER_TIMING` is set, and otherwise only to staff users.
+        The user is only checked if the request already loaded them, since loading them here would run queries
+        after the request was measured
+
+        :param request: The request that was measured
+        :type request: HttpRequest
+        :returns: Whether to send the header
+        :rtype: bool
+        """
+
+        if settings.REQUEST_METRICS_SERVER_TIMING:
+            return True
+        user = getattr(request, "user", None)
+        if user is None or getattr(user, "_wrapped", None) is empty:
+            return False
+        return user.is_staff
+
+    def process_template_response(
+        self, request: HttpRequest, response: SimpleTemplateResponse
+    ) -> SimpleTemplateResponse:
+        """
+        This function is called right before a TemplateResponse is rendered, it starts timing the rendering.
+        Since this is the first middleware, it's the last one called before rendering
+
+        :param request: The request being handled
+        :type request: HttpRequest
+        :param response: The response about to be rendered
+        :type response: SimpleTemplateResponse
+        :returns: The same response
+        :rtype: SimpleTemplateResponse
+        """
+
+        metrics: RequestMetrics = getattr(request, "metrics", None)
+        if metrics is not None:
+            metrics.start_template()
+            response.add_post_render_callback(metrics.end_template)
+        return response
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.4 on 2026-10-17 22:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("Main", "0002_alter_review_reviewer"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="review",
+            name="score_max",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="review",
+            name="score_total",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
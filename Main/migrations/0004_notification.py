@@ -0,0 +1,42 @@
+# Generated by Django 4.2.4 on 2026-10-17 22:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("Main", "0003_review_score_totals"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Notification",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("subject_template", models.CharField(max_length=200)),
+                ("text_template", models.TextField()),
+                ("template_name", models.CharField(max_length=100)),
+                ("recipients", models.JSONField(default=list)),
+                ("date_created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "review",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="Main.review"
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["date_created"],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.4 on 2026-10-17 22:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("Main", "0004_notification"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["status", "-date_completed", "-date_created"],
+                name="review_status_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["reviewer", "status"], name="review_reviewer_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["student", "status"], name="review_student_status_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.4 on 2026-10-18 00:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("Main", "0005_review_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaderboardVersion",
+            fields=[
+                (
+                    "id",
+                    models.PositiveSmallIntegerField(
+                        default=1, editable=False, primary_key=True, serialize=False
+                    ),
+                ),
+                ("version", models.PositiveIntegerField(default=0)),
+                (
+                    "date_updated",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+        ),
+    ]
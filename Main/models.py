@@ -5,7 +5,10 @@
 from typing import Optional, Union
 from uuid import uuid4, UUID
 
-from django.db import models
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
 
 from Users.models import User
 
@@ -58,6 +61,197 @@ class BaseModel(models.Model):
         return cls._meta.get_field(field_name).max_length
 
 
+class ReviewQuerySet(models.QuerySet):
+    """
+    This QuerySet provides common ways of loading Reviews
+    """
+
+    def claim(
+        self, review_id: Optional[UUID], reviewer: User, limit: int = 2
+    ) -> Optional["Review"]:
+        """
+        This function assigns an open Review to a reviewer, safely when many reviewers claim at once.
+        The reviewer's row is locked while their claimed reviews are counted, so they can't go over the limit,
+        and the Review is only updated if it's still open, so two reviewers can't claim the same Review
+
+        :param review_id: The id of the Review to claim
+        :type review_id: UUID
+        :param reviewer: The reviewer claiming the Review
+        :type reviewer: User
+        :param limit: The max number of Reviews a reviewer can have claimed at once
+        :type limit: int
+        :returns: The claimed Review, or None if the reviewer already has `limit` Reviews claimed
+        :rtype: Review
+        :raises Review.DoesNotExist: If the Review isn't open or isn't in the reviewer's session
+        """
+
+        with transaction.atomic():
+            # Locking the reviewer's row makes claims by the same reviewer wait for each other
+            list(
+                User.objects.select_for_update()
+                .filter(id=reviewer.id)
+                .values_list("id", flat=True)
+            )
+            if (
+                self.filter(reviewer=reviewer, status=Review.Status.ASSIGNED).count()
+                >= limit
+            ):
+                return None
+            claimed = self.filter(
+                id=review_id,
+                status=Review.Status.OPEN,
+                student__in=User.objects.filter(session=reviewer.session),
+            ).update(status=Review.Status.ASSIGNED, reviewer=reviewer)
+        if claimed == 0:
+            raise Review.DoesNotExist()
+        return self.select_related("student", "reviewer").get(id=review_id)
+
+    def with_rubric(self) -> "ReviewQuerySet":
+        """
+        This function loads the users, rubric, rubric rows, rubric cells and scored rows of each Review up front.
+        Templates that render a Review's rubric can then read everything from memory
+
+        :returns: A QuerySet that prefetches everything needed to display a graded rubric
+        :rtype: ReviewQuerySet
+        """
+
+        return self.select_related("student", "reviewer", "rubric").prefetch_related(
+            "rubric__rubricrow_set__rubriccell_set", "scoredrow_set"
+        )
+
+    def involving(self, user: User) -> "ReviewQuerySet":
+        """
+        This function limits the Reviews to the ones a user is the student or reviewer of
+
+        :param user: The user to get the Reviews of
+        :type user: User
+        :returns: The Reviews the user is part of
+        :rtype: ReviewQuerySet
+        """
+
+        return self.filter(models.Q(student=user) | models.Q(reviewer=user))
+
+    def completed(self) -> "ReviewQuerySet":
+        """
+        This function limits the Reviews to the ones that have been graded and closed
+
+        :returns: The closed Reviews
+        :rtype: ReviewQuerySet
+        """
+
+        return self.filter(status=Review.Status.CLOSED)
+
+    def ongoing(self) -> "ReviewQuerySet":
+        """
+        This function limits the Reviews to the ones that aren't closed yet, with their users loaded
+
+        :returns: The open and assigned Reviews
+        :rtype: ReviewQuerySet
+        """
+
+        return self.select_related("student", "reviewer").exclude(
+            status=Review.Status.CLOSED
+        )
+
+    def ongoing_for(self, user: User) -> "ReviewQuerySet":
+        """
+        This function gets the ongoing Reviews shown on a user's home page in one query:
+        the Reviews they requested, the Reviews they claimed, and the open Reviews in their session if they're a reviewer
+
+        :param user: The user viewing their home page
+        :type user: User
+        :returns: The ongoing Reviews for the user, with their users and rubric loaded
+        :rtype: ReviewQuerySet
+        """
+
+        ongoing = models.Q(student=user) | models.Q(
+            reviewer=user, status=Review.Status.ASSIGNED
+        )
+        if user.is_reviewer:
+            ongoing |= models.Q(
+                status=Review.Status.OPEN, student__session=user.session
+            ) & ~models.Q(student=user)
+        return self.ongoing().select_related("rubric").filter(ongoing)
+
+    def completed_preview(self, user: User, size: int) -> "ReviewQuerySet":
+        """
+        This function gets the latest Reviews a user completed, as a plain LIMIT that can use the status/date index
+
+        :param user: The user to get the Reviews of
+        :type user: User
+        :param size: The number of Reviews to get
+        :type size: int
+        :returns: The latest completed Reviews the user is part of, with their users and rubric loaded
+        :rtype: ReviewQuerySet
+        """
+
+        return (
+            self.select_related("student", "reviewer", "rubric")
+            .involving(user)
+            .completed()
+            .order_by("-date_completed", "-date_created")[:size]
+        )
+
+    def completed_preview_by_session(self, size: int) -> "ReviewQuerySet":
+        """
+        This function gets the latest completed Reviews of every session in one query,
+        numbering the Reviews of each session with a window function
+
+        :param size: The number of Reviews to get for each session
+        :type size: int
+        :returns: The latest completed Reviews of each session, with their users loaded
+        :rtype: ReviewQuerySet
+        """
+
+        return (
+            self.select_related("student", "reviewer")
+            .completed()
+            .annotate(
+                session_rank=models.Window(
+                    RowNumber(),
+                    partition_by=models.F("student__session"),
+                    order_by=[
+                        models.F("date_completed").desc(),
+                        models.F("date_created").desc(),
+                    ],
+                )
+            )
+            .filter(session_rank__lte=size)
+        )
+
+    def session_status_counts(self) -> "ReviewQuerySet":
+        """
+        This function counts the Reviews in each session and status with one grouped query
+
+        :returns: Rows with the `student__session`, `status` and `count` of each group
+        :rtype: ReviewQuerySet
+        """
+
+        return (
+            self.values("student__session", "status")
+            .annotate(count=models.Count("id"))
+            .order_by()
+        )
+
+    def completed_list(self, user: User, session: Optional[str]) -> "ReviewQuerySet":
+        """
+        This function gets the Reviews listed on the completed reviews page,
+        every completed Review in a session for an instructor, otherwise the ones the user is part of
+
+        :param user: The user viewing the list
+        :type user: User
+        :param session: The session an instructor asked for
+        :type session: str
+        :returns: The completed Reviews to list, with their users loaded
+        :rtype: ReviewQuerySet
+        """
+
+        query = self.select_related("student", "reviewer").completed()
+        if user.is_superuser:
+            return query.filter(student__session=session)
+        return query.involving(user)
+
+
 class Review(BaseModel):
     """
     This model represents Review in the database
@@ -70,6 +264,8 @@ class Review(BaseModel):
     :cvar additional_comments: Any additional comments the Reviewer has about the Review
     :cvar date_created: The date the Review was created
     :cvar date_completed: The date the Review was completed
+    :cvar score_total: The total score the student got, saved when the Review is completed
+    :cvar score_max: The max score the student could have gotten, saved when the Review is completed
     """
 
     class Status(models.TextChoices):
@@ -106,15 +302,33 @@ class Review(BaseModel):
     )
     date_created = models.DateTimeField(auto_now_add=True)
     date_completed = models.DateTimeField(blank=True, null=True)
+    score_total = models.FloatField(blank=True, null=True)
+    score_max = models.FloatField(blank=True, null=True)
+
+    objects = ReviewQuerySet.as_manager()
 
     class Meta:
         """
         This internal class specifies settings for the model
 
         :cvar ordering: Defines how the object will be ordered when queried
+        :cvar indexes: Compound indexes matching how the review queues are queried,
+         lists filtered by status and ordered like `ordering`, and a user's reviews filtered by status
         """
 
         ordering = ["-date_completed", "-date_created"]
+        indexes = [
+            models.Index(
+                fields=["status", "-date_completed", "-date_created"],
+                name="review_status_date_idx",
+            ),
+            models.Index(
+                fields=["reviewer", "status"], name="review_reviewer_status_idx"
+            ),
+            models.Index(
+                fields=["student", "status"], name="review_student_status_idx"
+            ),
+        ]
 
     def __str__(self) -> str:
         """
@@ -130,20 +344,83 @@ class Review(BaseModel):
         """
         This function returns the score a student got as a fraction.
         It will only run if the Review is closed
+        If the totals haven't been saved on the Review yet, they're calculated from its `ScoredRow` objects
 
         :returns: The score the student got
         :rtype: str
         """
 
         if self.status == Review.Status.CLOSED:
-            my_score = self.scoredrow_set.all().aggregate(models.Sum("score"))
-            max_score = self.scoredrow_set.all().aggregate(
-                models.Sum("source_row__max_score")
-            )
-            return f'{my_score["score__sum"]}/{max_score["source_row__max_score__sum"]}'
+            if self.score_total is None or self.score_max is None:
+                totals = self.scoredrow_set.aggregate(
+                    score_total=models.Sum("score"),
+                    score_max=models.Sum("source_row__max_score"),
+                )
+                return f'{totals["score_total"]}/{totals["score_max"]}'
+            return f"{self.score_total}/{self.score_max}"
         else:
             return None
 
+    @staticmethod
+    def update_scores(queryset: models.QuerySet) -> int:
+        """
+        This function recalculates `Review.score_total` and `Review.score_max` for a set of Reviews in one query
+
+        :param queryset: The Reviews to update
+        :type queryset: QuerySet
+        :returns: The number of Reviews updated
+        :rtype: int
+        """
+
+        scored_rows = (
+            apps.get_model("Instructor", "ScoredRow")
+            .objects.filter(parent_review=models.OuterRef("pk"))
+            .order_by()
+            .values("parent_review")
+        )
+        return queryset.update(
+            score_total=models.Subquery(
+                scored_rows.annotate(total=models.Sum("score")).values("total")
+            ),
+            score_max=models.Subquery(
+                scored_rows.annotate(total=models.Sum("source_row__max_score")).values(
+                    "total"
+                )
+            ),
+        )
+
+    @staticmethod
+    def update_user_counts() -> int:
+        """
+        This function recalculates `User.reviews_done_as_reviewer` and `User.reviews_done_as_reviewee`
+        from completed Reviews, in one query
+
+        :returns: The number of users updated
+        :rtype: int
+        """
+
+        closed = Review.objects.filter(status=Review.Status.CLOSED).order_by()
+        return User.objects.update(
+            reviews_done_as_reviewer=Coalesce(
+                models.Subquery(
+                    closed.filter(reviewer=models.OuterRef("pk"))
+                    .values("reviewer")
+                    .annotate(count=models.Count("id"))
+                    .values("count")
+                ),
+                0,
+            ),
+            reviews_done_as_reviewee=Coalesce(
+                models.Subquery(
+                    closed.filter(student=models.OuterRef("pk"))
+                    .values("student")
+                    .annotate(count=models.Count("id"))
+                    .values("count")
+                ),
+                0,
+            ),
+        )
+
     @staticmethod
     def get_status_from_string(status) -> str:
         """
@@ -156,3 +433,70 @@ class Review(BaseModel):
         """
 
         return Review.Status.labels[Review.Status.values.index(status)]
+
+
+class Notification(BaseModel):
+    """
+    This model represents an email about a Review that is waiting to be sent by the `send_notifications` command
+
+    :cvar subject_template: Defines what the subject of the email will be
+    :cvar text_template: Defines what the text content will be
+    :cvar template_name: Defines what template to use for the html content of the email
+    :cvar review: The Review the email pertains to
+    :cvar recipients: The ids of the users to send the email to
+    :cvar date_created: The date the Notification was queued
+    """
+
+    subject_template = models.CharField(max_length=200)
+    text_template = models.TextField()
+    template_name = models.CharField(max_length=100)
+    review = models.ForeignKey(Review, on_delete=models.CASCADE)
+    recipients = models.JSONField(default=list)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        """
+        This internal class specifies settings for the model
+
+        :cvar ordering: Notifications are sent in the order they were queued
+        """
+
+        ordering = ["date_created"]
+
+
+class LeaderboardVersion(models.Model):
+    """
+    This model is a single row that counts how many times the leaderboard has changed.
+    It's kept in the database rather than the cache, so every worker agrees on the current version of the leaderboard
+    and rebuilds its snapshot as soon as any worker changes it
+
+    :cvar id: Always 1, there's only ever one row
+    :cvar version: Incremented every time the leaderboard changes
+    :cvar date_updated: When the version was last incremented
+    """
+
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1, editable=False)
+    version = models.PositiveIntegerField(default=0)
+    date_updated = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def get_current(cls) -> "LeaderboardVersion":
+        """
+        This function gets the current version of the leaderboard, creating the row if it doesn't exist yet
+
+        :returns: The current version
+        :rtype: LeaderboardVersion
+        """
+
+        return cls.objects.get_or_create(id=1)[0]
+
+    @classmethod
+    def bump(cls) -> None:
+        """
+        This function increments the version of the leaderboard, so every worker rebuilds its snapshot
+        """
+
+        if not cls.objects.filter(id=1).update(
+            version=models.F("version") + 1, date_updated=timezone.now()
+        ):
+            cls.objects.get_or_create(id=1, defaults={"version": 1})
@@ -0,0 +1,172 @@
+"""
+    This file defines how emails about Reviews are built and sent
+"""
+
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core import mail
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.template.loader import render_to_string
+from django.utils.html import escape
+
+from Users.models import User
+from . import models
+
+# The only part of an email's html that changes between recipients is their name,
+# so the template is rendered once with this in its place and it's swapped out for each user
+TARGET_USER_PLACEHOLDER = "__code_review_target_user__"
+
+
+def build_messages(
+    subject_template: str,
+    text_template: str,
+    template_name: str,
+    review: models.Review,
+    users: Iterable[User],
+) -> list[mail.EmailMultiAlternatives]:
+    """
+    This function builds the emails to send to a group of users.
+    The html template is only rendered once no matter how many users there are
+
+    :param subject_template: Defines what the subject of the email will be
+    :type subject_template: str
+    :param text_template: Defines what the text content will be
+    :type text_template: str
+    :param template_name: Defines what template to use for the html content of the email
+    :type template_name: str
+    :param review: The Review the emails pertain to
+    :type review: models.Review
+    :param users: The users to send the email to
+    :type users: Iterable
+    :returns: One email for each user
+    :rtype: list
+    """
+
+    html_template = render_to_string(
+        template_name, {"target_user": TARGET_USER_PLACEHOLDER, "review": review}
+    )
+    student, reviewer = str(review.student), str(review.reviewer)
+    built = []
+    for user in users:
+        text_content = text_template.format(
+            target_user=str(user), student=student, reviewer=reviewer
+        )
+        subject = subject_template.format(
+            target_user=str(user), student=student, reviewer=reviewer
+        )
+        message = mail.EmailMultiAlternatives(
+            subject=f"{review.student.session} | {subject}", body=text_content
+        )
+        message.attach_alternative(
+            html_template.replace(TARGET_USER_PLACEHOLDER, escape(str(user))),
+            "text/html",
+        )
+        message.to = [settings.LDAP_ADMIN_EMAIL if user.is_superuser else user.email]
+        built.append(message)
+    return built
+
+
+def notify(
+    subject_template: str,
+    text_template: str,
+    template_name: str,
+    review: models.Review,
+    query_set: QuerySet,
+) -> None:
+    """
+    This function emails a group of users about a Review.
+    If `settings.NOTIFICATIONS_ASYNC` is set, the email is queued for the `send_notifications` command,
+    otherwise it's sent right away
+
+    :param subject_template: Defines what the subject of the email will be
+    :type subject_template: str
+    :param text_template: Defines what the text content will be
+    :type text_template: str
+    :param template_name: Defines what template to use for the html content of the email
+    :type template_name: str
+    :param review: The Review this email pertains to
+    :type review: models.Review
+    :param query_set: The QuerySet of users to send the email to
+    :type query_set: QuerySet
+    """
+
+    users = query_set.filter(receive_notifications=True)
+    if settings.NOTIFICATIONS_ASYNC:
+        recipients = [str(user_id) for user_id in users.values_list("id", flat=True)]
+        if len(recipients) > 0:
+            models.Notification.objects.create(
+                subject_template=subject_template,
+                text_template=text_template,
+                template_name=template_name,
+                review=review,
+                recipients=recipients,
+            )
+    else:
+        messages = build_messages(
+            subject_template, text_template, template_name, review, list(users)
+        )
+        if len(messages) > 0:
+            mail.get_connection().send_messages(messages)
+
+
+def send_notifications(limit: Optional[int] = None) -> tuple[int, int]:
+    """
+    This function sends queued Notifications.
+    Every email is handed to the email backend in one call, so with django-mailer they're saved in one bulk insert.
+    The Notifications are claimed before they're sent, by locking their rows (skipping ones another run has locked)
+    and deleting them in the same transaction as the send, so overlapping runs never send the same email twice,
+    and if sending fails the Notifications are kept for the next run
+
+    :param limit: The max number of Notifications to send, defaults to all of them
+    :type limit: int
+    :returns: The number of Notifications and the number of emails that were sent
+    :rtype: tuple
+    """
+
+    with transaction.atomic():
+        pending = models.Notification.objects.select_related(
+            "review__student", "review__reviewer"
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(
+                skip_locked=True,
+                of=("self",) if connection.features.has_select_for_update_of else (),
+            )
+        pending = list(pending[:limit])
+        if len(pending) == 0:
+            return 0, 0
+        deleted, _ = models.Notification.objects.filter(
+            id__in=[notification.id for notification in pending]
+        ).delete()
+        if deleted != len(pending):
+            # Another run sent some of these first, on databases without row locks the rest are left for the next run
+            transaction.set_rollback(True)
+            return 0, 0
+        users = {
+            str(user_id): user
+            for user_id, user in User.objects.in_bulk(
+                {
+                    user_id
+                    for notification in pending
+                    for user_id in notification.recipients
+                }
+            ).items()
+        }
+        messages = []
+        for notification in pending:
+            messages += build_messages(
+                notification.subject_template,
+                notification.text_template,
+                notification.template_name,
+                notification.review,
+                [
+                    users[user_id]
+                    for user_id in notification.recipients
+                    if user_id in users
+                ],
+            )
+        if len(messages) > 0:
+            mail.get_connection().send_messages(messages)
+    return len(pending), len(messages)
@@ -0,0 +1,274 @@
+"""
+    This file defines keyset pagination, which pages through a list by remembering the last row shown
+    instead of counting how many rows to skip
+"""
+
+from typing import Iterator, Optional
+
+from django.core import signing
+from django.db import connections
+from django.db.models import F, Model, Q, QuerySet
+
+CURSOR_SALT = "Main.pagination"
+
+
+class KeysetPage:
+    """
+    This class holds one page of a list paginated by `KeysetPaginator`
+
+    :cvar object_list: The objects on the page
+    :cvar next_cursor: The cursor to get the next page, or None if this is the last page
+    :cvar previous_cursor: The cursor to get the previous page, or None if this is the first page
+    :cvar count: The total number of objects in the list, only set if it was asked for
+    """
+
+    def __init__(
+        self,
+        object_list: list,
+        next_cursor: Optional[str],
+        previous_cursor: Optional[str],
+        count: Optional[int] = None,
+    ):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    def has_next(self) -> bool:
+        """
+        This function checks if there's a page after this one
+
+        :returns: Whether there's a page after this one
+        :rtype: bool
+        """
+
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        """
+        This function checks if there's a page before this one
+
+        :returns: Whether there's a page before this one
+        :rtype: bool
+        """
+
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        """
+        This function checks if there's any other page
+
+        :returns: Whether there's a page before or after this one
+        :rtype: bool
+        """
+
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    This class splits a QuerySet into pages ordered by `keys`, newest first.
+    Each page is fetched with a WHERE on the keys of the row next to it, so every page costs the same,
+    unlike an OFFSET that has to read and throw away every row before the page.
+    The keys must end with a unique field so no two rows are tied, and NULLs are ordered the same way the database
+    orders them by default, so the query can use an index on the keys
+
+    :cvar keys: The fields to order by, in descending order
+    """
+
+    keys = ("date_completed", "date_created", "id")
+
+    def __init__(self, queryset: QuerySet, per_page: int):
+        """
+        This function sets up the paginator
+
+        :param queryset: The objects to paginate
+        :type queryset: QuerySet
+        :param per_page: The number of objects on each page
+        :type per_page: int
+        """
+
+        self.queryset = queryset
+        self.per_page = per_page
+        self.nulls_largest = connections[queryset.db].features.nulls_order_largest
+
+    def get_field(self, key: str):
+        """
+        This function gets the model field of one of the keys
+
+        :param key: The key to get the field of
+        :type key: str
+        :returns: The model field the key refers to
+        :rtype: Field
+        """
+
+        return self.queryset.model._meta.get_field(key)
+
+    def encode_cursor(self, obj: Model, backwards: bool) -> str:
+        """
+        This function makes the cursor for the page before or after an object.
+        The cursor is signed, so it's opaque to the user and can't be tampered with
+
+        :param obj: The first or last object on the current page
+        :type obj: Model
+        :param backwards: True to get the page before `obj`, False to get the page after it
+        :type backwards: bool
+        :returns: The cursor
+        :rtype: str
+        """
+
+        values = [
+            None
+            if getattr(obj, key) is None
+            else self.get_field(key).value_to_string(obj)
+            for key in self.keys
+        ]
+        return signing.dumps([backwards, values], salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor: str) -> tuple[bool, list]:
+        """
+        This function reads a cursor made by `KeysetPaginator.encode_cursor`
+
+        :param cursor: The cursor to read
+        :type cursor: str
+        :returns: Whether the cursor goes backwards, and the values of the keys
+        :rtype: tuple
+        :raises BadSignature: If the cursor was tampered with
+        :raises ValidationError: If the values in the cursor aren't valid for their fields
+        """
+
+        backwards, values = signing.loads(cursor, salt=CURSOR_SALT)
+        if len(values) != len(self.keys):
+            raise signing.BadSignature("Cursor has the wrong number of keys")
+        return bool(backwards), [
+            None if value is None else self.get_field(key).to_python(value)
+            for key, value in zip(self.keys, values)
+        ]
+
+    def beyond(self, key: str, value, greater: bool) -> Optional[Q]:
+        """
+        This function gets the condition for rows that come after a value of one key
+
+        :param key: The key to compare
+        :type key: str
+        :param value: The value of the key on the row we're paging from
+        :param greater: True to get rows with a larger value, False to get rows with a smaller value
+        :type greater: bool
+        :returns: The condition, or None if no rows can come after the value
+        :rtype: Q
+        """
+
+        if value is None:
+            return (
+                Q(**{f"{key}__isnull": False})
+                if greater != self.nulls_largest
+                else None
+            )
+        condition = Q(**{f"{key}__{'gt' if greater else 'lt'}": value})
+        if greater == self.nulls_largest:
+            condition |= Q(**{f"{key}__isnull": True})
+        return condition
+
+    def after(self, values: list, backwards: bool) -> Q:
+        """
+        This function gets the condition for rows that come after (or before) a row
+
+        :param values: The values of the keys on the row we're paging from
+        :type values: list
+        :param backwards: True to get the rows before the row, False to get the rows after it
+        :type backwards: bool
+        :returns: The condition
+        :rtype: Q
+        """
+
+        condition = Q(pk__in=[])
+        equal = Q()
+        for key, value in zip(self.keys, values):
+            beyond = self.beyond(key, value, backwards)
+            if beyond is not None:
+                condition |= equal & beyond
+            equal &= Q(**{f"{key}__isnull": True} if value is None else {key: value})
+        return condition
+
+    def page_query(
+        self, backwards: bool = False, values: Optional[list] = None
+    ) -> QuerySet:
+        """
+        This function gets the query for a page, with one extra object to tell if there's another page after it
+
+        :param backwards: True to get the page before the row, False to get the page after it
+        :type backwards: bool
+        :param values: The values of the keys on the row we're paging from, or None to get the first page
+        :type values: list
+        :returns: The query for the page
+        :rtype: QuerySet
+        """
+
+        query = self.queryset
+        if values is not None:
+            query = query.filter(self.after(values, backwards))
+        return query.order_by(
+            *(F(key).asc() if backwards else F(key).desc() for key in self.keys)
+        )[: self.per_page + 1]
+
+    def get_page(self, cursor: Optional[str] = None, count: bool = False) -> KeysetPage:
+        """
+        This function gets a page of objects
+
+        :param cursor: The cursor of the page to get, or None to get the first page
+        :type cursor: str
+        :param count: Whether to count the total number of objects, which takes an extra query
+        :type count: bool
+        :returns: The page
+        :rtype: KeysetPage
+        :raises BadSignature: If the cursor was tampered with
+        :raises ValidationError: If the values in the cursor aren't valid for their fields
+        """
+
+        backwards, values = False, None
+        if cursor is not None:
+            backwards, values = self.decode_cursor(cursor)
+        object_list = list(self.page_query(backwards, values))
+        more = len(object_list) > self.per_page
+        object_list = object_list[: self.per_page]
+        if backwards:
+            object_list.reverse()
+        has_next = (not backwards and more) or (backwards and len(object_list) > 0)
+        has_previous = (backwards and more) or (not backwards and cursor is not None)
+        return KeysetPage(
+            object_list,
+            self.encode_cursor(object_list[-1], False) if has_next else None,
+            self.encode_cursor(object_list[0], True)
+            if has_previous and len(object_list) > 0
+            else None,
+            self.queryset.count() if count else None,
+        )
+
+    def iter_pages(self, backwards: bool = False) -> Iterator[list]:
+        """
+        This function goes through every object a page at a time, with one query for each page.
+        Unlike `QuerySet.iterator`, no query is left open between pages, so only one page is ever in memory,
+        even on databases whose driver reads the whole result of a query before giving back any rows
+
+        :param backwards: True to go from the oldest object to the newest, False to go from the newest to the oldest
+        :type backwards: bool
+        :returns: The objects on each page
+        :rtype: Iterator
+        """
+
+        query = self.queryset.order_by(
+            *(F(key).asc() if backwards else F(key).desc() for key in self.keys)
+        )
+        page = list(query[: self.per_page])
+        while len(page) > 0:
+            yield page
+            if len(page) < self.per_page:
+                return
+            values = [getattr(page[-1], key) for key in self.keys]
+            page = list(query.filter(self.after(values, backwards))[: self.per_page])
@@ -0,0 +1,20 @@
+$(document).ready(() => {
+    const loadMoreButton = $("#loadMoreButton");
+    loadMoreButton.click(() => {
+        const params = {cursor: loadMoreButton.data("cursor")};
+        if (loadMoreButton.data("session") !== undefined) {
+            params.session = loadMoreButton.data("session");
+        }
+        loadMoreButton.attr("disabled", true);
+        $.getJSON(loadMoreButton.data("url"), params, data => {
+            $(".review-table tbody").append(data.html);
+            $("#pageNavigation").remove();
+            if (data.next === null) {
+                loadMoreButton.remove();
+            } else {
+                loadMoreButton.data("cursor", data.next);
+                loadMoreButton.attr("disabled", false);
+            }
+        });
+    });
+});
@@ -2,6 +2,8 @@
     This file provides tags related to reviews to templates
 """
 
+from typing import Union
+
 from django import template
 from django.db.models import QuerySet
 
@@ -10,19 +12,74 @@ from Users.models import User
 
 register = template.Library()
 
+user_fields = ["student", "reviewer"]
+
 formatters = {
-    "student": lambda target_id: str(User.objects.get(id=target_id)),
-    "reviewer": lambda target_id: str(User.objects.get(id=target_id)),
     "status": lambda target_code: Review.get_status_from_string(target_code),
 }
 
 
-def get_table_context(queryset: QuerySet, fields_str: str) -> dict:
+def format_user(target_id, users: dict) -> str:
+    """
+    This function formats a user id from a table row using a pre-loaded map of users
+
+    :param target_id: The id of the user to format
+    :param users: A dictionary mapping user ids to User objects
+    :type users: dict
+    :returns: The user as a string, or an empty string if there is no user
+    :rtype: str
+    """
+
+    user: User = users.get(target_id, None)
+    return "" if user is None else str(user)
+
+
+def get_rows(reviews: Union[QuerySet, list[Review]], fields: list[str]) -> tuple:
+    """
+    This is a helper function that gets the raw values of each field for a set of Reviews, plus the users in them
+    If a list is given, its Reviews should already have their users loaded with `select_related`,
+    otherwise the users are loaded in one query
+
+    :param reviews: The Reviews to get the values of
+    :type reviews: QuerySet or list
+    :param fields: The fields to get
+    :type fields: list
+    :returns: A list of rows ending with the id of the Review, and a dictionary mapping user ids to User objects
+    :rtype: tuple
+    """
+
+    if isinstance(reviews, QuerySet):
+        rows = list(reviews.values_list(*fields, "id"))
+        user_ids = {
+            row[index]
+            for row in rows
+            for index, field in enumerate(fields)
+            if field in user_fields
+        } - {None}
+        return rows, User.objects.in_bulk(user_ids) if len(user_ids) > 0 else {}
+    rows = []
+    users = {}
+    for review in reviews:
+        row = []
+        for field in fields:
+            if field in user_fields:
+                user: User = getattr(review, field)
+                if user is not None:
+                    users[user.id] = user
+                row.append(getattr(review, f"{field}_id"))
+            else:
+                row.append(getattr(review, field))
+        rows.append((*row, review.id))
+    return rows, users
+
+
+def get_table_context(reviews: Union[QuerySet, list[Review]], fields_str: str) -> dict:
     """
     This is a helper function that gets a set of Reviews ready to display in a table
+    Any users in the table are loaded in one query, so the cost of a table doesn't grow with its length
 
-    :param queryset: The Reviews to prepare
-    :type queryset: QuerySet
+    :param reviews: The Reviews to prepare, either a QuerySet or a list of Reviews with their users loaded
+    :type reviews: QuerySet or list
     :param fields_str: The fields to get
     :type fields_str: str
     :returns: A dictionary that will work as context to render a table
@@ -36,14 +93,18 @@ def get_table_context(queryset: QuerySet, fields_str: str) -> dict:
             actions.append(field)
         else:
             fields.append(field)
+    rows, users = get_rows(reviews, fields)
+    user_indexes = [index for index, field in enumerate(fields) if field in user_fields]
     objects = []
-    for old_object in queryset.values_list(*fields, "id"):
+    for old_object in rows:
         new_object = []
         for index, field in enumerate(old_object):
-            if index != len(old_object) - 1:
-                new_object.append(formatters.get(fields[index], lambda x: x)(field))
-            else:
+            if index == len(old_object) - 1:
                 new_object.append(field)
+            elif index in user_indexes:
+                new_object.append(format_user(field, users))
+            else:
+                new_object.append(formatters.get(fields[index], lambda x: x)(field))
         objects.append(new_object)
     return {
         "objects": objects,
@@ -54,41 +115,48 @@ def get_table_context(queryset: QuerySet, fields_str: str) -> dict:
 
 
 @register.inclusion_tag("reviews/review_table.html")
-def review_table(queryset: QuerySet, fields_str: str) -> dict:
+def review_table(reviews: Union[QuerySet, list[Review]], fields_str: str) -> dict:
     """
-    This tag displays a QuerySet of reviews as a table
+    This tag displays a QuerySet or list of reviews as a table
 
-    :param queryset: The set of Reviews to display
-    :type queryset: QuerySet
+    :param reviews: The set of Reviews to display
+    :type reviews: QuerySet or list
     :param fields_str: The fields to get for each review
     :type fields_str: str
     :returns: The reviews as a table
     :rtype: str
     """
 
-    return get_table_context(queryset, fields_str)
+    return get_table_context(reviews, fields_str)
 
 
 @register.inclusion_tag("reviews/review_completed_preview_table.html")
 def review_complete_preview_table(
-    queryset: QuerySet, fields_str: str, session: str = None
+    reviews: Union[QuerySet, list[Review]],
+    fields_str: str,
+    session: str = None,
+    total: int = None,
 ) -> dict:
     """
     This tag functions identically to review_table except one key difference,
     It limits it to the first 4 reviews and adds a "View All" link if the list is longer than that
 
-    :param queryset: The set of Reviews to display
-    :type queryset: QuerySet
+    :param reviews: The set of Reviews to display
+    :type reviews: QuerySet or list
     :param fields_str: The fields to get for each review
     :type fields_str: str
     :param session: The session the Reviews are in (if applicable)
     :type session: str
+    :param total: The total number of Reviews if it's already known, so they don't have to be counted
+    :type total: int
     :returns: The reviews as a table
     :rtype: str
     """
 
-    new_context = get_table_context(queryset[:4], fields_str)
-    if queryset.count() > 4:
+    new_context = get_table_context(reviews[:4], fields_str)
+    if total is None:
+        total = reviews.count() if isinstance(reviews, QuerySet) else len(reviews)
+    if total > 4:
         new_context["target_session"] = session
         return new_context
     else:
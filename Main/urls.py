@@ -40,6 +40,11 @@ urlpatterns = [
         views.ReviewCompleteListView.as_view(),
         name="review-complete",
     ),
+    path(
+        "review/completed/fragment/",
+        views.ReviewCompleteFragmentView.as_view(),
+        name="review-complete-fragment",
+    ),
     path("secret/", views.SecretView.as_view(), name="secret"),
     path("copyright/", views.CopyrightView.as_view(), name="copyright"),
     path("error/<int:type>/", views.Error.as_view(), name="error"),
@@ -3,17 +3,25 @@
 """
 
 from datetime import datetime
+from hashlib import md5
 from typing import Optional
+from urllib.parse import urlencode
 
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.core import mail
-from django.db.models import Q, QuerySet
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.core.signing import BadSignature
+from django.db import transaction
+from django.db.models import F, Q, QuerySet
 from django.forms import Form
-from django.http import HttpResponse, HttpResponseRedirect, Http404
+from django.http import HttpResponse, HttpResponseRedirect, Http404, JsonResponse
 from django.shortcuts import redirect, render
 from django.template.loader import render_to_string
 from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.views.decorators.http import condition
 from django.views import View
 from django.views.generic import (
     TemplateView,
@@ -26,10 +34,13 @@ from django.views.generic import (
 from django.views.generic.base import ContextMixin
 from django.views.generic.edit import FormMixin, DeletionMixin
 
-from CodeReview import settings
 from Instructor.models import Rubric
+from Users.ldap_cache import forget_users
 from Users.models import User
-from . import models, forms
+from . import models, forms, notifications
+from .leaderboard import Leaderboard, get_leaderboard, refresh_leaderboard
+from .pagination import KeysetPage, KeysetPaginator
+from .templatetags.review_tags import get_table_context
 
 
 # Email Utility Functions
@@ -43,7 +54,7 @@ def send_email(
     query_set: QuerySet,
 ):
     """
-    This function sends an email to a group of users
+    This function sends an email to a group of users, see `Main.notifications.notify`
 
     :param subject_template: Defines what the subject of the email will be
     :type subject_template: str
@@ -57,26 +68,9 @@ def send_email(
     :type query_set: QuerySet
     """
 
-    for user in list(query_set.filter(receive_notifications=True)):
-        html_content = render_to_string(
-            template_name, {"target_user": user, "review": review}
-        )
-        text_content = text_template.format(
-            target_user=str(user),
-            student=str(review.student),
-            reviewer=str(review.reviewer),
-        )
-        subject = subject_template.format(
-            target_user=str(user),
-            student=str(review.student),
-            reviewer=str(review.reviewer),
-        )
-        message = mail.EmailMultiAlternatives(
-            subject=f"{review.student.session} | {subject}", body=text_content
-        )
-        message.attach_alternative(html_content, "text/html")
-        message.to = [settings.LDAP_ADMIN_EMAIL if user.is_superuser else user.email]
-        message.send()
+    notifications.notify(
+        subject_template, text_template, template_name, review, query_set
+    )
 
 
 # Mixins
@@ -212,9 +206,11 @@ class HomeView(LoginRequiredMixin, TemplateView):
     This view is shown when the User goes to the root of the site.
 
     :cvar template_name: The template to render
+    :cvar preview_size: The number of completed Reviews to show
     """
 
     template_name = "home.html"
+    preview_size = 4
 
     def get(self, *args, **kwargs) -> HttpResponse:
         """
@@ -231,6 +227,8 @@ class HomeView(LoginRequiredMixin, TemplateView):
         """
         This function gives additional context data to the template.
         It gives a list of Reviews related to the user.
+        The ongoing Reviews are loaded in one query and split into lists here.
+        Completed Reviews pile up over time, so only the latest `preview_size` are loaded, and the rest are only counted
 
         :returns: Additional context data for the template
         :rtype: dict
@@ -238,25 +236,33 @@ class HomeView(LoginRequiredMixin, TemplateView):
 
         context = super(HomeView, self).get_context_data(**kwargs)
         user: User = self.request.user
-        context["active"] = models.Review.objects.filter(student=user).exclude(
-            status=models.Review.Status.CLOSED
+
+        context["completed_count"] = (
+            models.Review.objects.involving(user).completed().count()
         )
-        context["completed"] = models.Review.objects.filter(
-            (Q(student=user) | Q(reviewer=user)) & Q(status=models.Review.Status.CLOSED)
+        context["completed"] = list(
+            models.Review.objects.completed_preview(user, self.preview_size)
         )
+
+        context["active"] = []
         if user.is_reviewer:
-            rubrics = models.Review.objects.exclude(
-                status=models.Review.Status.CLOSED
-            ).filter(
-                Q(
-                    status=models.Review.Status.OPEN,
-                )
-                | Q(status=models.Review.Status.ASSIGNED, reviewer=user)
-            )
-            context["open"] = rubrics.filter(
-                status=models.Review.Status.OPEN, student__session=user.session
-            ).exclude(student=user)
-            context["assigned"] = rubrics.filter(status=models.Review.Status.ASSIGNED)
+            context["open"] = []
+            context["assigned"] = []
+        for review in models.Review.objects.ongoing_for(user):
+            if review.student_id == user.id:
+                context["active"].append(review)
+            if not user.is_reviewer:
+                continue
+            if (
+                review.status == models.Review.Status.OPEN
+                and review.student_id != user.id
+            ):
+                context["open"].append(review)
+            elif (
+                review.status == models.Review.Status.ASSIGNED
+                and review.reviewer_id == user.id
+            ):
+                context["assigned"].append(review)
 
         return context
 
@@ -452,42 +458,31 @@ class ReviewClaimView(LoginRequiredMixin, IsReviewerMixin, View):
     def post(self, request, *args, **kwargs) -> HttpResponse:
         """
         This function defines what will happen on a POST request
+        The Review is claimed with `ReviewQuerySet.claim`, so two reviewers can't claim the same Review
 
         :param request: The request that invoked this method
         """
 
-        if (
-            models.Review.objects.filter(
-                reviewer=request.user, status=models.Review.Status.ASSIGNED
-            ).count()
-            >= 2
-        ):
+        try:
+            target_object = models.Review.objects.claim(
+                models.val_uuid(kwargs.get("pk", "")), request.user
+            )
+        except models.Review.DoesNotExist:
+            raise Http404()
+        if target_object is None:
             messages.add_message(
                 request, messages.ERROR, "You can only have 2 claimed reviews at once"
             )
             return redirect("home")
-        else:
-            target_pk = kwargs.get("pk", "")
-            try:
-                target_object = models.Review.objects.get(
-                    id=models.val_uuid(target_pk),
-                    status=models.Review.Status.OPEN,
-                    student__session=self.request.user.session,
-                )
-                target_object.status = models.Review.Status.ASSIGNED
-                target_object.reviewer = request.user
-                target_object.save()
-                send_email(
-                    "Review accepted by {reviewer}",
-                    "Hello, {target_user}, a review by {student} has been accepted by {reviewer}.",
-                    "emails/review_accepted.html",
-                    target_object,
-                    User.objects.filter(is_superuser=True),
-                )
-                messages.add_message(request, messages.SUCCESS, "Review Claimed")
-                return redirect("home")
-            except models.Review.DoesNotExist:
-                raise Http404()
+        send_email(
+            "Review accepted by {reviewer}",
+            "Hello, {target_user}, a review by {student} has been accepted by {reviewer}.",
+            "emails/review_accepted.html",
+            target_object,
+            User.objects.filter(is_superuser=True),
+        )
+        messages.add_message(request, messages.SUCCESS, "Review Claimed")
+        return redirect("home")
 
 
 class ReviewerAction(LoginRequiredMixin, IsReviewerMixin, View):
@@ -587,7 +582,7 @@ class ReviewGradeView(
         :rtype: QuerySet
         """
 
-        return models.Review.objects.filter(
+        return models.Review.objects.with_rubric().filter(
             reviewer=self.request.user, status=models.Review.Status.ASSIGNED
         )
 
@@ -595,6 +590,8 @@ class ReviewGradeView(
         """
         This function is run if the form is valid
         It saves the date and time the Review was graded and sends an email to the instructor
+        The leaderboard counters of the reviewer and student are incremented in the database, in the same transaction as the grade,
+        and then the leaderboard snapshot is rebuilt
 
         :param form: The form that is valid
         """
@@ -602,9 +599,17 @@ class ReviewGradeView(
         if form.cleaned_data.get("is_draft", "false") == "true":
             return super().form_valid(form)
 
-        self.object.date_completed = datetime.now()
-        self.object.save()
-        response = super().form_valid(form)
+        with transaction.atomic():
+            self.object.date_completed = datetime.now()
+            response = super().form_valid(form)
+            User.objects.filter(id=self.object.reviewer_id).update(
+                reviews_done_as_reviewer=F("reviews_done_as_reviewer") + 1
+            )
+            User.objects.filter(id=self.object.student_id).update(
+                reviews_done_as_reviewee=F("reviews_done_as_reviewee") + 1
+            )
+        forget_users([self.object.reviewer_id, self.object.student_id])
+        refresh_leaderboard()
         send_email(
             "Review completed by {reviewer}",
             "Hello, {target_user}, the review requested by {student} has been completed by {reviewer}.",
@@ -612,10 +617,6 @@ class ReviewGradeView(
             self.object,
             User.objects.filter(is_superuser=True),
         )
-        self.object.reviewer.reviews_done_as_reviewer += 1
-        self.object.reviewer.save()
-        self.object.student.reviews_done_as_reviewee += 1
-        self.object.student.save()
         return response
 
 
@@ -642,7 +643,7 @@ class ReviewDetailView(LoginRequiredMixin, DetailView):
         :rtype: QuerySet
         """
 
-        query = models.Review.objects.all()
+        query = models.Review.objects.with_rubric()
         if self.request.user.is_superuser is False:
             query = query.filter(
                 Q(student=self.request.user) | Q(reviewer=self.request.user)
@@ -653,6 +654,8 @@ class ReviewDetailView(LoginRequiredMixin, DetailView):
 class ReviewCompleteListView(LoginRequiredMixin, ListView):
     """
     This view lists completed reviews for the user
+    Reviews are paged with `KeysetPaginator`, so pages deep in the list cost the same as the first one.
+    The total number of reviews is only counted if `count` is in the query string
 
     :cvar template_name: The template to render
     :cvar model: The model to list
@@ -679,6 +682,38 @@ class ReviewCompleteListView(LoginRequiredMixin, ListView):
         else:
             return None
 
+    def get_table_fields(self) -> str:
+        """
+        This function gets the fields to show in the table of reviews
+
+        :returns: The fields to pass to the `review_table` tag
+        :rtype: str
+        """
+
+        fields = "schoology_id,student,reviewer,date_created,date_completed,view"
+        return f"{fields},delete" if self.request.user.is_superuser else fields
+
+    def paginate_queryset(self, queryset: QuerySet, page_size: int) -> tuple:
+        """
+        This function gets the page of reviews requested by the `cursor` in the query string
+
+        :param queryset: The reviews to paginate
+        :type queryset: QuerySet
+        :param page_size: The number of reviews on each page
+        :type page_size: int
+        :returns: The paginator, the page, the reviews on the page, and whether there's more than one page
+        :rtype: tuple
+        """
+
+        paginator = KeysetPaginator(queryset, page_size)
+        try:
+            page = paginator.get_page(
+                self.request.GET.get("cursor"), "count" in self.request.GET
+            )
+        except (BadSignature, ValidationError):
+            raise Http404()
+        return paginator, page, page.object_list, page.has_other_pages()
+
     def get_context_data(self, *, object_list=None, **kwargs) -> dict[str, object]:
         """
         This function provides additional context data to the template
@@ -690,6 +725,7 @@ class ReviewCompleteListView(LoginRequiredMixin, ListView):
         context = super(ReviewCompleteListView, self).get_context_data(
             object_list=object_list, **kwargs
         )
+        context["table_fields"] = self.get_table_fields()
         if self.request.user.is_superuser:
             context["target_session"] = self.get_session()
             context["opposite_session"] = "PM" if self.get_session() == "AM" else "AM"
@@ -705,17 +741,43 @@ class ReviewCompleteListView(LoginRequiredMixin, ListView):
         :rtype: QuerySet
         """
 
-        query = models.Review.objects.filter(status=models.Review.Status.CLOSED)
-        if self.request.user.is_superuser:
-            session = self.get_session()
-            if session is None:
-                raise Http404()
-            else:
-                return query.filter(student__session=session)
-        else:
-            return query.filter(
-                Q(student=self.request.user) | Q(reviewer=self.request.user)
-            )
+        session = self.get_session()
+        if self.request.user.is_superuser and session is None:
+            raise Http404()
+        return models.Review.objects.completed_list(self.request.user, session)
+
+
+class ReviewCompleteFragmentView(ReviewCompleteListView):
+    """
+    This view returns a page of completed reviews as JSON, for loading more reviews without leaving the page.
+    It takes the same query string as `ReviewCompleteListView`
+    """
+
+    def render_to_response(self, context, **response_kwargs) -> JsonResponse:
+        """
+        This function renders the rows of the reviews on the page, and returns them with the cursors of the pages
+        around it
+
+        :param context: The context made by `ReviewCompleteListView.get_context_data`
+        :type context: dict
+        :returns: The rows as HTML, the cursors of the next and previous pages, and the count (if asked for)
+        :rtype: JsonResponse
+        """
+
+        page: KeysetPage = context["page_obj"]
+        rows = render_to_string(
+            "reviews/review_table_rows.html",
+            get_table_context(page.object_list, context["table_fields"]),
+            self.request,
+        )
+        return JsonResponse(
+            {
+                "html": rows,
+                "next": page.next_cursor,
+                "previous": page.previous_cursor,
+                "count": page.count,
+            }
+        )
 
 
 # Errors
@@ -826,19 +888,139 @@ def csrf_failure_view(request, reason=""):
 # Leaderboard
 
 
+def get_request_leaderboard(request) -> Leaderboard:
+    """
+    This function gets the leaderboard once for a request, so its version is only read from the database once
+
+    :param request: The request for the leaderboard
+    :returns: The snapshot of the leaderboard
+    :rtype: Leaderboard
+    """
+
+    if not hasattr(request, "leaderboard"):
+        request.leaderboard = get_leaderboard()
+    return request.leaderboard
+
+
+def leaderboard_etag(request, *args, **kwargs) -> Optional[str]:
+    """
+    This function gets the ETag of the leaderboard page, which changes with the version of the leaderboard.
+    The page also shows the name and id of the user viewing it, so those are part of the ETag,
+    and there's no ETag while the user has messages waiting to be shown
+
+    :param request: The request for the leaderboard
+    :returns: The ETag, or None if the page has to be rendered
+    :rtype: str
+    """
+
+    if len(messages.get_messages(request)) > 0:
+        return None
+    return md5(
+        "-".join(
+            [
+                get_request_leaderboard(request).version,
+                str(request.user.pk),
+                str(request.user),
+                request.GET.urlencode(),
+            ]
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+@method_decorator(condition(etag_func=leaderboard_etag), name="get")
 class LeaderboardView(LoginRequiredMixin, TemplateView):
+    """
+    This view shows the users who have completed the most reviews.
+    It reads from the cached snapshot in `Main.leaderboard`,
+    and answers with 304 Not Modified if the browser already has the page for the current snapshot and user.
+    Last-Modified is sent for information only, since the version's time says nothing about who the page is for
+
+    :cvar template_name: The template to render
+    :cvar paginate_by: How many users to show on each page
+    """
+
     http_methods = ["get"]
     template_name = "reviews/leaderboard.html"
+    paginate_by = 25
+
+    def get(self, request, *args, **kwargs) -> HttpResponse:
+        """
+        This function renders the leaderboard and says when its version was made
+
+        :param request: The request for the leaderboard
+        :returns: The rendered leaderboard
+        :rtype: HttpResponse
+        """
+
+        response = super().get(request, *args, **kwargs)
+        response.headers["Last-Modified"] = http_date(
+            get_request_leaderboard(request).updated.timestamp()
+        )
+        return response
+
+    def get_session(self) -> Optional[str]:
+        """
+        This function gets the session the user requested
+
+        :returns: The session requested in the query string, if any
+        :rtype: str
+        """
+
+        session = self.request.GET.get("session", "")
+        return session if session == "AM" or session == "PM" else None
+
+    def get_top(self) -> Optional[int]:
+        """
+        This function gets how many users the user wants to see
+
+        :returns: The number of users requested in the query string, if any
+        :rtype: int
+        """
+
+        try:
+            top = int(self.request.GET.get("top", ""))
+        except ValueError:
+            return None
+        return top if top > 0 else None
 
     def get_context_data(self, *args, **kwargs) -> dict[str, object]:
+        """
+        This function provides additional context data to the template
+
+        :returns: Additional context to pass to the template
+        :rtype: dict
+        """
+
         context = super().get_context_data(**kwargs)
-        context["reviewees_dataset"] = User.objects.exclude(is_superuser=True).order_by(
-            "-reviews_done_as_reviewee"
-        )
-        context["reviewers_dataset"] = (
-            User.objects.exclude(is_superuser=True)
-            .filter(is_reviewer=True)
-            .order_by("-reviews_done_as_reviewer")
+        leaderboard = get_request_leaderboard(self.request)
+        session, top = self.get_session(), self.get_top()
+        paginators = {
+            name: Paginator(
+                leaderboard.filter(entries, session)[:top], self.paginate_by
+            )
+            for name, entries in (
+                ("reviewees", leaderboard.reviewees),
+                ("reviewers", leaderboard.reviewers),
+            )
+        }
+        # The pages are numbered by the longer list, the shorter list is empty past its last page
+        longest = max(paginators.values(), key=lambda paginator: paginator.num_pages)
+        context["page_obj"] = longest.get_page(self.request.GET.get("page", 1))
+        number = context["page_obj"].number
+        for name, paginator in paginators.items():
+            if number <= paginator.num_pages:
+                page = paginator.page(number)
+            else:
+                page = Page([], number, paginator)
+            context[f"{name}_dataset"] = page.object_list
+            context[f"{name}_page"] = page
+        context["target_session"] = session
+        context["filter_query"] = urlencode(
+            {
+                key: value
+                for key, value in (("session", session), ("top", top))
+                if value is not None
+            }
         )
         return context
 
@@ -2,16 +2,23 @@
     This file is used to provide authentication via LDAP (ActiveDirectory)
 """
 
-from typing import Optional
+import logging
+from contextlib import contextmanager
+from queue import Empty, Full, Queue
+from time import perf_counter
+from typing import Iterator, NamedTuple, Optional, Union
 from uuid import UUID, uuid4
 
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.backends import BaseBackend
+from django.db import transaction
 from django.db.models import Q
-from ldap3 import Connection, Server, ALL, ObjectDef, Reader, NTLM, Entry
-from ldap3.core.exceptions import LDAPSocketOpenError
+from ldap3 import Connection, Server, ALL, NTLM, Entry
+from ldap3.core.exceptions import LDAPException
+from ldap3.utils.conv import escape_filter_chars
 
+from .ldap_cache import clear_identity_caches, forget_users, get_identity_cache
 from .ldap_errors import (
     LDAPConnectionError,
     LDAPInvalidCredentials,
@@ -20,6 +27,34 @@ from .ldap_errors import (
 )
 from .models import User
 
+logger = logging.getLogger(__name__)
+
+
+class CleanupResult(NamedTuple):
+    """
+    This class holds the result of `LDAPAuthentication.delete_old_users`
+
+    :cvar usernames: The usernames of the users that were deleted
+    :cvar timings: How long each phase of the cleanup took, in seconds
+    """
+
+    usernames: list[str]
+    timings: dict[str, float]
+
+
+class SyncResult(NamedTuple):
+    """
+    This class holds the result of `LDAPAuthentication.sync_users`
+
+    :cvar created: The number of users that were created
+    :cvar updated: The number of users that were updated
+    :cvar skipped: The usernames of directory users that couldn't be synced because the username is already taken
+    """
+
+    created: int
+    updated: int
+    skipped: list[str]
+
 
 class LDAPAuthentication(BaseBackend):
     """
@@ -27,9 +62,22 @@ class LDAPAuthentication(BaseBackend):
     with the same info.
 
     :cvar server: The server we're connecting to with LDAP (Must be an ActiveDirectory Server)
+    :cvar service_pool: Bound connections for the service account, reused between requests
+    :cvar login_fields: The User fields that are updated from ActiveDirectory when a user logs in
+    :cvar user_attributes: The attributes we read from ActiveDirectory for each user
     """
 
     server = None
+    service_pool = None
+    login_fields = ["username", "first_name", "last_name", "session"]
+    user_attributes = [
+        "objectGUID",
+        "msDS-PrincipalName",
+        "givenName",
+        "sn",
+        "mail",
+        "employeeNumber",
+    ]
 
     @classmethod
     def setup_server(cls) -> None:
@@ -53,12 +101,12 @@ class LDAPAuthentication(BaseBackend):
 
         try:
             success = conn.bind()
-            if success:
-                return conn
-            else:
-                raise LDAPInvalidCredentials()
-        except LDAPSocketOpenError:
+        except LDAPException:
             raise LDAPConnectionError()
+        if success:
+            return conn
+        else:
+            raise LDAPInvalidCredentials()
 
     @classmethod
     def get_connection(cls, username: str, password: str) -> Connection:
@@ -77,6 +125,108 @@ class LDAPAuthentication(BaseBackend):
         )
         return cls.bind_connection(conn)
 
+    @staticmethod
+    def close_connection(conn: Connection) -> None:
+        """
+        This function unbinds a connection, ignoring errors from connections the server already dropped
+
+        :param conn: The connection to close
+        :type conn: Connection
+        """
+
+        try:
+            conn.unbind()
+        except LDAPException:
+            pass
+
+    @classmethod
+    def get_service_connection(cls, reuse: bool = True) -> Connection:
+        """
+        This function gets a bound connection for the service account, from the pool if there's an open one in it.
+        A service account that can't bind is a problem with the server's settings, not the user's password,
+        so it's reported as a connection error
+
+        :param reuse: If this is unset, a new connection is made even if there's one in the pool
+        :type reuse: bool
+        :returns: The bound connection
+        :rtype: Connection
+        """
+
+        if cls.service_pool is None:
+            cls.service_pool = Queue(maxsize=settings.LDAP_SERVICE_POOL_SIZE)
+        while reuse:
+            try:
+                service_conn = cls.service_pool.get_nowait()
+            except Empty:
+                break
+            if not service_conn.closed:
+                return service_conn
+        try:
+            return cls.get_connection(
+                settings.LDAP_SERVICE_USER, settings.LDAP_SERVICE_PASSWORD
+            )
+        except LDAPInvalidCredentials:
+            logger.error(
+                "The LDAP service account %s can't bind", settings.LDAP_SERVICE_USER
+            )
+            raise LDAPConnectionError()
+
+    @classmethod
+    @contextmanager
+    def directory_connection(
+        cls, conn: Connection, reuse: bool = True
+    ) -> Iterator[Connection]:
+        """
+        This function gets a connection to search the directory with.
+        If `settings.LDAP_SERVICE_USER` is set, a bound service connection is taken from a pool and put back afterwards,
+        otherwise the given connection is used.
+        Errors from ldap3 are raised as `LDAPConnectionError`, and a service connection that had any error is thrown away
+
+        :param conn: The connection to use if there's no service account
+        :type conn: Connection
+        :param reuse: If this is unset, a new service connection is made instead of taking one from the pool
+        :type reuse: bool
+        :returns: The connection to search with
+        :rtype: Connection
+        """
+
+        if settings.LDAP_SERVICE_USER is None:
+            try:
+                yield conn
+            except LDAPException:
+                raise LDAPConnectionError()
+            return
+        service_conn = cls.get_service_connection(reuse)
+        healthy = False
+        try:
+            yield service_conn
+            healthy = True
+        except LDAPException:
+            raise LDAPConnectionError()
+        finally:
+            if not healthy:
+                cls.close_connection(service_conn)
+            else:
+                try:
+                    cls.service_pool.put_nowait(service_conn)
+                except Full:
+                    cls.close_connection(service_conn)
+
+    @staticmethod
+    def user_filter(username: str) -> str:
+        """
+        This function gets the LDAP filter that finds a single user
+
+        :param username: The username (msDS-PrincipalName) of the user
+        :type username: str
+        :returns: The filter to search with
+        :rtype: str
+        """
+
+        return (
+            f"(&(objectClass=user)(msDS-PrincipalName={escape_filter_chars(username)}))"
+        )
+
     @staticmethod
     def ldap_empty(value) -> str:
         """
@@ -114,11 +264,32 @@ class LDAPAuthentication(BaseBackend):
         :rtype: bool
         """
 
-        return ldap_user["msDs-PrincipalName"] == settings.LDAP_ADMIN_NAME
+        return str(ldap_user["msDS-PrincipalName"]) == settings.LDAP_ADMIN_NAME
+
+    @classmethod
+    def get_fields_from_ldap(cls, ldap_user: Union[Entry, dict]) -> dict[str, str]:
+        """
+        This function gets the values of the User fields we keep in sync with ActiveDirectory
+
+        :param ldap_user: The LDAP user to read from, either an Entry or the attributes of a search result
+        :type ldap_user: Entry
+        :returns: The value of each field
+        :rtype: dict
+        """
+
+        return {
+            "username": str(ldap_user["msDS-PrincipalName"]),
+            "first_name": cls.ldap_empty(ldap_user["givenName"]),
+            "last_name": cls.ldap_empty(ldap_user["sn"]),
+            "session": cls.get_session_from_ldap(ldap_user),
+            "email": cls.ldap_empty(ldap_user["mail"]),
+        }
 
     def update_from_ldap(self, ldap_user: Entry, django_user: User) -> User:
         """
-        This function takes an LDAP user and a django user and syncs their data
+        This function takes an LDAP user and a django user and syncs their data.
+        Only the fields that changed are saved, and if none did the user isn't saved at all.
+        A user that changed is removed from the identity cache
 
         :param ldap_user: The ldap user to sync from
         :type ldap_user: Entry
@@ -128,11 +299,17 @@ class LDAPAuthentication(BaseBackend):
         :rtype: User
         """
 
-        django_user.username = ldap_user["msDS-PrincipalName"]
-        django_user.first_name = self.ldap_empty(ldap_user.givenName)
-        django_user.last_name = self.ldap_empty(ldap_user.sn)
-        django_user.session = self.get_session_from_ldap(ldap_user)
-        django_user.save()
+        fields = self.get_fields_from_ldap(ldap_user)
+        changed = [
+            name
+            for name in self.login_fields
+            if getattr(django_user, name) != fields[name]
+        ]
+        for name in changed:
+            setattr(django_user, name, fields[name])
+        if len(changed) > 0:
+            django_user.save(update_fields=changed)
+            forget_users([django_user.id])
         return django_user
 
     def create_from_ldap(self, ldap_user: Entry, guid: str) -> User:
@@ -152,37 +329,97 @@ class LDAPAuthentication(BaseBackend):
             if self.check_user_is_admin(ldap_user)
             else User.objects.create_user
         )
-        new_user = create_method(
-            id=UUID(guid),
-            username=ldap_user["msDS-PrincipalName"],
-            first_name=self.ldap_empty(ldap_user.givenName),
-            last_name=self.ldap_empty(ldap_user.sn),
-            session=self.get_session_from_ldap(ldap_user),
-            email=self.ldap_empty(ldap_user.mail),
-        )
+        new_user = create_method(id=UUID(guid), **self.get_fields_from_ldap(ldap_user))
         new_user.set_unusable_password()
         new_user.save()
         return new_user
 
-    @staticmethod
-    def get_all_users(conn: Connection) -> Reader:
+    @classmethod
+    def iter_all_users(
+        cls, conn: Connection, attributes: list[str], page_size: int = 500
+    ) -> Iterator[dict]:
+        """
+        This function pages through every user in the ActiveDirectory database
+
+        :param conn: The Connection to use for the query
+        :type conn: Connection
+        :param attributes: The attributes to read for each user
+        :type attributes: list
+        :param page_size: The number of users to ask the server for at once
+        :type page_size: int
+        :returns: The attributes of each user
+        :rtype: Iterator
         """
-        This function is used to get all users in the ActiveDirectory database
+
+        with cls.directory_connection(conn) as search_conn:
+            for result in search_conn.extend.standard.paged_search(
+                settings.LDAP_BASE_CONTEXT,
+                "(objectClass=user)",
+                attributes=attributes,
+                paged_size=page_size,
+                generator=True,
+            ):
+                if result["type"] == "searchResEntry":
+                    yield result["attributes"]
+
+    @classmethod
+    def get_principal_names(cls, conn: Connection) -> set[str]:
+        """
+        This function gets the username (msDS-PrincipalName) of every user in the ActiveDirectory database
 
         :param conn: The Connection to use for the query
         :type conn: Connection
-        :returns: A Reader object that contains all users in the database
-        :rtype: Reader
+        :returns: The usernames, in lowercase
+        :rtype: set
+        """
+
+        return {
+            str(attributes["msDS-PrincipalName"]).lower()
+            for attributes in cls.iter_all_users(conn, ["msDS-PrincipalName"])
+        }
+
+    @classmethod
+    def get_snapshot(cls, ldap_user: Entry) -> dict[str, str]:
+        """
+        This function copies the attributes we need from an LDAP user, so they can be cached
+
+        :param ldap_user: The user to copy
+        :type ldap_user: Entry
+        :returns: The value of each attribute in `user_attributes`
+        :rtype: dict
+        """
+
+        return {name: cls.ldap_empty(ldap_user[name]) for name in cls.user_attributes}
+
+    def search_user(
+        self, conn: Connection, username: str, reuse: bool = True
+    ) -> list[Entry]:
+        """
+        This function searches the directory for a user, reading only the attributes in `user_attributes`
+
+        :param conn: The connection for the server
+        :type conn: Connection
+        :param username: The username (MsDs-principalName) to search for
+        :type username: str
+        :param reuse: If this is unset, the search doesn't use a pooled service connection
+        :type reuse: bool
+        :returns: The users that match the username
+        :rtype: list
         """
 
-        user_obj = ObjectDef("user", conn)
-        reader = Reader(conn, user_obj, settings.LDAP_BASE_CONTEXT)
-        reader.search()
-        return reader
+        with self.directory_connection(conn, reuse) as search_conn:
+            search_conn.search(
+                settings.LDAP_BASE_CONTEXT,
+                self.user_filter(username),
+                attributes=self.user_attributes,
+            )
+            return search_conn.entries
 
     def get_ldap_user(self, conn: Connection, username: str) -> Optional[Entry]:
         """
-        This function gets an LDAP user from the LDAP server
+        This function gets an LDAP user from the LDAP server.
+        Only the user we're looking for is searched for, and only the attributes in `user_attributes` are read.
+        If the search fails on a pooled service connection, it's tried once more on a new connection
 
         :param conn: The connection for the server
         :type conn: Connection
@@ -192,18 +429,66 @@ class LDAPAuthentication(BaseBackend):
         :rtype: User
         """
 
-        reader = self.get_all_users(conn)
-        results = reader.match("msDS-PrincipalName", username)
+        try:
+            results = self.search_user(conn, username)
+        except LDAPConnectionError:
+            if settings.LDAP_SERVICE_USER is None:
+                raise
+            # The pooled connection may have been dropped by the server, so try once more on a new one
+            results = self.search_user(conn, username, reuse=False)
         if len(results) == 0:
             raise LDAPNotInContextException()
         else:
             return results[0]
 
+    @staticmethod
+    @contextmanager
+    def time_phase(timings: dict[str, float], name: str) -> Iterator[None]:
+        """
+        This function times a phase of logging in
+
+        :param timings: The dictionary to save the time (in seconds) to
+        :type timings: dict
+        :param name: The name of the phase
+        :type name: str
+        """
+
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            timings[name] = perf_counter() - start
+
+    @staticmethod
+    def record_timings(request, username: str, timings: dict[str, float]) -> None:
+        """
+        This function logs how long each phase of logging in took, at the INFO level.
+        The timings are also saved on the request as `ldap_timings`
+
+        :param request: The request that we're authenticating
+        :param username: The username we're authenticating with
+        :type username: str
+        :param timings: How long each phase took, in seconds
+        :type timings: dict
+        """
+
+        if request is not None:
+            request.ldap_timings = timings
+        logger.info(
+            "LDAP login for %s: %s",
+            username,
+            ", ".join(
+                f"{name} {seconds * 1000:.1f}ms" for name, seconds in timings.items()
+            ),
+        )
+
     def authenticate(
         self, request, username: str = None, password: str = None
     ) -> Optional[User]:
         """
-        This is the function that django uses to authenticate a user
+        This is the function that django uses to authenticate a user.
+        The password is always checked by binding, but if the identity cache is on,
+        the user's directory attributes are reused for `settings.LDAP_IDENTITY_CACHE_TTL` seconds
 
         :param request: The request that we're trying to authenticate
         :param username: The username we're authenticating with
@@ -213,26 +498,44 @@ class LDAPAuthentication(BaseBackend):
         """
 
         ldap_admin_name = settings.LDAP_ADMIN_NAME
+        timings = {}
 
         try:
-            conn = self.get_connection(f"{settings.LDAP_DOMAIN}\\{username}", password)
+            with self.time_phase(timings, "bind"):
+                conn = self.get_connection(
+                    f"{settings.LDAP_DOMAIN}\\{username}", password
+                )
             if f"{settings.LDAP_DOMAIN}\\{username}" == settings.LDAP_ADMIN_NAME:
-                try:
-                    return User.objects.get(username=ldap_admin_name)
-                except User.DoesNotExist:
-                    new_user = User.objects.create_superuser(
-                        username=ldap_admin_name,
-                        email=settings.LDAP_ADMIN_EMAIL,
-                        password="abc",
+                with self.time_phase(timings, "sync"):
+                    try:
+                        return User.objects.get(username=ldap_admin_name)
+                    except User.DoesNotExist:
+                        new_user = User.objects.create_superuser(
+                            username=ldap_admin_name,
+                            email=settings.LDAP_ADMIN_EMAIL,
+                            password="abc",
+                        )
+                        new_user.set_unusable_password()
+                        return new_user
+            with self.time_phase(timings, "search"):
+                directory_cache = get_identity_cache("directory")
+                cache_key = f"{settings.LDAP_DOMAIN}\\{username}".lower()
+                ldap_user = (
+                    None if directory_cache is None else directory_cache.get(cache_key)
+                )
+                if ldap_user is None:
+                    ldap_user = self.get_snapshot(
+                        self.get_ldap_user(conn, f"{settings.LDAP_DOMAIN}\\{username}")
                     )
-                    new_user.set_unusable_password()
-                    return new_user
-            ldap_user = self.get_ldap_user(conn, f"{settings.LDAP_DOMAIN}\\{username}")
+                    if directory_cache is not None:
+                        directory_cache.set(cache_key, ldap_user)
             guid = str(ldap_user["objectGUID"])
-            if User.objects.filter(id=UUID(guid)).exists():
-                return self.update_from_ldap(ldap_user, User.objects.get(id=UUID(guid)))
-            else:
-                return self.create_from_ldap(ldap_user, guid)
+            with self.time_phase(timings, "sync"):
+                django_user = User.objects.filter(id=UUID(guid)).first()
+                if django_user is not None:
+                    return self.update_from_ldap(ldap_user, django_user)
+                else:
+                    return self.create_from_ldap(ldap_user, guid)
         except LDAPInvalidCredentials:
             return None
         except LDAPNotInContextException:
@@ -250,10 +553,15 @@ class LDAPAuthentication(BaseBackend):
                     "There was an error contacting the auth server, please try again later.",
                 )
             return None
+        finally:
+            self.record_timings(request, username, timings)
 
     def get_user(self, user_id: str) -> Optional[User]:
         """
-        This function gets a user given their id
+        This function gets a user given their id.
+        If the identity cache is on and shared between workers,
+        users are kept in the cache for `settings.LDAP_IDENTITY_CACHE_TTL` seconds.
+        Users carry permissions, so they're never cached per process, where another worker could change them unseen
 
         :param user_id: The id of the user
         :type user_id: str
@@ -261,32 +569,62 @@ class LDAPAuthentication(BaseBackend):
         :rtype: User
         """
 
+        user_cache = get_identity_cache("users", shared=True)
+        if user_cache is not None:
+            cached_user = user_cache.get(str(user_id))
+            if cached_user is not None:
+                return cached_user
         try:
-            return User.objects.get(id=user_id)
+            user = User.objects.get(id=user_id)
         except User.DoesNotExist:
             return None
+        if user_cache is not None:
+            user_cache.set(str(user_id), user)
+        return user
 
-    def delete_old_users(self, username: str, password: str) -> None:
+    def delete_old_users(
+        self, username: str, password: str, dry_run: bool = False
+    ) -> CleanupResult:
         """
         This function is used to delete any users that are no longer in the ActiveDirectory database.
+        Every username in the directory is read into a set, and users missing from it are deleted in one query
 
         :param username: The username to use to log in via LDAP
         :type username: str
         :param password: The password to use to log in via LDAP
         :type password: str
+        :param dry_run: If this is set, the users are found but not deleted
+        :type dry_run: bool
+        :returns: The usernames of the users that were (or would be) deleted and how long each phase took
+        :rtype: CleanupResult
         """
 
+        timings = {}
         try:
+            start = perf_counter()
             conn = self.get_connection(username, password)
             ldap_user = self.get_ldap_user(conn, username)
+            timings["bind"] = perf_counter() - start
             if self.check_user_is_admin(ldap_user):
+                start = perf_counter()
+                ldap_names = self.get_principal_names(conn)
+                timings["export"] = perf_counter() - start
+                start = perf_counter()
                 to_check = User.objects.filter(is_superuser=False).filter(
                     Q(password__startswith="!") | Q(password__isnull=True)
                 )
-                ldap_users = self.get_all_users(conn)
-                for user in to_check:
-                    if len(ldap_users.match("msDs-principalName", user.username)) == 0:
-                        user.delete()
+                old_users = {
+                    user_id: name
+                    for user_id, name in to_check.values_list("id", "username")
+                    if name.lower() not in ldap_names
+                }
+                timings["compare"] = perf_counter() - start
+                start = perf_counter()
+                if not dry_run and len(old_users) > 0:
+                    with transaction.atomic():
+                        User.objects.filter(id__in=old_users.keys()).delete()
+                timings["delete"] = perf_counter() - start
+                return CleanupResult(sorted(old_users.values()), timings)
             else:
                 raise LDAPAuthException("You lack permissions to perform this action.")
         except LDAPInvalidCredentials:
@@ -297,3 +635,75 @@ class LDAPAuthentication(BaseBackend):
             raise LDAPAuthException(
                 "Can't connect to ActiveDirectory, please try again later."
             )
+
+    def sync_users(
+        self, username: str, password: str, dry_run: bool = False
+    ) -> SyncResult:
+        """
+        This function updates every User from ActiveDirectory at once, and creates any users that are missing.
+        The directory is paged through once and compared with the User table in memory,
+        then the changes are saved with one bulk insert and one bulk update, and the identity caches are cleared
+
+        :param username: The username to use to log in via LDAP
+        :type username: str
+        :param password: The password to use to log in via LDAP
+        :type password: str
+        :param dry_run: If this is set, the changes are counted but not saved
+        :type dry_run: bool
+        :returns: The number of users created and updated
+        :rtype: SyncResult
+        """
+
+        try:
+            conn = self.get_connection(username, password)
+            ldap_users = list(self.iter_all_users(conn, self.user_attributes))
+        except LDAPInvalidCredentials:
+            raise LDAPAuthException(
+                "The password you provided was incorrect, please check it and try again."
+            )
+        except LDAPConnectionError:
+            raise LDAPAuthException(
+                "Can't connect to ActiveDirectory, please try again later."
+            )
+
+        field_names = ["username", "first_name", "last_name", "session", "email"]
+        users = {user.id: user for user in User.objects.only("id", *field_names)}
+        taken_names = {user.username: user.id for user in users.values()}
+        to_create, to_update, changed_fields, skipped = [], [], set(), []
+        for ldap_user in ldap_users:
+            guid = UUID(str(ldap_user["objectGUID"]))
+            fields = self.get_fields_from_ldap(ldap_user)
+            if taken_names.get(fields["username"], guid) != guid:
+                skipped.append(fields["username"])
+            elif guid in users:
+                user = users[guid]
+                changed = [
+                    name
+                    for name, value in fields.items()
+                    if getattr(user, name) != value
+                ]
+                if len(changed) > 0:
+                    for name in changed:
+                        setattr(user, name, fields[name])
+                    changed_fields.update(changed)
+                    to_update.append(user)
+            else:
+                is_admin = self.check_user_is_admin(ldap_user)
+                new_user = User(
+                    id=guid, is_superuser=is_admin, is_staff=is_admin, **fields
+                )
+                new_user.set_unusable_password()
+                to_create.append(new_user)
+                taken_names[fields["username"]] = guid
+
+        if not dry_run:
+            with transaction.atomic():
+                User.objects.bulk_create(to_create, batch_size=500)
+                if len(to_update) > 0:
+                    User.objects.bulk_update(
+                        to_update, sorted(changed_fields), batch_size=500
+                    )
+            # Bulk writes don't send signals, so the cached identities have to be forgotten here
+            if len(to_create) > 0 or len(to_update) > 0:
+                clear_identity_caches()
+        return SyncResult(len(to_create), len(to_update), skipped)
@@ -0,0 +1,203 @@
+"""
+    This file provides short-lived caches for identities we've read from LDAP.
+    Entries are kept in the Django cache, which is per process unless `settings.CACHES` points at a shared backend,
+    so with the default cache each worker has its own entries and only sees its own invalidations
+"""
+
+from hashlib import md5
+from typing import Hashable, Iterable, Optional
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import User
+
+VERSION_KEY = "ldap-identity-version"
+
+
+def cache_is_shared() -> bool:
+    """
+    This function checks if the Django cache is shared between workers, rather than kept in each process
+
+    :returns: Whether every worker reads and writes the same cache
+    :rtype: bool
+    """
+
+    return not isinstance(caches["default"], (LocMemCache, DummyCache))
+
+
+def get_version() -> str:
+    """
+    This function gets the version that's part of every identity cache key
+
+    :returns: The current version
+    :rtype: str
+    """
+
+    return cache.get_or_set(VERSION_KEY, lambda: uuid4().hex, timeout=None)
+
+
+class IdentityCache:
+    """
+    This class is a cache for one kind of identity, kept in the Django cache for a few minutes.
+    Every key includes the version from `get_version`, so `clear_identity_caches` can forget every entry at once
+    (for every worker if the cache is shared, otherwise only for this process)
+
+    :ivar name: The name of the cache, part of every key
+    :ivar ttl: How long to keep entries, in seconds
+    :ivar hits: The number of times an entry was found by this process
+    :ivar misses: The number of times an entry was missing or expired for this process
+    """
+
+    def __init__(self, name: str, ttl: float):
+        """
+        This function sets up the cache
+
+        :param name: The name of the cache
+        :type name: str
+        :param ttl: How long to keep entries, in seconds
+        :type ttl: float
+        """
+
+        self.name = name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def cache_key(self, key: Hashable) -> str:
+        """
+        This function gets the key an entry is stored under in the Django cache
+
+        :param key: The key of the entry
+        :type key: Hashable
+        :returns: The key to use in the Django cache
+        :rtype: str
+        """
+
+        digest = md5(str(key).encode("utf-8")).hexdigest()
+        return f"ldap-identity-{get_version()}-{self.name}-{digest}"
+
+    def get(self, key: Hashable) -> Optional[object]:
+        """
+        This function gets an entry from the cache
+
+        :param key: The key of the entry
+        :type key: Hashable
+        :returns: The value of the entry, or None if it's missing or expired
+        """
+
+        value = cache.get(self.cache_key(key))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: object) -> None:
+        """
+        This function adds an entry to the cache
+
+        :param key: The key of the entry
+        :type key: Hashable
+        :param value: The value to store
+        """
+
+        cache.set(self.cache_key(key), value, timeout=self.ttl)
+
+    def delete_many(self, keys: Iterable[Hashable]) -> None:
+        """
+        This function removes entries from the cache, if they're there
+
+        :param keys: The keys of the entries
+        :type keys: Iterable
+        """
+
+        cache.delete_many([self.cache_key(key) for key in keys])
+
+    def delete(self, key: Hashable) -> None:
+        """
+        This function removes an entry from the cache, if it's there
+
+        :param key: The key of the entry
+        :type key: Hashable
+        """
+
+        self.delete_many([key])
+
+    def stats(self) -> dict[str, int]:
+        """
+        This function gets the counters of the cache
+
+        :returns: The number of hits and misses
+        :rtype: dict
+        """
+
+        return {"hits": self.hits, "misses": self.misses}
+
+
+identity_caches = {}
+
+
+def get_identity_cache(name: str, shared: bool = False) -> Optional[IdentityCache]:
+    """
+    This function gets one of the identity caches, configured by `settings.LDAP_IDENTITY_CACHE_TTL`
+
+    :param name: The name of the cache
+    :type name: str
+    :param shared: Only use the cache if it's shared between workers,
+        for entries that another worker could change without this one knowing
+    :type shared: bool
+    :returns: The cache, or None if caching is turned off
+    :rtype: IdentityCache
+    """
+
+    ttl = settings.LDAP_IDENTITY_CACHE_TTL
+    if ttl <= 0 or (shared and not cache_is_shared()):
+        return None
+    identity_cache = identity_caches.get(name)
+    if identity_cache is None or identity_cache.ttl != ttl:
+        identity_cache = IdentityCache(name, ttl)
+        identity_caches[name] = identity_cache
+    return identity_cache
+
+
+def clear_identity_caches() -> None:
+    """
+    This function forgets every entry in every identity cache by changing the version.
+    If the cache isn't shared, only this process forgets them, the other workers keep theirs until they expire.
+    It's used when users are changed in bulk, since bulk updates don't send signals
+    """
+
+    cache.set(VERSION_KEY, uuid4().hex, timeout=None)
+
+
+def forget_users(user_ids: Iterable[object]) -> None:
+    """
+    This function removes Users from the cache, used when they're changed without sending signals
+
+    :param user_ids: The ids of the Users
+    :type user_ids: Iterable
+    """
+
+    user_cache = get_identity_cache("users", shared=True)
+    if user_cache is not None:
+        user_cache.delete_many(str(user_id) for user_id in user_ids)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user(sender, instance: User, **kwargs) -> None:
+    """
+    This function removes a User from the cache when they're saved or deleted
+
+    :param sender: The model class that sent the signal
+    :param instance: The User that changed
+    :type instance: User
+    """
+
+    forget_users([instance.id])
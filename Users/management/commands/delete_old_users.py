@@ -0,0 +1,73 @@
+"""
+    This file defines a command that deletes users who are no longer in ActiveDirectory
+"""
+
+from getpass import getpass
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils.module_loading import import_string
+
+from Users.ldap_auth import LDAPAuthentication
+from Users.ldap_errors import LDAPAuthException
+
+
+class Command(BaseCommand):
+    """
+    This command does the same cleanup as `UserClearView`, using the first authentication backend
+
+    :cvar help: The help text to display for the command
+    """
+
+    help = "Deletes users who are no longer in ActiveDirectory"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        This function defines the arguments the command takes
+
+        :param parser: The parser to add the arguments to
+        :type parser: CommandParser
+        """
+
+        parser.add_argument(
+            "--username",
+            default=None,
+            help="The admin account to log in with (domain\\username), defaults to LDAP_ADMIN_NAME",
+        )
+        parser.add_argument(
+            "--password",
+            default=None,
+            help="The password of the admin account, asked for if not given",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="List the users that would be deleted without deleting them",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """
+        This function is run when the command is called
+        """
+
+        backend = import_string(settings.AUTHENTICATION_BACKENDS[0])
+        if not issubclass(backend, LDAPAuthentication):
+            raise CommandError("The first authentication backend must use LDAP")
+        username = options["username"] or settings.LDAP_ADMIN_NAME
+        password = options["password"]
+        if password is None:
+            password = getpass(f"Password for {username}: ")
+
+        try:
+            result = backend().delete_old_users(
+                username, password, dry_run=options["dry_run"]
+            )
+        except LDAPAuthException as error:
+            raise CommandError(error.args[0])
+
+        for name in result.usernames:
+            self.stdout.write(name)
+        for phase, seconds in result.timings.items():
+            self.stdout.write(f"{phase}: {seconds * 1000:.1f}ms")
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(result.usernames)} user(s)"))
@@ -0,0 +1,83 @@
+"""
+    This file defines a command that updates every user from ActiveDirectory
+"""
+
+from getpass import getpass
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.utils.module_loading import import_string
+
+from Users.ldap_auth import LDAPAuthentication
+from Users.ldap_errors import LDAPAuthException
+
+
+class Command(BaseCommand):
+    """
+    This command syncs the name, session and email of every user with ActiveDirectory,
+    and creates users who haven't logged in yet. It's meant to be run on a schedule
+
+    :cvar help: The help text to display for the command
+    """
+
+    help = "Updates every user from ActiveDirectory"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        This function defines the arguments the command takes
+
+        :param parser: The parser to add the arguments to
+        :type parser: CommandParser
+        """
+
+        parser.add_argument(
+            "--username",
+            default=None,
+            help="The account to log in with (domain\\username), defaults to LDAP_SERVICE_USER or LDAP_ADMIN_NAME",
+        )
+        parser.add_argument(
+            "--password",
+            default=None,
+            help="The password of the account, asked for if not given",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count the changes without saving them",
+        )
+
+    def handle(self, *args, **options) -> None:
+        """
+        This function is run when the command is called
+        """
+
+        backend = import_string(settings.AUTHENTICATION_BACKENDS[0])
+        if not issubclass(backend, LDAPAuthentication):
+            raise CommandError("The first authentication backend must use LDAP")
+        username = options["username"] or settings.LDAP_SERVICE_USER
+        password = options["password"]
+        if username is None:
+            username = settings.LDAP_ADMIN_NAME
+        elif password is None and username == settings.LDAP_SERVICE_USER:
+            password = settings.LDAP_SERVICE_PASSWORD
+        if password is None:
+            password = getpass(f"Password for {username}: ")
+
+        try:
+            result = backend().sync_users(
+                username, password, dry_run=options["dry_run"]
+            )
+        except LDAPAuthException as error:
+            raise CommandError(error.args[0])
+
+        for name in result.skipped:
+            self.stdout.write(
+                self.style.WARNING(f"Skipped {name}, the username is already taken")
+            )
+        if options["dry_run"]:
+            summary = f"Would create {result.created} user(s) and update {result.updated} user(s)"
+        else:
+            summary = (
+                f"Created {result.created} user(s) and updated {result.updated} user(s)"
+            )
+        self.stdout.write(self.style.SUCCESS(summary))
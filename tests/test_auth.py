@@ -1,8 +1,24 @@
+from io import StringIO
+from pathlib import Path
+from tempfile import gettempdir
+from unittest.mock import patch
 from uuid import uuid4
 
-from django.test import override_settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from ldap3.core.exceptions import LDAPSessionTerminatedByServerError
 
+from Users.ldap_cache import (
+    IdentityCache,
+    cache_is_shared,
+    clear_identity_caches,
+    forget_users,
+    get_identity_cache,
+)
 from Users.ldap_mock import LDAPMockAuthentication
 from Users.models import User
 from tests.testing_base import SimpleBaseCase
@@ -123,6 +139,43 @@ class LDAPAuthTest(SimpleBaseCase):
         self.assertEqual(updated_user.first_name, "PMBob")
         self.assertEqual(updated_user.last_name, "PMBobberson")
 
+    def test_unchanged_not_saved(self) -> None:
+        login = {"username": "user_pm", "password": "pm_user_password123"}
+        self.client.post(self.url, login)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, login)
+        updates = [
+            q["sql"]
+            for q in queries.captured_queries
+            if q["sql"].startswith('UPDATE "Users_user"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('SET "last_login"', updates[0])
+        self.assertNotIn("first_name", updates[0])
+
+    def test_changed_fields_saved(self) -> None:
+        login = {"username": "user_pm", "password": "pm_user_password123"}
+        self.client.post(self.url, login)
+        User.objects.filter(username="example\\user_pm").update(session="AM")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, login)
+        self.assertTrue(
+            any('SET "session"' in q["sql"] for q in queries.captured_queries)
+        )
+        self.assertEqual(
+            User.objects.get(username="example\\user_pm").session, User.Session.PM
+        )
+
+    def test_timings_logged(self) -> None:
+        with self.assertLogs("Users.ldap_auth", "INFO") as logs:
+            response = self.client.post(
+                self.url, {"username": "user_am", "password": "am_user_password123"}
+            )
+        self.assertIn("LDAP login for user_am", logs.output[0])
+        self.assertEqual(
+            set(response.wsgi_request.ldap_timings.keys()), {"bind", "search", "sync"}
+        )
+
     def test_no_user(self) -> None:
         user = LDAPMockAuthentication().get_user(str(uuid4()))
         self.assertIsNone(user)
@@ -156,6 +209,107 @@ class LDAPAuthTest(SimpleBaseCase):
         LDAPMockAuthentication.users = []
 
 
+@override_settings(
+    AUTHENTICATION_BACKENDS=["Users.ldap_mock.LDAPMockAuthentication"],
+    LDAP_DOMAIN="example",
+    LDAP_BASE_CONTEXT="ou=ITP Users,dc=itp,dc=example,dc=com",
+    LDAP_URL="0.0.0.0",
+    LDAP_ADMIN_NAME="example\\admin",
+)
+class LDAPLookupTest(SimpleBaseCase):
+    user_count = 3000
+
+    def setUp(self) -> None:
+        super(LDAPLookupTest, self).setUp()
+        LDAPMockAuthentication.users = {
+            f"user_{i}": {
+                "password": f"password_{i}",
+                "first": f"First{i}",
+                "last": f"Last{i}",
+                "ou": "PM" if i % 2 else "AM",
+            }
+            for i in range(self.user_count)
+        }
+
+    def test_login(self) -> None:
+        self.client.post(
+            reverse("login"), {"username": "user_2999", "password": "password_2999"}
+        )
+        new_user = User.objects.get(username="example\\user_2999")
+        self.assertEqual(new_user.first_name, "First2999")
+        self.assertEqual(new_user.session, User.Session.PM)
+
+    def test_single_entry(self) -> None:
+        backend = LDAPMockAuthentication()
+        conn = backend.get_connection("example\\user_10", "password_10")
+        ldap_user = backend.get_ldap_user(conn, "example\\user_10")
+        self.assertEqual(len(conn.entries), 1)
+        self.assertEqual(str(ldap_user.givenName), "First10")
+        self.assertLessEqual(
+            {name.lower() for name in ldap_user.entry_attributes},
+            {name.lower() for name in LDAPMockAuthentication.user_attributes},
+        )
+
+    @override_settings(
+        LDAP_SERVICE_USER="example\\user_0", LDAP_SERVICE_PASSWORD="password_0"
+    )
+    def test_service_pool(self) -> None:
+        backend = LDAPMockAuthentication()
+        conn = backend.get_connection("example\\user_1", "password_1")
+        backend.get_ldap_user(conn, "example\\user_1")
+        service_conn = LDAPMockAuthentication.service_pool.get_nowait()
+        LDAPMockAuthentication.service_pool.put_nowait(service_conn)
+        backend.get_ldap_user(conn, "example\\user_2")
+        self.assertEqual(LDAPMockAuthentication.service_pool.qsize(), 1)
+        self.assertIs(LDAPMockAuthentication.service_pool.get_nowait(), service_conn)
+        self.assertIsNone(conn.response)
+
+    @override_settings(
+        LDAP_SERVICE_USER="example\\user_0", LDAP_SERVICE_PASSWORD="password_0"
+    )
+    def test_service_pool_dropped(self) -> None:
+        backend = LDAPMockAuthentication()
+        conn = backend.get_connection("example\\user_1", "password_1")
+        backend.get_ldap_user(conn, "example\\user_1")
+        dropped_conn = LDAPMockAuthentication.service_pool.get_nowait()
+        LDAPMockAuthentication.service_pool.put_nowait(dropped_conn)
+        with patch.object(
+            dropped_conn, "search", side_effect=LDAPSessionTerminatedByServerError()
+        ):
+            ldap_user = backend.get_ldap_user(conn, "example\\user_2")
+        self.assertEqual(str(ldap_user.givenName), "First2")
+        self.assertTrue(dropped_conn.closed)
+        self.assertIsNot(LDAPMockAuthentication.service_pool.get_nowait(), dropped_conn)
+
+    @override_settings(
+        LDAP_SERVICE_USER="example\\user_0", LDAP_SERVICE_PASSWORD="wrong_password"
+    )
+    def test_service_bind_failed(self) -> None:
+        with self.assertLogs("Users.ldap_auth", "ERROR"):
+            response = self.client.post(
+                reverse("login"),
+                {"username": "user_1", "password": "password_1"},
+                follow=True,
+            )
+        self.assertContains(response, "There was an error contacting the auth server")
+        self.assertFalse(User.objects.filter(username="example\\user_1").exists())
+
+    @override_settings(
+        LDAP_SERVICE_USER="example\\user_0", LDAP_SERVICE_PASSWORD="password_0"
+    )
+    def test_service_pool_closed_early(self) -> None:
+        backend = LDAPMockAuthentication()
+        conn = backend.get_connection("example\\user_1", "password_1")
+        users = backend.iter_all_users(conn, ["msDS-PrincipalName"], page_size=10)
+        next(users)
+        users.close()
+        self.assertEqual(LDAPMockAuthentication.service_pool.qsize(), 0)
+
+    def tearDown(self) -> None:
+        LDAPMockAuthentication.users = []
+        LDAPMockAuthentication.service_pool = None
+
+
 @override_settings(
     AUTHENTICATION_BACKENDS=["Users.ldap_mock.LDAPMockAuthentication"],
     LDAP_DOMAIN="example",
@@ -223,6 +377,29 @@ class UserCleanupTest(SimpleBaseCase):
         self.assertTrue(User.objects.filter(username="example\\student").exists())
         self.assertMessage(response, "You lack permissions to perform this action.")
 
+    def test_dry_run(self):
+        result = LDAPMockAuthentication().delete_old_users(
+            "example\\admin", "admin_password123", dry_run=True
+        )
+        self.assertEqual(result.usernames, ["example\\old_user"])
+        self.assertEqual(
+            set(result.timings.keys()), {"bind", "export", "compare", "delete"}
+        )
+        self.assertTrue(User.objects.filter(username="example\\old_user").exists())
+
+    def test_command(self):
+        out = StringIO()
+        call_command("delete_old_users", password="admin_password123", stdout=out)
+        self.assertIn("example\\old_user", out.getvalue())
+        self.assertIn("Deleted 1 user(s)", out.getvalue())
+        self.assertFalse(User.objects.filter(username="example\\old_user").exists())
+        self.assertTrue(User.objects.filter(username="example\\student").exists())
+
+    def test_command_wrong_password(self):
+        with self.assertRaises(CommandError):
+            call_command("delete_old_users", password="wrong", stdout=StringIO())
+        self.assertTrue(User.objects.filter(username="example\\old_user").exists())
+
     @override_settings(
         LDAP_URL="localhost",
         AUTHENTICATION_BACKENDS=["Users.ldap_auth.LDAPAuthentication"],
@@ -239,3 +416,224 @@ class UserCleanupTest(SimpleBaseCase):
 
 def tearDown(self) -> None:
     LDAPMockAuthentication.users = []
+
+
+@override_settings(
+    AUTHENTICATION_BACKENDS=["Users.ldap_mock.LDAPMockAuthentication"],
+    LDAP_DOMAIN="example",
+    LDAP_BASE_CONTEXT="ou=Sync Users,dc=itp,dc=example,dc=com",
+    LDAP_ADMIN_NAME="example\\admin",
+    LDAP_URL="0.0.0.0",
+)
+class LDAPSyncTest(SimpleBaseCase):
+    def setUp(self) -> None:
+        super(LDAPSyncTest, self).setUp()
+        LDAPMockAuthentication.users = {
+            "admin": {
+                "password": "admin_password123",
+                "first": "First",
+                "last": "Last",
+                "ou": "AM",
+            },
+            "student_am": {
+                "password": "am_password123",
+                "first": "AMFirst",
+                "last": "AMLast",
+                "ou": "AM",
+            },
+            "student_pm": {
+                "password": "pm_password123",
+                "first": "PMFirst",
+                "last": "PMLast",
+                "ou": "PM",
+            },
+        }
+        self.client.post(
+            reverse("login"), {"username": "student_am", "password": "am_password123"}
+        )
+        self.student = User.objects.get(username="example\\student_am")
+        self.student.session = User.Session.PM
+        self.student.save()
+
+    def sync(self, *args):
+        out = StringIO()
+        call_command(
+            "sync_ldap_users", "--password", "admin_password123", *args, stdout=out
+        )
+        return out.getvalue()
+
+    def test_sync(self):
+        self.assertIn("Created 2 user(s) and updated 1 user(s)", self.sync())
+        self.assertEqual(
+            User.objects.get(username="example\\student_am").session,
+            User.Session.AM,
+        )
+        new_user = User.objects.get(username="example\\student_pm")
+        self.assertEqual(new_user.first_name, "PMFirst")
+        self.assertEqual(new_user.email, "student_pm@example.com")
+        self.assertEqual(new_user.session, User.Session.PM)
+        self.assertFalse(new_user.has_usable_password())
+        self.assertTrue(User.objects.get(username="example\\admin").is_superuser)
+
+    def test_no_changes(self):
+        self.sync()
+        with CaptureQueriesContext(connection) as queries:
+            output = self.sync()
+        self.assertIn("Created 0 user(s) and updated 0 user(s)", output)
+        for query in queries.captured_queries:
+            self.assertFalse(query["sql"].startswith(("INSERT", "UPDATE")))
+
+    def test_dry_run(self):
+        self.assertIn(
+            "Would create 2 user(s) and update 1 user(s)", self.sync("--dry-run")
+        )
+        self.assertFalse(User.objects.filter(username="example\\student_pm").exists())
+        self.assertEqual(
+            User.objects.get(username="example\\student_am").session,
+            User.Session.PM,
+        )
+
+    def tearDown(self) -> None:
+        LDAPMockAuthentication.users = []
+
+
+# A cache every process can read, standing in for a shared backend like Redis
+SHARED_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": str(Path(gettempdir()) / f"code-review-test-cache-{uuid4().hex}"),
+    }
+}
+
+
+class IdentityCacheTest(SimpleTestCase):
+    def setUp(self) -> None:
+        clear_identity_caches()
+
+    def test_hits_and_misses(self):
+        cache = IdentityCache("test", 60)
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1})
+
+    def test_expiry(self):
+        cache = IdentityCache("test", 60)
+        with patch("time.time", return_value=1000):
+            cache.set("a", 1)
+        with patch("time.time", return_value=1061):
+            self.assertIsNone(cache.get("a"))
+
+    def test_cleared(self):
+        cache = IdentityCache("test", 60)
+        cache.set("a", 1)
+        clear_identity_caches()
+        self.assertIsNone(cache.get("a"))
+
+    def test_shared(self):
+        self.assertFalse(cache_is_shared())
+        with override_settings(CACHES=SHARED_CACHES):
+            self.assertTrue(cache_is_shared())
+
+
+@override_settings(
+    AUTHENTICATION_BACKENDS=["Users.ldap_mock.LDAPMockAuthentication"],
+    LDAP_DOMAIN="example",
+    LDAP_BASE_CONTEXT="ou=ITP Users,dc=itp,dc=example,dc=com",
+    LDAP_ADMIN_NAME="example\\admin",
+    LDAP_URL="0.0.0.0",
+    LDAP_IDENTITY_CACHE_TTL=60,
+)
+class LDAPIdentityCacheTest(SimpleBaseCase):
+    login = {"username": "cached_user", "password": "cached_password123"}
+
+    def setUp(self) -> None:
+        super(LDAPIdentityCacheTest, self).setUp()
+        LDAPMockAuthentication.users = {
+            "cached_user": {
+                "password": "cached_password123",
+                "first": "Cached",
+                "last": "User",
+                "ou": "PM",
+            },
+        }
+        clear_identity_caches()
+
+    def test_login_reuses_directory(self):
+        with patch.object(
+            LDAPMockAuthentication,
+            "get_ldap_user",
+            autospec=True,
+            side_effect=LDAPMockAuthentication.get_ldap_user,
+        ) as get_ldap_user:
+            self.client.post(reverse("login"), self.login)
+            self.client.post(reverse("login"), self.login)
+        self.assertEqual(get_ldap_user.call_count, 1)
+        self.assertEqual(
+            User.objects.get(username="example\\cached_user").session,
+            User.Session.PM,
+        )
+        self.assertEqual(get_identity_cache("directory").stats()["hits"], 1)
+
+    def test_wrong_password(self):
+        self.client.post(reverse("login"), self.login)
+        self.client.logout()
+        self.client.post(
+            reverse("login"),
+            {"username": "cached_user", "password": "wrong_password"},
+        )
+        self.assertNotIn("_auth_user_id", self.client.session)
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_get_user(self):
+        self.client.post(reverse("login"), self.login)
+        user_id = str(User.objects.get(username="example\\cached_user").id)
+        backend = LDAPMockAuthentication()
+        backend.get_user(user_id)
+        with self.assertNumQueries(0):
+            self.assertEqual(backend.get_user(user_id).first_name, "Cached")
+
+    def test_get_user_not_shared(self):
+        self.client.post(reverse("login"), self.login)
+        user_id = str(User.objects.get(username="example\\cached_user").id)
+        backend = LDAPMockAuthentication()
+        backend.get_user(user_id)
+        with self.assertNumQueries(1):
+            self.assertEqual(backend.get_user(user_id).first_name, "Cached")
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_get_user_saved(self):
+        self.client.post(reverse("login"), self.login)
+        user = User.objects.get(username="example\\cached_user")
+        backend = LDAPMockAuthentication()
+        backend.get_user(str(user.id))
+        user.rainbow_mode = True
+        user.save()
+        self.assertTrue(backend.get_user(str(user.id)).rainbow_mode)
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_sync_clears(self):
+        self.client.post(reverse("login"), self.login)
+        user_id = str(User.objects.get(username="example\\cached_user").id)
+        User.objects.filter(id=user_id).update(session=User.Session.AM)
+        backend = LDAPMockAuthentication()
+        backend.get_user(user_id)
+        result = backend.sync_users("example\\cached_user", "cached_password123")
+        self.assertEqual(result.updated, 1)
+        self.assertEqual(backend.get_user(user_id).session, User.Session.PM)
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_counters_forgotten(self):
+        self.client.post(reverse("login"), self.login)
+        user_id = str(User.objects.get(username="example\\cached_user").id)
+        backend = LDAPMockAuthentication()
+        backend.get_user(user_id)
+        User.objects.filter(id=user_id).update(is_active=False)
+        forget_users([user_id])
+        self.assertFalse(backend.get_user(user_id).is_active)
+
+    def tearDown(self) -> None:
+        LDAPMockAuthentication.users = []
+        clear_identity_caches()
+        with override_settings(CACHES=SHARED_CACHES):
+            cache.clear()
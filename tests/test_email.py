@@ -1,8 +1,15 @@
+from io import StringIO
+from unittest.mock import patch
+
 from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.test import override_settings
 
-from Main.models import Review
+from Main.models import Notification, Review
+from Main.notifications import TARGET_USER_PLACEHOLDER, send_notifications
 from Users.models import User
 from tests.testing_base import BaseCase
 
@@ -87,3 +94,94 @@ class TestEmail(BaseCase):
             {"schoology_id": "12.34.56", "rubric": self.rubric.id},
         )
         self.assertEqual(0, len(mail.outbox))
+
+
+@override_settings(LDAP_ADMIN_EMAIL="admin@example.com")
+class TestNotificationQueue(BaseCase):
+    test_review = False
+    test_review_student = "student-affiliated"
+
+    test_users = {
+        "reviewer-affiliated": (True, False),
+        "reviewer-not": (True, False),
+        "student-affiliated": (False, False),
+    }
+
+    def create_review(self):
+        self.post(
+            "student-affiliated",
+            reverse("review-create"),
+            {"schoology_id": "12.34.56", "rubric": self.rubric.id},
+        )
+
+    @override_settings(NOTIFICATIONS_ASYNC=True)
+    def test_queued(self) -> None:
+        self.create_review()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(len(Notification.objects.get().recipients), 2)
+
+    @override_settings(NOTIFICATIONS_ASYNC=True)
+    def test_send(self) -> None:
+        self.create_review()
+        out = StringIO()
+        call_command("send_notifications", stdout=out)
+        self.assertIn("Sent 1 notification(s) as 2 email(s)", out.getvalue())
+        self.assertEqual(Notification.objects.count(), 0)
+        self.assertEqual(len(mail.outbox), 2)
+        for msg in mail.outbox:
+            self.assertEqual(msg.subject, "AM | Review created by student-affiliated")
+
+    @override_settings(NOTIFICATIONS_ASYNC=True)
+    def test_overlapping_runs(self) -> None:
+        self.create_review()
+        send_messages = EmailBackend.send_messages
+        overlapping = []
+
+        def send_during_other_run(backend, messages):
+            # A second run starts while the first is still sending
+            overlapping.append(send_notifications())
+            return send_messages(backend, messages)
+
+        with patch.object(
+            EmailBackend,
+            "send_messages",
+            autospec=True,
+            side_effect=send_during_other_run,
+        ):
+            self.assertEqual(send_notifications(), (1, 2))
+        self.assertEqual(overlapping, [(0, 0)])
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(send_notifications(), (0, 0))
+        self.assertEqual(len(mail.outbox), 2)
+
+    @override_settings(NOTIFICATIONS_ASYNC=True)
+    def test_send_failed(self) -> None:
+        self.create_review()
+        with patch.object(
+            EmailBackend, "send_messages", side_effect=ConnectionError("down")
+        ):
+            with self.assertRaises(ConnectionError):
+                send_notifications()
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(send_notifications(), (1, 2))
+
+    def test_personalized(self) -> None:
+        self.set_user_full_name("reviewer-affiliated", "Test", "<Reviewer>")
+        self.create_review()
+        html = {msg.to[0]: msg.alternatives[0][0] for msg in mail.outbox}
+        self.assertIn(
+            "Hello, Test &lt;Reviewer&gt;",
+            html[self.users["reviewer-affiliated"].email],
+        )
+        self.assertIn("Hello, reviewer-not", html[self.users["reviewer-not"].email])
+        for content in html.values():
+            self.assertNotIn(TARGET_USER_PLACEHOLDER, content)
+
+    def test_one_render(self) -> None:
+        with patch(
+            "Main.notifications.render_to_string", wraps=render_to_string
+        ) as render:
+            self.create_review()
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(len(mail.outbox), 2)
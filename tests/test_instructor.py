@@ -1,7 +1,17 @@
+from csv import DictReader
+from datetime import timedelta
+from io import StringIO
+from json import loads
+from unittest.mock import patch
 from uuid import uuid4
 
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
+from Instructor.views import ReviewExportView
 from Main.models import Review
 from Users.models import User
 from tests.testing_base import BaseCase, SimpleBaseCase
@@ -74,6 +84,52 @@ class HomeViewTest(BaseCase):
         response = self.get("super", reverse("instructor-home"))
         self.assertIn(self.review, response.context.get("pm_completed", []))
 
+    def add_reviews(self, amount) -> None:
+        now = timezone.now()
+        for x in range(amount):
+            for student in ("student", "student-pm"):
+                for status in Review.Status.values:
+                    review = self.make_arb_review(
+                        student, "reviewer", status, f"12.34.{x:02}"
+                    )
+                    if status == Review.Status.CLOSED:
+                        Review.objects.filter(id=review.id).update(
+                            date_completed=now - timedelta(minutes=x)
+                        )
+
+    def count_queries(self) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            self.get("super", reverse("instructor-home"))
+        return len(queries)
+
+    def test_constant_queries(self) -> None:
+        self.make_arb_user("student-pm", "test-password", make_client=False)
+        self.set_user_session("student-pm", User.Session.PM)
+        small = self.count_queries()
+        self.add_reviews(10)
+        self.assertEqual(self.count_queries(), small)
+
+    def test_completed_preview(self) -> None:
+        self.make_arb_user("student-pm", "test-password", make_client=False)
+        self.set_user_session("student-pm", User.Session.PM)
+        self.add_reviews(6)
+        response = self.get("super", reverse("instructor-home"))
+        for session in ("am", "pm"):
+            completed = response.context[f"{session}_completed"]
+            self.assertEqual(
+                [review.schoology_id for review in completed],
+                [f"12.34.{x:02}" for x in range(4)],
+            )
+            self.assertEqual(response.context[f"{session}_completed_count"], 6)
+            self.assertEqual(
+                len(response.context[f"{session}_active"]),
+                response.context[f"{session}_open_count"]
+                + response.context[f"{session}_assigned_count"],
+            )
+        self.assertEqual(response.context["pm_open_count"], 6)
+        self.assertEqual(response.context["pm_assigned_count"], 6)
+        self.assertContains(response, "6 open, 6 assigned")
+
 
 class UserDesignationTest(BaseCase):
     url = reverse("user-list")
@@ -156,3 +212,122 @@ class UserDesignationTest(BaseCase):
             },
         )
         self.assertMessage(response, "Invalid User IDs")
+
+
+class ReviewExportTest(BaseCase):
+    test_users = BaseCase.USER_STUDENT_REVIEWER
+
+    test_review_student = "student"
+    test_review_reviewer = "reviewer"
+
+    url = reverse("review-export")
+
+    def setUp(self) -> None:
+        super(ReviewExportTest, self).setUp()
+        self.set_test_review_status(Review.Status.ASSIGNED)
+        self.grade(self.review, "[10,2]")
+
+    def grade(self, review, scores) -> None:
+        self.post_review(
+            "reviewer",
+            "review-grade",
+            review.id,
+            {"scores": scores, "is_draft": "false"},
+        )
+
+    def add_reviews(self, amount) -> None:
+        for x in range(amount):
+            review = self.make_arb_review(
+                "student", "reviewer", Review.Status.ASSIGNED, f"12.34.{x:02}"
+            )
+            self.grade(review, "[10,2]")
+
+    def export(self, params=None) -> str:
+        response = self.get("super", self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_access(self) -> None:
+        response = self.get("student", self.url)
+        self.assertEqual("errors/403.html", response.template_name[0])
+
+    def test_csv(self) -> None:
+        rows = list(DictReader(StringIO(self.export())))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["id"], str(self.review.id))
+        self.assertEqual(rows[0]["student_username"], "student")
+        self.assertEqual(rows[0]["reviewer_username"], "reviewer")
+        self.assertEqual(rows[0]["score_total"], "12.0")
+        self.assertEqual(rows[0]["scores"], "row 1: 10.0/10.0; row 2: 2.0/2.0")
+
+    def test_jsonl(self) -> None:
+        records = [
+            loads(line) for line in self.export({"format": "jsonl"}).splitlines()
+        ]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["score_max"], 12)
+        self.assertEqual(
+            records[0]["scores"],
+            [
+                {"row": "row 1", "score": 10, "max_score": 10},
+                {"row": "row 2", "score": 2, "max_score": 2},
+            ],
+        )
+
+    def test_filters(self) -> None:
+        self.assertEqual(self.export({"session": "PM"}).count("\n"), 1)
+        self.assertEqual(self.export({"session": "AM"}).count("\n"), 2)
+        self.assertEqual(self.export({"rubric": self.rubric.id}).count("\n"), 2)
+        today = timezone.now().date()
+        self.assertEqual(self.export({"start": today, "end": today}).count("\n"), 2)
+        self.assertEqual(
+            self.export({"start": today + timedelta(days=1)}).count("\n"), 1
+        )
+
+    def test_bad_filters(self) -> None:
+        for params in (
+            {"format": "xml"},
+            {"session": "XX"},
+            {"rubric": "bad-uuid"},
+            {"start": "2024-02-01", "end": "2024-01-01"},
+        ):
+            response = self.get("super", self.url, params)
+            self.assertEqual(response.status_code, 400)
+
+    def test_constant_queries(self) -> None:
+        with CaptureQueriesContext(connection) as small:
+            self.export()
+        self.add_reviews(10)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.export().count("\n"), 12)
+        self.assertEqual(len(small), len(large))
+
+    def test_chunks(self) -> None:
+        self.add_reviews(4)
+        with patch.object(ReviewExportView, "chunk_size", 2):
+            with CaptureQueriesContext(connection) as queries:
+                records = self.export({"format": "jsonl"}).splitlines()
+        self.assertEqual(len(records), 5)
+        scored_row_queries = [
+            query
+            for query in queries.captured_queries
+            if query["sql"].startswith('SELECT "Instructor_scoredrow"')
+        ]
+        self.assertEqual(len(scored_row_queries), 3)
+        review_queries = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith('SELECT "Main_review"')
+        ]
+        self.assertEqual(len(review_queries), 3)
+        for sql in review_queries:
+            self.assertIn("LIMIT 2", sql)
+            self.assertNotIn("OFFSET", sql)
+        dates = [loads(record)["date_completed"] for record in records]
+        self.assertEqual(dates, sorted(dates))
+
+    def test_command(self) -> None:
+        out = StringIO()
+        call_command("export_grades", "--format=jsonl", "--session=AM", stdout=out)
+        self.assertEqual(loads(out.getvalue())["id"], str(self.review.id))
@@ -1,6 +1,17 @@
-from django.test import TestCase, RequestFactory
+from io import StringIO
+from json import dumps, loads
+from os import remove
+from tempfile import NamedTemporaryFile
+
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
 
+from Main.middleware import RequestMetricsMiddleware
 from Main.views import error_500_handler
 from Users.models import User
 from tests.testing_base import BaseCase
@@ -61,3 +72,104 @@ class TestErrors(TestCase):
     def test_invalid_type(self):
         response = self.client.get(reverse("error", kwargs={"type": 111}))
         self.assertIn("errors/404.html", response.template_name)
+
+
+class RequestMetricsTest(BaseCase):
+    test_users = BaseCase.USER_SINGLE_STUDENT
+    test_review = False
+
+    def get_home(self):
+        return self.get("test-user", reverse("home"))
+
+    @override_settings(REQUEST_METRICS_SERVER_TIMING=True)
+    def test_server_timing(self):
+        response = self.get_home()
+        timings = [
+            timing.split(";")[0] for timing in response["Server-Timing"].split(", ")
+        ]
+        self.assertEqual(timings, ["db", "template", "total"])
+
+    @override_settings(REQUEST_METRICS_SERVER_TIMING=False)
+    def test_no_server_timing(self):
+        self.assertNotIn("Server-Timing", self.get_home())
+        self.assertNotIn("Server-Timing", self.client.get(reverse("login")))
+
+    @override_settings(REQUEST_METRICS_SERVER_TIMING=False)
+    def test_staff_server_timing(self):
+        self.assertIn("Server-Timing", self.get("super", reverse("instructor-home")))
+
+    @override_settings(REQUEST_METRICS_SERVER_TIMING=False)
+    def test_user_not_loaded(self):
+        staff = self.users["super"]
+        for touch_user in (False, True):
+            request = RequestFactory().get("/")
+            request.user = SimpleLazyObject(lambda: User.objects.get(id=staff.id))
+
+            def view(request):
+                if touch_user:
+                    request.user.is_authenticated
+                return HttpResponse()
+
+            with self.assertNumQueries(1 if touch_user else 0):
+                response = RequestMetricsMiddleware(view)(request)
+            self.assertEqual("Server-Timing" in response, touch_user)
+
+    @override_settings(REQUEST_METRICS_SERVER_TIMING=True)
+    def test_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_home()
+        self.assertIn(f'desc="{len(queries)} queries"', response["Server-Timing"])
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=1)
+    def test_log(self):
+        with self.assertLogs("Main.metrics", "INFO") as logs:
+            self.get_home()
+        record = loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "home")
+        self.assertEqual(record["status"], 200)
+        self.assertGreater(record["queries"], 0)
+        self.assertGreater(record["template_ms"], 0)
+        self.assertGreaterEqual(record["total_ms"], record["template_ms"])
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        with self.assertNoLogs("Main.metrics", "INFO"):
+            self.get_home()
+
+
+class RequestMetricsReportTest(TestCase):
+    def setUp(self) -> None:
+        with NamedTemporaryFile("w", suffix=".log", delete=False) as file:
+            for x in range(1, 101):
+                file.write(dumps({"view": "home", "total_ms": x, "queries": 3}) + "\n")
+            file.write(
+                dumps({"view": "leaderboard", "total_ms": 5, "queries": 1}) + "\n"
+            )
+            file.write(
+                dumps({"view": "admin:index", "total_ms": 9, "queries": 2}) + "\n"
+            )
+            file.write("not a record\n")
+            self.log_file = file.name
+
+    def tearDown(self) -> None:
+        remove(self.log_file)
+
+    def report(self, *args) -> list[list[str]]:
+        out = StringIO()
+        call_command("request_metrics_report", self.log_file, *args, stdout=out)
+        return [line.split() for line in out.getvalue().splitlines()[1:]]
+
+    def test_percentiles(self):
+        self.assertEqual(
+            self.report(),
+            [
+                ["home", "100", "50.0", "95.0", "99.0"],
+                ["leaderboard", "1", "5.0", "5.0", "5.0"],
+            ],
+        )
+
+    def test_metric(self):
+        self.assertEqual(self.report("--metric=queries")[0][2:], ["3.0", "3.0", "3.0"])
+
+    def test_all(self):
+        self.assertIn("admin:index", [row[0] for row in self.report("--all")])
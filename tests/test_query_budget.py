@@ -0,0 +1,183 @@
+from django.urls import reverse
+from django.utils import timezone
+
+from Instructor.models import Rubric, RubricCell, RubricRow, ScoredRow
+from Main.leaderboard import clear_leaderboard
+from Main.models import Review
+from Users.models import User
+from tests.testing_base import BaseCase, SimpleBaseCase, query_budget
+
+
+class QueryBudgetTest(SimpleBaseCase):
+    test_users = BaseCase.USER_SINGLE_STUDENT
+
+    def run_queries(self, amount):
+        for _ in range(amount):
+            User.objects.exists()
+
+    def test_under_budget(self):
+        with self.assertMaxQueries(2) as queries:
+            self.run_queries(2)
+        self.assertEqual(len(queries), 2)
+
+    def test_over_budget(self):
+        with self.assertRaisesMessage(AssertionError, "over the budget of 2"):
+            with self.assertMaxQueries(2):
+                self.run_queries(3)
+
+    def test_decorator(self):
+        @query_budget(2)
+        def under():
+            self.run_queries(2)
+
+        @query_budget(2)
+        def over():
+            self.run_queries(3)
+
+        under()
+        with self.assertRaises(AssertionError):
+            over()
+
+    def test_growth(self):
+        def render():
+            for user in User.objects.all():
+                user.student.exists()
+
+        def grow():
+            User.objects.create_user("extra-user")
+
+        with self.assertRaisesMessage(AssertionError, "when the fixtures grew"):
+            self.assertQueriesDontGrow(render, grow)
+
+
+class ViewQueryBudgetTest(BaseCase):
+    test_users = {
+        "reviewer": (True, False),
+        "student": (False, False),
+        "reviewer-pm": (True, True),
+        "student-pm": (False, True),
+    }
+
+    test_review_student = "student"
+    test_review_reviewer = "reviewer"
+
+    # The most queries each page may use, these include the queries for the session and user
+    budgets = {
+        "home-student": 5,
+        "home-reviewer": 5,
+        "review-view": 7,
+        "review-complete": 3,
+        "leaderboard": 3,
+        "instructor-home": 5,
+        "instructor-review-complete": 3,
+        "user-list": 4,
+        "rubric-list": 3,
+    }
+
+    def setUp(self) -> None:
+        super(ViewQueryBudgetTest, self).setUp()
+        clear_leaderboard()
+        self.set_test_review_status(Review.Status.CLOSED)
+        self.score_review(self.review)
+
+    def score_review(self, review):
+        ScoredRow.objects.bulk_create(
+            ScoredRow(parent_review=review, source_row=row, score=row.max_score)
+            for row in review.rubric.rubricrow_set.all()
+        )
+
+    def add_reviews(self, amount=5):
+        now = timezone.now()
+        for x in range(amount):
+            for student, reviewer in (
+                ("student", "reviewer"),
+                ("student-pm", "reviewer-pm"),
+            ):
+                for status in Review.Status.values:
+                    review = self.make_arb_review(
+                        student, reviewer, status, f"12.34.{x:02}"
+                    )
+                    if status == Review.Status.CLOSED:
+                        review.date_completed = now
+                        review.save()
+                        self.score_review(review)
+
+    def add_users(self, amount=5):
+        for x in range(amount):
+            self.make_arb_user(f"extra-{x}", "test-password", make_client=False)
+
+    def add_rubric_rows(self, amount=5):
+        rubric = self.review.rubric
+        for x in range(amount):
+            row = RubricRow.objects.create(
+                name=f"extra {x}",
+                description="extra row",
+                max_score=1,
+                parent_rubric=rubric,
+                index=rubric.rubricrow_set.count(),
+            )
+            RubricCell.objects.bulk_create(
+                RubricCell(score=score, description="cell", parent_row=row, index=score)
+                for score in range(2)
+            )
+            ScoredRow.objects.create(parent_review=self.review, source_row=row, score=1)
+        rubric.bump_version()
+
+    def add_rubrics(self, amount=5):
+        for x in range(amount):
+            Rubric.objects.create(name=f"Extra Rubric {x}", max_score=0)
+
+    def add_everything(self):
+        self.add_reviews()
+        self.add_users()
+        self.add_rubrics()
+
+    def assertPageQueriesDontGrow(self, name, user, url, grow=None, data=None):
+        def render():
+            response = self.get(user, url, data)
+            self.assertEqual(response.status_code, 200)
+
+        self.assertQueriesDontGrow(
+            render, grow or self.add_everything, self.budgets[name]
+        )
+
+    def test_home_student(self):
+        self.assertPageQueriesDontGrow("home-student", "student", reverse("home"))
+
+    def test_home_reviewer(self):
+        self.assertPageQueriesDontGrow("home-reviewer", "reviewer", reverse("home"))
+
+    def test_review_view(self):
+        self.assertPageQueriesDontGrow(
+            "review-view",
+            "student",
+            reverse("review-view", kwargs={"pk": self.review.id}),
+            self.add_rubric_rows,
+        )
+
+    def test_review_complete(self):
+        self.assertPageQueriesDontGrow(
+            "review-complete", "student", reverse("review-complete")
+        )
+
+    def test_leaderboard(self):
+        self.assertPageQueriesDontGrow("leaderboard", "student", reverse("leaderboard"))
+
+    def test_instructor_home(self):
+        self.assertPageQueriesDontGrow(
+            "instructor-home", "super", reverse("instructor-home")
+        )
+
+    def test_instructor_review_complete(self):
+        self.assertPageQueriesDontGrow(
+            "instructor-review-complete",
+            "super",
+            reverse("review-complete"),
+            data={"session": "PM"},
+        )
+
+    def test_user_list(self):
+        self.assertPageQueriesDontGrow("user-list", "super", reverse("user-list"))
+
+    def test_rubric_list(self):
+        self.assertPageQueriesDontGrow("rubric-list", "super", reverse("rubric-list"))
@@ -1,11 +1,24 @@
+from datetime import timedelta
+from io import StringIO
 from json import JSONDecoder, JSONEncoder
+from threading import Barrier, Thread
+from unittest.mock import patch
 
 from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 from Instructor.models import ScoredRow, Rubric
 from Main.forms import GradeReviewForm, ReviewForm
-from Main.models import Review
+from Main.leaderboard import CACHE_KEY, clear_leaderboard, refresh_leaderboard
+from Main.models import LeaderboardVersion, Review
+from Main.pagination import KeysetPaginator
+from Main.views import LeaderboardView
 from Users.models import User
 from tests.testing_base import BaseCase as OldBaseCase, SimpleBaseCase
 
@@ -138,6 +151,44 @@ class HomeListTest(BaseCase):
     def test_closed(self) -> None:
         self.assertStatus("C")
 
+    def count_queries(self, user) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            self.get(user, self.url)
+        return len(queries)
+
+    def test_constant_queries(self) -> None:
+        users = ["student-affiliated", "reviewer-affiliated", "reviewer-not"]
+        small = [self.count_queries(user) for user in users]
+        for x in range(10):
+            for status in Review.Status.values:
+                self.make_arb_review(
+                    "student-affiliated", "reviewer-affiliated", status, f"12.34.{x:02}"
+                )
+        self.assertEqual([self.count_queries(user) for user in users], small)
+
+    def test_completed_limited(self) -> None:
+        self.set_test_review_status(Review.Status.CLOSED)
+        for x in range(6):
+            review = self.make_arb_review(
+                "student-affiliated",
+                "reviewer-affiliated",
+                Review.Status.CLOSED,
+                f"12.34.{x:02}",
+            )
+            review.date_completed = timezone.now() + timedelta(days=x + 1)
+            review.save()
+        with CaptureQueriesContext(connection) as queries:
+            context = self.get("student-affiliated", self.url).context
+        self.assertEqual(
+            [review.schoology_id for review in context["completed"]],
+            ["12.34.05", "12.34.04", "12.34.03", "12.34.02"],
+        )
+        self.assertEqual(context["completed_count"], 7)
+        self.assertNotIn("counts", context)
+        sql = [query["sql"] for query in queries.captured_queries]
+        self.assertFalse(any("ROW_NUMBER" in query for query in sql))
+        self.assertTrue(any(query.endswith("LIMIT 4") for query in sql))
+
 
 class CompleteListTest(BaseCase):
     def setUp(self) -> None:
@@ -195,6 +246,104 @@ class CompleteListTest(BaseCase):
         self.assertIn("errors/404.html", response.template_name)
 
 
+class CompleteListPaginationTest(BaseCase):
+    url = reverse("review-complete")
+
+    def setUp(self) -> None:
+        super(CompleteListPaginationTest, self).setUp()
+        now = timezone.now()
+        # The test review is closed without a completion date, to check NULLs are paged properly
+        self.set_test_review_status(Review.Status.CLOSED)
+        for x in range(24):
+            review = self.make_arb_review(
+                "student-affiliated",
+                "reviewer-affiliated",
+                Review.Status.CLOSED,
+                f"12.34.{x:02}",
+            )
+            # Every third review is tied with the one before it, so the other keys decide the order
+            Review.objects.filter(id=review.id).update(
+                date_completed=now - timedelta(minutes=x - x % 3)
+            )
+        self.expected = list(
+            Review.objects.filter(status=Review.Status.CLOSED)
+            .order_by("-date_completed", "-date_created", "-id")
+            .values_list("id", flat=True)
+        )
+
+    def get_page(self, params=None):
+        response = self.get("student-affiliated", self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.context["page_obj"]
+
+    def test_forwards(self):
+        page = self.get_page()
+        self.assertFalse(page.has_previous())
+        ids = [review.id for review in page]
+        while page.has_next():
+            page = self.get_page({"cursor": page.next_cursor})
+            self.assertTrue(page.has_previous())
+            ids += [review.id for review in page]
+        self.assertEqual(ids, self.expected)
+
+    def test_backwards(self):
+        page = self.get_page()
+        while page.has_next():
+            page = self.get_page({"cursor": page.next_cursor})
+        ids = [review.id for review in page]
+        while page.has_previous():
+            page = self.get_page({"cursor": page.previous_cursor})
+            ids = [review.id for review in page] + ids
+        self.assertEqual(ids, self.expected)
+
+    def test_count(self):
+        self.assertIsNone(self.get_page().count)
+        self.assertEqual(self.get_page({"count": ""}).count, len(self.expected))
+
+    def test_constant_queries(self):
+        with CaptureQueriesContext(connection) as first:
+            page = self.get_page()
+        page = self.get_page({"cursor": page.next_cursor})
+        with CaptureQueriesContext(connection) as last:
+            self.get_page({"cursor": page.next_cursor})
+        self.assertEqual(len(first), len(last))
+        for query in first.captured_queries + last.captured_queries:
+            self.assertNotIn("COUNT(", query["sql"].upper())
+            self.assertNotIn("OFFSET", query["sql"].upper())
+
+    def test_iter_pages(self):
+        paginator = KeysetPaginator(
+            Review.objects.filter(status=Review.Status.CLOSED), 4
+        )
+        pages = list(paginator.iter_pages())
+        self.assertEqual([len(page) for page in pages], [4] * 6 + [1])
+        self.assertEqual(
+            [review.id for page in pages for review in page], self.expected
+        )
+        self.assertEqual(
+            [review.id for page in paginator.iter_pages(True) for review in page],
+            self.expected[::-1],
+        )
+
+    def test_bad_cursor(self):
+        response = self.get("student-affiliated", self.url, {"cursor": "bad-cursor"})
+        self.assertIn("errors/404.html", response.template_name)
+
+    def test_fragment(self):
+        page = self.get_page()
+        response = self.get(
+            "student-affiliated",
+            reverse("review-complete-fragment"),
+            {"cursor": page.next_cursor, "count": ""},
+        )
+        data = response.json()
+        self.assertEqual(data["count"], len(self.expected))
+        self.assertIsNotNone(data["next"])
+        self.assertIsNotNone(data["previous"])
+        self.assertEqual(data["html"].count("<tr>"), 10)
+        self.assertIn(str(self.expected[10]), data["html"])
+
+
 class BaseReviewAction(OldBaseCase):
     test_users = OldBaseCase.USER_STUDENT_REVIEWER
     start_status = Review.Status.OPEN
@@ -318,6 +467,16 @@ class ReviewClaimTest(BaseReviewAction):
         response = self.post_test_review("reviewer", "review-claim")
         self.assertEqual(response.templates[0].name, "errors/404.html")
 
+    def test_already_claimed(self) -> None:
+        self.make_arb_user("reviewer-2", "test-password")
+        self.users["reviewer-2"].is_reviewer = True
+        self.users["reviewer-2"].save()
+        self.post_test_review("reviewer", "review-claim")
+        response = self.post_test_review("reviewer-2", "review-claim")
+        self.assertEqual(response.templates[0].name, "errors/404.html")
+        self.refresh_test_review()
+        self.assertEqual(self.users["reviewer"], self.review.reviewer)
+
     def test_limit(self) -> None:
         self.make_arb_user("student-2", "test-password")
         for x in range(3):
@@ -559,6 +718,100 @@ class UpdateReviewScoreOnRubricEditTest(BaseCase):
             ScoredRow.objects.filter(parent_review__id=self.review.id).count(), 1
         )
 
+    def test_delete_row_totals(self):
+        new_obj: list = JSONDecoder().decode(self.get_test_rubric_json())
+        new_obj.pop(1)
+        self.clients["super"].post(
+            reverse("rubric-edit", kwargs={"pk": self.rubric.id}),
+            {"name": "Edited Rubric", "rubric": JSONEncoder().encode(new_obj)},
+        )
+        self.refresh_test_review()
+        self.assertEqual(self.review.score_fraction(), "10.0/10.0")
+
+
+class RubricReconcileTest(BaseCase):
+    test_users = BaseCase.USER_STUDENT_REVIEWER
+
+    test_review_student = "student"
+    test_review_reviewer = "reviewer"
+
+    def setUp(self) -> None:
+        super(RubricReconcileTest, self).setUp()
+        self.set_test_review_status(Review.Status.ASSIGNED)
+        self.post_test_review(
+            "reviewer", "review-grade", {"scores": "[10,2]", "is_draft": "false"}
+        )
+
+    def add_graded_reviews(self, count):
+        for i in range(count):
+            review = self.make_arb_review(
+                "student", "reviewer", Review.Status.CLOSED, f"{i}.{i}.{i}"
+            )
+            ScoredRow.objects.create(
+                parent_review=review,
+                source_row=self.rubric.rubricrow_set.get(index=0),
+                score=1,
+            )
+
+    def edit_rubric(self):
+        new_obj = JSONDecoder().decode(self.get_test_rubric_json())
+        new_obj[0]["name"] = "Edited Row"
+        self.post(
+            "super",
+            reverse("rubric-edit", kwargs={"pk": self.rubric.id}),
+            {"name": "Edited Rubric", "rubric": JSONEncoder().encode(new_obj)},
+        )
+
+    def count_reconcile_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.rubric.reconcile_scores()
+        return len(queries.captured_queries)
+
+    def test_constant_queries(self):
+        self.add_graded_reviews(1)
+        small = self.count_reconcile_queries()
+        self.add_graded_reviews(10)
+        self.assertEqual(small, self.count_reconcile_queries())
+
+    def test_missing_rows(self):
+        self.add_graded_reviews(3)
+        self.rubric.reconcile_scores(batch_size=2)
+        for review in Review.objects.exclude(id=self.review.id):
+            self.assertEqual(review.scoredrow_set.count(), 2)
+            self.assertEqual(review.scoredrow_set.get(source_row__index=1).score, -1)
+
+    @override_settings(RUBRIC_RECONCILE_INLINE_LIMIT=0)
+    def test_deferred(self):
+        self.add_graded_reviews(1)
+        self.edit_rubric()
+        self.assertTrue(Rubric.objects.get(id=self.rubric.id).scores_pending)
+        self.assertEqual(
+            ScoredRow.objects.filter(parent_review__schoology_id="0.0.0").count(), 1
+        )
+        out = StringIO()
+        call_command("reconcile_rubric_scores", stdout=out)
+        self.assertIn("2/2 reviews updated", out.getvalue())
+        self.assertFalse(Rubric.objects.get(id=self.rubric.id).scores_pending)
+        self.assertEqual(
+            ScoredRow.objects.filter(parent_review__schoology_id="0.0.0").count(), 2
+        )
+
+
+    @override_settings(RUBRIC_RECONCILE_INLINE_LIMIT=0)
+    def test_edited_during_reconcile(self):
+        self.add_graded_reviews(1)
+        self.edit_rubric()
+
+        def edit_again(done, total):
+            # Another instructor edits the rubric while the scores are being updated
+            Rubric.objects.get(id=self.rubric.id).bump_version()
+
+        rubric = Rubric.objects.get(id=self.rubric.id)
+        rubric.reconcile_scores(progress=edit_again)
+        self.assertTrue(rubric.scores_pending)
+        self.assertTrue(Rubric.objects.get(id=self.rubric.id).scores_pending)
+        Rubric.objects.get(id=self.rubric.id).reconcile_scores()
+        self.assertFalse(Rubric.objects.get(id=self.rubric.id).scores_pending)
 
 class LeaderBoardTest(BaseCase):
     test_users = BaseCase.USER_STUDENT_REVIEWER
@@ -582,3 +835,400 @@ class LeaderBoardTest(BaseCase):
         self.assertEqual(len(ctx["reviewees_dataset"]), 2)
         self.assertEqual(ctx["reviewees_dataset"][0].id, self.users["student"].id)
         self.assertEqual(ctx["reviewers_dataset"][0].id, self.users["reviewer"].id)
+
+    def test_counters(self) -> None:
+        self.assertEqual(
+            User.objects.get(id=self.users["reviewer"].id).reviews_done_as_reviewer, 1
+        )
+        self.assertEqual(
+            User.objects.get(id=self.users["student"].id).reviews_done_as_reviewee, 1
+        )
+
+    def test_counters_not_full_save(self) -> None:
+        review = self.make_arb_review(
+            "student", "reviewer", Review.Status.ASSIGNED, "65.43.21"
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.post_review(
+                "reviewer",
+                "review-grade",
+                review.id,
+                {"scores": "[10, 2]", "is_draft": "false"},
+            )
+        user_updates = [
+            q["sql"]
+            for q in queries.captured_queries
+            if q["sql"].startswith('UPDATE "Users_user"')
+        ]
+        self.assertEqual(len(user_updates), 2)
+        for sql in user_updates:
+            self.assertNotIn('"password"', sql)
+        self.assertEqual(
+            User.objects.get(id=self.users["reviewer"].id).reviews_done_as_reviewer, 2
+        )
+
+    def test_recompute(self) -> None:
+        User.objects.update(reviews_done_as_reviewer=7, reviews_done_as_reviewee=7)
+        out = StringIO()
+        with self.assertNumQueries(4):
+            call_command("recompute_leaderboard", stdout=out)
+        self.assertEqual(
+            User.objects.get(id=self.users["reviewer"].id).reviews_done_as_reviewer, 1
+        )
+        self.assertEqual(
+            User.objects.get(id=self.users["reviewer"].id).reviews_done_as_reviewee, 0
+        )
+        self.assertEqual(
+            User.objects.get(id=self.users["student"].id).reviews_done_as_reviewee, 1
+        )
+
+
+class LeaderBoardSnapshotTest(BaseCase):
+    test_users = BaseCase.USER_AM_PM
+    test_review = False
+
+    def setUp(self) -> None:
+        super(LeaderBoardSnapshotTest, self).setUp()
+        User.objects.filter(username="student-pm").update(reviews_done_as_reviewee=3)
+        User.objects.filter(username="reviewer-am").update(reviews_done_as_reviewer=2)
+        clear_leaderboard()
+
+    def test_session_filter(self) -> None:
+        ctx = self.get("student-am", reverse("leaderboard"), {"session": "AM"}).context
+        self.assertCountEqual(
+            [entry.name for entry in ctx["reviewees_dataset"]],
+            ["reviewer-am", "student-am"],
+        )
+        self.assertEqual(len(ctx["reviewers_dataset"]), 1)
+
+    def test_top(self) -> None:
+        ctx = self.get("student-am", reverse("leaderboard"), {"top": "1"}).context
+        self.assertEqual(len(ctx["reviewees_dataset"]), 1)
+        self.assertEqual(ctx["reviewees_dataset"][0].name, "student-pm")
+        self.assertEqual(ctx["reviewees_dataset"][0].count, 3)
+        self.assertEqual(ctx["reviewers_dataset"][0].name, "reviewer-am")
+
+    def test_pagination(self) -> None:
+        with patch.object(LeaderboardView, "paginate_by", 3):
+            ctx = self.get("student-am", reverse("leaderboard"), {"page": 2}).context
+        self.assertEqual(len(ctx["reviewees_dataset"]), 1)
+        self.assertEqual(ctx["page_obj"].number, 2)
+
+    def test_pagination_different_lengths(self) -> None:
+        with patch.object(LeaderboardView, "paginate_by", 1):
+            ctx = self.get("student-am", reverse("leaderboard"), {"page": 2}).context
+            self.assertEqual(ctx["reviewers_dataset"][0].name, "reviewer-pm")
+            ctx = self.get("student-am", reverse("leaderboard"), {"page": 3}).context
+            self.assertEqual(len(ctx["reviewees_dataset"]), 1)
+            self.assertEqual(len(ctx["reviewers_dataset"]), 0)
+            self.assertEqual(ctx["reviewers_page"].number, 3)
+            self.assertTrue(ctx["page_obj"].has_next())
+            ctx = self.get("student-am", reverse("leaderboard"), {"page": 9}).context
+            self.assertEqual(ctx["page_obj"].number, 4)
+            self.assertFalse(ctx["page_obj"].has_next())
+
+    def test_cached(self) -> None:
+        self.get("student-am", reverse("leaderboard"))
+        User.objects.filter(username="student-am").update(reviews_done_as_reviewee=9)
+        ctx = self.get("student-am", reverse("leaderboard")).context
+        self.assertEqual(ctx["reviewees_dataset"][0].name, "student-pm")
+
+    def test_not_modified(self) -> None:
+        response = self.get("student-am", reverse("leaderboard"))
+        etag = response.headers["ETag"]
+        self.assertIn("Last-Modified", response.headers)
+        response = self.clients["student-am"].get(
+            reverse("leaderboard"), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+        refresh_leaderboard()
+        response = self.clients["student-am"].get(
+            reverse("leaderboard"), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_worker_refreshed(self) -> None:
+        self.get("student-am", reverse("leaderboard"))
+        User.objects.filter(username="student-am").update(reviews_done_as_reviewee=9)
+        # Another worker with its own cache bumps the version, this worker still has the old snapshot cached
+        LeaderboardVersion.bump()
+        ctx = self.get("student-am", reverse("leaderboard")).context
+        self.assertEqual(ctx["reviewees_dataset"][0].name, "student-am")
+
+    def test_same_headers_every_worker(self) -> None:
+        first = self.get("student-am", reverse("leaderboard"))
+        # Another worker starts with an empty cache
+        cache.delete(CACHE_KEY)
+        second = self.get("student-am", reverse("leaderboard"))
+        self.assertEqual(first.headers["ETag"], second.headers["ETag"])
+        self.assertEqual(
+            first.headers["Last-Modified"], second.headers["Last-Modified"]
+        )
+
+    def test_not_modified_other_user(self) -> None:
+        etag = self.get("student-am", reverse("leaderboard")).headers["ETag"]
+        response = self.clients["student-pm"].get(
+            reverse("leaderboard"), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Welcome, student-pm")
+
+
+class GradeValidationCacheTest(BaseReviewAction):
+    test_review = True
+    test_review_student = "student"
+    test_review_reviewer = "reviewer"
+    start_status = Review.Status.ASSIGNED
+
+    def make_form(self, scores):
+        return GradeReviewForm(
+            {"scores": scores, "additional_comments": "", "is_draft": "false"},
+            instance=self.review,
+        )
+
+    def test_score_matrix(self):
+        self.assertEqual(self.rubric.score_matrix(), [{5, 10}, {1, 2}])
+
+    def test_no_queries(self):
+        self.make_form("[5,2]").is_valid()
+        with self.assertNumQueries(0):
+            form = self.make_form("[10,1]")
+            self.assertTrue(form.is_valid())
+        with self.assertNumQueries(0):
+            self.assertFalse(self.make_form("[4,1]").is_valid())
+
+    def test_rubric_edit(self):
+        self.assertTrue(self.make_form("[5,2]").is_valid())
+        new_obj = JSONDecoder().decode(self.get_test_rubric_json())
+        new_obj[0]["cells"][0]["score"] = 4
+        self.post(
+            "super",
+            reverse("rubric-edit", kwargs={"pk": self.rubric.id}),
+            {"name": "Test Rubric", "rubric": JSONEncoder().encode(new_obj)},
+        )
+        self.refresh_test_review()
+        self.assertFalse(self.make_form("[5,2]").is_valid())
+        self.assertTrue(self.make_form("[4,2]").is_valid())
+
+
+class GradeSaveQueriesTest(BaseReviewAction):
+    test_review = True
+    test_review_student = "student"
+    test_review_reviewer = "reviewer"
+    start_status = Review.Status.ASSIGNED
+
+    def use_rubric(self, rows):
+        rubric_json = [
+            {
+                "name": f"row {row}",
+                "description": f"row desc {row}",
+                "cells": [{"score": 1, "description": "cell"}],
+            }
+            for row in range(rows)
+        ]
+        self.post(
+            "super",
+            reverse("rubric-create"),
+            {"name": f"Rubric {rows}", "rubric": JSONEncoder().encode(rubric_json)},
+        )
+        self.review.rubric = Rubric.objects.get(name=f"Rubric {rows}")
+        self.review.save()
+
+    def save_scores(self, scores, is_draft="true"):
+        form = GradeReviewForm(
+            {"scores": scores, "additional_comments": "", "is_draft": is_draft},
+            instance=Review.objects.with_rubric().get(id=self.review.id),
+        )
+        self.assertTrue(form.is_valid())
+        with CaptureQueriesContext(connection) as queries:
+            form.save()
+        return queries.captured_queries
+
+    def count_save_queries(self, rows):
+        self.use_rubric(rows)
+        return len(self.save_scores(JSONEncoder().encode([1] + [-1] * (rows - 1))))
+
+    def test_constant_queries(self):
+        self.assertEqual(self.count_save_queries(2), self.count_save_queries(10))
+
+    def test_update(self):
+        self.save_scores("[5,-1]")
+        self.save_scores("[5,2]", is_draft="false")
+        self.refresh_test_review()
+        self.assertEqual(self.review.scoredrow_set.count(), 2)
+        self.assertEqual(self.review.scoredrow_set.get(source_row__index=1).score, 2)
+        self.assertEqual(self.review.status, Review.Status.CLOSED)
+
+    def test_unchanged(self):
+        self.save_scores("[5,-1]")
+        queries = self.save_scores("[5,-1]")
+        for query in queries:
+            self.assertNotIn("Instructor_scoredrow", query["sql"])
+
+
+class ReviewScoreTotalsTest(BaseReviewAction):
+    test_review = True
+    test_review_student = "student"
+    test_review_reviewer = "reviewer"
+    start_status = Review.Status.ASSIGNED
+
+    def grade(self, scores, is_draft="false"):
+        self.post_test_review(
+            "reviewer",
+            "review-grade",
+            {"scores": scores, "additional_comments": "", "is_draft": is_draft},
+        )
+        self.refresh_test_review()
+
+    def test_saved_on_complete(self):
+        self.grade("[5,2]")
+        self.assertEqual(self.review.score_total, 7)
+        self.assertEqual(self.review.score_max, 12)
+
+    def test_not_saved_on_draft(self):
+        self.grade("[5,2]", is_draft="true")
+        self.assertIsNone(self.review.score_total)
+        self.assertIsNone(self.review.score_max)
+
+    def test_no_queries(self):
+        self.grade("[5,2]")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.review.score_fraction(), "7.0/12.0")
+
+    def test_backfill(self):
+        self.grade("[5,2]")
+        Review.objects.filter(id=self.review.id).update(
+            score_total=None, score_max=None
+        )
+        call_command("backfill_review_scores", stdout=StringIO())
+        self.refresh_test_review()
+        self.assertEqual(self.review.score_total, 7)
+        self.assertEqual(self.review.score_max, 12)
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class ReviewClaimConcurrencyTest(TransactionTestCase):
+    thread_count = 8
+
+    def setUp(self) -> None:
+        self.student = User.objects.create_user("student", password="test-password")
+        self.reviewers = [
+            User.objects.create_user(
+                f"reviewer-{i}", password="test-password", is_reviewer=True
+            )
+            for i in range(self.thread_count)
+        ]
+        self.rubric = Rubric.objects.create(name="Test Rubric", max_score=0)
+
+    def make_review(self, schoology_id):
+        return Review.objects.create(
+            student=self.student, schoology_id=schoology_id, rubric=self.rubric
+        )
+
+    def run_threads(self, target):
+        barrier = Barrier(self.thread_count)
+        results = []
+
+        def run(index):
+            barrier.wait()
+            try:
+                results.append(target(index))
+            except Review.DoesNotExist:
+                results.append(None)
+            finally:
+                connection.close()
+
+        threads = [Thread(target=run, args=(i,)) for i in range(self.thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_same_review(self) -> None:
+        review = self.make_review("12.34.56")
+        results = self.run_threads(
+            lambda i: Review.objects.claim(review.id, self.reviewers[i])
+        )
+        self.assertEqual(len([r for r in results if r is not None]), 1)
+        review.refresh_from_db()
+        self.assertEqual(review.status, Review.Status.ASSIGNED)
+        self.assertIn(review.reviewer, self.reviewers)
+
+    def test_limit(self) -> None:
+        reviews = [self.make_review(f"12.34.{i}") for i in range(self.thread_count)]
+        self.run_threads(
+            lambda i: Review.objects.claim(reviews[i].id, self.reviewers[0])
+        )
+        self.assertEqual(
+            Review.objects.filter(
+                reviewer=self.reviewers[0], status=Review.Status.ASSIGNED
+            ).count(),
+            2,
+        )
+
+
+class ReviewIndexBenchmarkTest(OldBaseCase):
+    test_rubric = False
+    test_review = False
+
+    def run_benchmark(self, *args) -> str:
+        out = StringIO()
+        call_command(
+            "benchmark_review_queries",
+            "--reviews=200",
+            "--users=8",
+            "--repeat=1",
+            *args,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def get_index_names(self) -> set:
+        with connection.cursor() as cursor:
+            return set(
+                connection.introspection.get_constraints(
+                    cursor, Review._meta.db_table
+                ).keys()
+            )
+
+    def test_benchmark(self):
+        output = self.run_benchmark()
+        self.assertIn("Created 200 reviews", output)
+        for name in (
+            "home: reviewer ongoing",
+            "home: completed preview",
+            "home: reviewer completed count",
+            "admin home: counts",
+            "admin home: completed preview",
+            "completed list: instructor, next page",
+            "completed list: user",
+        ):
+            self.assertIn(name, output)
+        self.assertFalse(Review.objects.exists())
+        self.assertFalse(
+            User.objects.filter(username__startswith="benchmark-").exists()
+        )
+
+    def test_benchmark_analyze(self):
+        with CaptureQueriesContext(connection) as queries:
+            output = self.run_benchmark("--no-explain")
+        self.assertIn("Refreshed the planner statistics", output)
+        sql = [query["sql"] for query in queries.captured_queries]
+        analyze = next(i for i, query in enumerate(sql) if query.startswith("ANALYZE"))
+        last_insert = max(
+            i for i, query in enumerate(sql) if query.startswith("INSERT")
+        )
+        self.assertLess(last_insert, analyze)
+        self.assertFalse(
+            any(query.startswith("SELECT") for query in sql[last_insert:analyze])
+        )
+        self.assertFalse(Review.objects.exists())
+
+    @skipUnlessDBFeature("can_rollback_ddl")
+    def test_benchmark_without_indexes(self):
+        output = self.run_benchmark("--without-indexes", "--no-explain")
+        self.assertIn("Dropped the indexes on Review", output)
+        self.assertLessEqual(
+            {index.name for index in Review._meta.indexes}, self.get_index_names()
+        )
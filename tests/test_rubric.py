@@ -1,11 +1,16 @@
+from io import StringIO
 from json import JSONDecoder, JSONEncoder
 from uuid import uuid4
 
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from Instructor.forms import RubricForm
-from Instructor.models import Rubric
+from Instructor.models import Rubric, RubricCell
 from tests.testing_base import SimpleBaseCase
 
 
@@ -220,3 +225,204 @@ class RubricDuplicateTest(SimpleBaseCase):
         self.rubric.save()
         self.post("super", reverse("rubric-duplicate", kwargs={"pk": self.rubric.id}))
         self.assertTrue(Rubric.objects.filter(name="New Rubric").exists())
+
+
+class RubricCacheTest(RubricActionTest):
+    url_name = "rubric-edit"
+
+    def edit_rubric(self, new_json, rubric=None):
+        rubric = self.rubric if rubric is None else rubric
+        self.post(
+            "super",
+            reverse("rubric-edit", kwargs={"pk": rubric.id}),
+            {"name": rubric.name, "rubric": JSONEncoder().encode(new_json)},
+        )
+        return Rubric.objects.get(id=rubric.id)
+
+    def test_cached(self):
+        self.rubric.to_json()
+        with self.assertNumQueries(0):
+            self.rubric.to_json()
+        self.assertIsNotNone(cache.get(self.rubric.cache_key("json")))
+
+    def test_edit(self):
+        old_json = self.rubric.to_json()
+        new_json = JSONDecoder().decode(old_json)
+        new_json[0]["cells"][0]["description"] = "Edited"
+        edited = self.edit_rubric(new_json)
+        self.assertGreater(edited.version, self.rubric.version)
+        self.assertListEqual(JSONDecoder().decode(edited.to_json()), new_json)
+        self.assertEqual(self.rubric.to_json(), old_json)
+
+    def test_row_deleted(self):
+        new_json = JSONDecoder().decode(self.rubric.to_json())
+        new_json.pop(1)
+        edited = self.edit_rubric(new_json)
+        self.assertEqual(len(JSONDecoder().decode(edited.to_json())), 1)
+
+    def test_cell_deleted(self):
+        new_json = JSONDecoder().decode(self.rubric.to_json())
+        new_json[0]["cells"].pop(1)
+        edited = self.edit_rubric(new_json)
+        self.assertEqual(len(JSONDecoder().decode(edited.to_json())[0]["cells"]), 1)
+
+    def test_duplicate(self):
+        source_json = self.rubric.to_json()
+        self.post("super", reverse("rubric-duplicate", kwargs={"pk": self.rubric.id}))
+        copy = Rubric.objects.get(name="Copy of Test Rubric")
+        self.assertEqual(copy.to_json(), source_json)
+        new_json = JSONDecoder().decode(source_json)
+        new_json[0]["name"] = "Copy Row"
+        copy = self.edit_rubric(new_json, rubric=copy)
+        self.assertListEqual(JSONDecoder().decode(copy.to_json()), new_json)
+        self.assertEqual(Rubric.objects.get(id=self.rubric.id).to_json(), source_json)
+
+    def test_delete(self):
+        self.rubric.to_json()
+        key = self.rubric.cache_key("json")
+        self.post("super", reverse("rubric-delete", kwargs={"pk": self.rubric.id}))
+        self.assertFalse(Rubric.objects.filter(id=self.rubric.id).exists())
+        self.assertIsNone(cache.get(key))
+
+
+class RubricSaveQueriesTest(RubricActionTest):
+    url_name = "rubric-edit"
+
+    @staticmethod
+    def make_json(rows, cells):
+        return [
+            {
+                "name": f"row {row}",
+                "description": f"row desc {row}",
+                "cells": [
+                    {"score": cell, "description": f"cell {cell} row {row}"}
+                    for cell in range(cells)
+                ],
+            }
+            for row in range(rows)
+        ]
+
+    def save_rubric(self, rubric_json, instance=None):
+        form = RubricForm(
+            {"name": "Saved Rubric", "rubric": JSONEncoder().encode(rubric_json)},
+            instance=instance,
+        )
+        self.assertTrue(form.is_valid())
+        with CaptureQueriesContext(connection) as queries:
+            rubric = form.save()
+        return rubric, len(queries)
+
+    def test_create(self):
+        small, small_queries = self.save_rubric(self.make_json(2, 2))
+        large, large_queries = self.save_rubric(self.make_json(10, 5))
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual(large.rubricrow_set.count(), 10)
+        self.assertEqual(large.max_score, 40)
+
+    def test_edit(self):
+        small, _ = self.save_rubric(self.make_json(2, 2))
+        large, _ = self.save_rubric(self.make_json(10, 5))
+        small_json = self.make_json(3, 3)
+        small_json[0]["name"] = "Edited"
+        large_json = self.make_json(12, 6)
+        large_json[0]["name"] = "Edited"
+        small, small_queries = self.save_rubric(small_json, instance=small)
+        large, large_queries = self.save_rubric(large_json, instance=large)
+        self.assertEqual(small_queries, large_queries)
+        self.assertListEqual(JSONDecoder().decode(large.to_json()), large_json)
+
+    def test_shrink(self):
+        rubric, _ = self.save_rubric(self.make_json(10, 5))
+        rubric, _ = self.save_rubric(self.make_json(3, 2), instance=rubric)
+        self.assertListEqual(
+            JSONDecoder().decode(rubric.to_json()), self.make_json(3, 2)
+        )
+        self.assertEqual(
+            RubricCell.objects.filter(parent_row__parent_rubric=rubric).count(), 6
+        )
+        self.assertEqual(rubric.max_score, 3)
+
+    def test_unchanged(self):
+        rubric, _ = self.save_rubric(self.make_json(3, 3))
+        form = RubricForm(
+            {
+                "name": "Saved Rubric",
+                "rubric": JSONEncoder().encode(self.make_json(3, 3)),
+            },
+            instance=rubric,
+        )
+        self.assertTrue(form.is_valid())
+        with CaptureQueriesContext(connection) as queries:
+            form.save()
+        for query in queries.captured_queries:
+            self.assertNotIn('UPDATE "Instructor_rubricrow"', query["sql"])
+            self.assertNotIn('UPDATE "Instructor_rubriccell"', query["sql"])
+
+
+class RubricCloneTest(SimpleBaseCase):
+    test_admin = True
+    test_rubric = True
+
+    def assertSameRubric(self, source, copy):
+        self.assertNotEqual(source.id, copy.id)
+        self.assertEqual(source.max_score, copy.max_score)
+        self.assertEqual(source.to_json(), copy.to_json())
+
+    def test_clone(self):
+        copy = self.rubric.clone()
+        self.assertEqual(copy.name, "Copy of Test Rubric")
+        self.assertSameRubric(self.rubric, Rubric.objects.get(id=copy.id))
+
+    def test_clone_queries(self):
+        form = RubricForm(
+            {
+                "name": "Large Rubric",
+                "rubric": JSONEncoder().encode(RubricSaveQueriesTest.make_json(10, 5)),
+            }
+        )
+        self.assertTrue(form.is_valid())
+        large = form.save()
+        with CaptureQueriesContext(connection) as small_queries:
+            self.rubric.clone()
+        with CaptureQueriesContext(connection) as large_queries:
+            large.clone()
+        self.assertEqual(len(small_queries), len(large_queries))
+
+    def test_clone_many(self):
+        other = self.rubric.clone("Other Rubric")
+        copies = Rubric.clone_many([self.rubric, other], ["Copy 1", "Copy 2"])
+        self.assertSameRubric(self.rubric, Rubric.objects.get(name="Copy 1"))
+        self.assertSameRubric(other, Rubric.objects.get(name="Copy 2"))
+        self.assertEqual(len(copies), 2)
+
+    def test_command(self):
+        out = StringIO()
+        call_command("clone_rubrics", str(self.rubric.id), stdout=out)
+        self.assertSameRubric(
+            self.rubric, Rubric.objects.get(name="Copy of Test Rubric")
+        )
+        self.assertIn("Copied 1 rubric(s)", out.getvalue())
+
+    def test_command_all(self):
+        self.rubric.clone("Other Rubric")
+        call_command(
+            "clone_rubrics", all=True, name_format="{name} (Fall)", stdout=StringIO()
+        )
+        self.assertTrue(Rubric.objects.filter(name="Test Rubric (Fall)").exists())
+        self.assertTrue(Rubric.objects.filter(name="Other Rubric (Fall)").exists())
+
+    def test_command_bad_id(self):
+        self.assertRaises(CommandError, call_command, "clone_rubrics", str(uuid4()))
+        self.assertRaises(CommandError, call_command, "clone_rubrics", "bad-id")
+        self.assertRaises(CommandError, call_command, "clone_rubrics")
+
+    def test_command_bad_name_format(self):
+        for name_format in ("{title}", "{0}", "{name", "name}"):
+            with self.assertRaisesMessage(CommandError, "Invalid --name-format"):
+                call_command(
+                    "clone_rubrics",
+                    all=True,
+                    name_format=name_format,
+                    stdout=StringIO(),
+                )
+        self.assertEqual(Rubric.objects.count(), 1)
@@ -1,6 +1,13 @@
+from json import JSONEncoder
+
 from django.contrib import messages
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
+from Instructor.models import Rubric, ScoredRow
+from Instructor.templatetags import rubric_tags
 from Main.models import Review
 from Main.templatetags import common_tags, review_tags
 from tests.test_review import BaseCase
@@ -40,3 +47,156 @@ class TestReviewTags(BaseCase):
         self.assertNotIn(
             self.review, review_tags.get_session(Review.objects.all(), "PM")
         )
+
+
+class TestReviewTableQueries(BaseCase):
+    test_users = BaseCase.USER_STUDENT_REVIEWER
+
+    test_review_student = "student"
+    test_review_reviewer = "reviewer"
+
+    fields = "schoology_id,student,reviewer,status,view"
+
+    def add_reviews(self, amount):
+        for x in range(amount):
+            self.make_arb_review(
+                "student", "reviewer", Review.Status.CLOSED, f"12.34.{x:02}"
+            )
+
+    def render_table(self, tag):
+        with CaptureQueriesContext(connection) as queries:
+            context = tag(Review.objects.all(), self.fields)
+        return context, len(queries)
+
+    def assertConstantQueries(self, tag, expected):
+        small_context, small_queries = self.render_table(tag)
+        self.add_reviews(20)
+        large_context, large_queries = self.render_table(tag)
+        self.assertLess(len(small_context["objects"]), len(large_context["objects"]))
+        self.assertEqual(small_queries, expected)
+        self.assertEqual(large_queries, expected)
+
+    def test_review_table(self):
+        self.assertConstantQueries(review_tags.review_table, 2)
+
+    def test_preview_table(self):
+        self.assertConstantQueries(review_tags.review_complete_preview_table, 3)
+
+    def test_review_table_list(self):
+        self.add_reviews(20)
+        reviews = list(Review.objects.select_related("student", "reviewer"))
+        with self.assertNumQueries(0):
+            context = review_tags.review_table(reviews, self.fields)
+        self.assertEqual(
+            context["objects"],
+            review_tags.review_table(Review.objects.all(), self.fields)["objects"],
+        )
+
+    def test_preview_table_list(self):
+        self.add_reviews(20)
+        reviews = list(Review.objects.select_related("student", "reviewer"))
+        with self.assertNumQueries(0):
+            context = review_tags.review_complete_preview_table(reviews, self.fields)
+        self.assertEqual(len(context["objects"]), 4)
+        self.assertNotIn("hide_view_all", context)
+
+    def test_preview_table_total(self):
+        self.add_reviews(20)
+        with self.assertNumQueries(2):
+            context = review_tags.review_complete_preview_table(
+                Review.objects.all(), self.fields, total=21
+            )
+        self.assertNotIn("hide_view_all", context)
+        context = review_tags.review_complete_preview_table(
+            Review.objects.all(), self.fields, total=4
+        )
+        self.assertTrue(context["hide_view_all"])
+
+    def test_formatting(self):
+        self.set_user_full_name("student", "Test", "Student")
+        context = review_tags.review_table(Review.objects.all(), self.fields)
+        self.assertEqual(
+            context["objects"][0],
+            ["12.34.56", "Test Student", "reviewer", "Open", self.review.id],
+        )
+
+    def test_no_reviewer(self):
+        self.review.reviewer = None
+        self.review.save()
+        context = review_tags.review_table(Review.objects.all(), self.fields)
+        self.assertEqual(context["objects"][0][2], "")
+
+
+class TestRubricRenderQueries(BaseCase):
+    test_users = BaseCase.USER_STUDENT_REVIEWER
+
+    test_review_student = "student"
+    test_review_reviewer = "reviewer"
+
+    def make_rubric(self, name, rows, cells):
+        rubric_json = [
+            {
+                "name": f"row {row}",
+                "description": f"row desc {row}",
+                "cells": [
+                    {"score": cell, "description": f"cell {cell} row {row}"}
+                    for cell in range(cells)
+                ],
+            }
+            for row in range(rows)
+        ]
+        self.post(
+            "super",
+            reverse("rubric-create"),
+            {"name": name, "rubric": JSONEncoder().encode(rubric_json)},
+        )
+        return Rubric.objects.get(name=name)
+
+    def make_review(self, rubric, status):
+        review = self.make_arb_review("student", "reviewer", status, "12.34.56")
+        review.rubric = rubric
+        review.save()
+        for row in rubric.rubricrow_set.all():
+            ScoredRow.objects.create(parent_review=review, source_row=row, score=0)
+        return review
+
+    def count_queries(self, user, url_name, review):
+        url = reverse(url_name, kwargs={"pk": review.id})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(user, url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, user, url_name, status):
+        small = self.make_review(self.make_rubric("Small", 1, 2), status)
+        large = self.make_review(self.make_rubric("Large", 10, 5), status)
+        self.assertEqual(
+            self.count_queries(user, url_name, small),
+            self.count_queries(user, url_name, large),
+        )
+
+    def test_view(self):
+        self.assertConstantQueries("student", "review-view", Review.Status.CLOSED)
+
+    def test_grade(self):
+        self.assertConstantQueries("reviewer", "review-grade", Review.Status.ASSIGNED)
+
+    def test_selected_cells(self):
+        self.set_test_review_status(Review.Status.ASSIGNED)
+        self.post_test_review(
+            "reviewer", "review-grade", {"scores": "[10,2]", "is_draft": "false"}
+        )
+        response = self.get(
+            "student", reverse("review-view", kwargs={"pk": self.review.id})
+        )
+        self.assertEqual(str(response.content).count("selected fw-bolder"), 2)
+
+    def test_get_scores(self):
+        self.set_test_review_status(Review.Status.ASSIGNED)
+        self.post_test_review(
+            "reviewer", "review-grade", {"scores": "[5,-1]", "is_draft": "true"}
+        )
+        review = Review.objects.with_rubric().get(id=self.review.id)
+        self.assertEqual(
+            rubric_tags.get_scores_as_json(review, review.rubric), "[5.0,-1.0]"
+        )
@@ -1,5 +1,9 @@
+from contextlib import ContextDecorator
+
 from django.contrib.messages import get_messages
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from Instructor.models import Rubric
@@ -11,6 +15,36 @@ class BadTestError(Exception):
     pass
 
 
+def format_queries(queries) -> str:
+    return "\n".join(
+        f"{index}. {query['sql']}" for index, query in enumerate(queries, start=1)
+    )
+
+
+class QueryBudget(ContextDecorator):
+    # Fails if more than `limit` queries run inside it, works as a context manager or a decorator
+
+    def __init__(self, limit, using=DEFAULT_DB_ALIAS):
+        self.limit = limit
+        self.using = using
+        self.context = None
+
+    def __enter__(self):
+        self.context = CaptureQueriesContext(connections[self.using])
+        return self.context.__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.context.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None and len(self.context) > self.limit:
+            raise AssertionError(
+                f"{len(self.context)} queries ran, over the budget of {self.limit}:\n"
+                + format_queries(self.context.captured_queries)
+            )
+
+
+query_budget = QueryBudget
+
+
 class BaseCase(TestCase):
     # Configuration
 
@@ -147,6 +181,36 @@ class BaseCase(TestCase):
     def assertNotReviewer(self, username):
         self.assertFalse(User.objects.get(username=username).is_reviewer)
 
+    # Query Budgets
+
+    def assertMaxQueries(self, limit, using=DEFAULT_DB_ALIAS):
+        return QueryBudget(limit, using)
+
+    def capture_queries(self, render):
+        # Render once first, so the measurement doesn't include filling caches
+        render()
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            render()
+        return queries.captured_queries
+
+    def assertQueriesDontGrow(self, render, grow, budget=None):
+        small = self.capture_queries(render)
+        grow()
+        large = self.capture_queries(render)
+        self.assertEqual(
+            len(large),
+            len(small),
+            f"The number of queries went from {len(small)} to {len(large)} "
+            f"when the fixtures grew:\n{format_queries(large)}",
+        )
+        if budget is not None:
+            self.assertLessEqual(
+                len(large),
+                budget,
+                f"{len(large)} queries ran, over the budget of {budget}:\n"
+                f"{format_queries(large)}",
+            )
+
     # Client Utils
 
     def get(self, user, path, data=None):